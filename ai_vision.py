@@ -0,0 +1,233 @@
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import cv2
+
+# Visión por modelo (YOLOv8 exportado a ONNX) en CPU, alternativa a las medias de color por ROI.
+# Ver .trae/documents: el modelo detecta fishing_float, key_e/key_r/key_t, bar_green/bar_red
+# y fish_name en la región de captura.
+#
+#   yolo export model=best.pt format=onnx imgsz=320    (ultralytics)
+#
+# Para que quepa en el presupuesto del bucle:
+# - se infiere sobre la región de captura reducida a input_size x input_size (letterbox),
+#   con los tensores de entrada reservados una sola vez;
+# - la inferencia completa solo se hace cada 'full_every' frames o cuando la miniatura del frame
+#   cambia; entre medias se reutilizan las detecciones seguidas (tracks) de la última inferencia.
+# onnxruntime se importa al crear el motor: sin él (o sin modelo) el bot sigue con los umbrales.
+
+DEFAULT_CLASSES = ('fishing_float', 'key_e', 'key_r', 'key_t', 'bar_green', 'bar_red', 'fish_name')
+
+# Campo de FrameSignals -> clase del modelo que lo enciende
+DEFAULT_SIGNALS = {
+    'menu': 'fishing_float',
+    'wait_red': 'bar_red',
+    'wait_green': 'bar_green',
+    'e_active': 'key_e',
+    'r_active': 'key_r',
+    't_active': 'key_t'
+}
+
+# Caja en coordenadas del frame recibido
+Detection = namedtuple('Detection', 'cls conf x y w h')
+
+
+def iou(a, b):
+    x1, y1 = max(a.x, b.x), max(a.y, b.y)
+    x2, y2 = min(a.x + a.w, b.x + b.w), min(a.y + a.h, b.y + b.h)
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = a.w * a.h + b.w * b.h - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    __slots__ = ('det', 'hits', 'misses')
+
+    def __init__(self, det):
+        self.det = det
+        self.hits = 1
+        self.misses = 0
+
+
+class DetectionTracker:
+    # Empareja detecciones de inferencias sucesivas por clase e IoU. Una detección que falta en
+    # una inferencia se conserva hasta 'max_misses' inferencias (evita parpadeos de la señal).
+    def __init__(self, min_iou=0.3, max_misses=1):
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.tracks = []
+
+    def update(self, detections):
+        unmatched = list(detections)
+        for track in self.tracks:
+            best, best_iou = None, self.min_iou
+            for det in unmatched:
+                if det.cls != track.det.cls:
+                    continue
+                overlap = iou(det, track.det)
+                if overlap >= best_iou:
+                    best, best_iou = det, overlap
+            if best is None:
+                track.misses += 1
+            else:
+                unmatched.remove(best)
+                track.det = best
+                track.hits += 1
+                track.misses = 0
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        self.tracks.extend(Track(det) for det in unmatched)
+
+    def detections(self):
+        return [t.det for t in self.tracks]
+
+    def reset(self):
+        self.tracks = []
+
+
+class VisionEngine:
+    def __init__(self, config=None, session=None):
+        # session: inyectable (pruebas); por defecto onnxruntime sobre config['model']
+        config = config or {}
+        self.config = dict(config)
+        self.model_path = config.get('model', os.path.join('models', 'best.onnx'))
+        self.size = int(config.get('input_size', 320))
+        self.classes = tuple(config.get('classes', DEFAULT_CLASSES))
+        self.signal_classes = dict(DEFAULT_SIGNALS)
+        self.signal_classes.update(config.get('signals', {}))
+        self.min_conf = float(config.get('confidence', 0.25))
+        self.signal_conf = float(config.get('signal_confidence', 0.6))
+        self.hysteresis = float(config.get('hysteresis', 0.15))
+        self.nms_iou = float(config.get('iou', 0.45))
+        self.full_every = max(1, int(config.get('full_every', 5)))
+        # Diferencia media (0-255) de la miniatura que fuerza una inferencia completa
+        self.change_tolerance = float(config.get('change_tolerance', 4.0))
+        self.budget = float(config.get('budget_ms', 15.0)) / 1000.0
+        self.session = session or self._open(int(config.get('threads', 1)))
+        self.input_name = self.session.get_inputs()[0].name
+        # Reservados una vez: lienzo letterbox, tensor NCHW y miniatura para detectar cambios
+        self.canvas = np.full((self.size, self.size, 3), 114, dtype=np.uint8)
+        self.tensor = np.zeros((1, 3, self.size, self.size), dtype=np.float32)
+        self.thumb = None
+        self.frame_shape = None
+        self.scale = 1.0
+        self.resized = (self.size, self.size)
+        self.tracker = DetectionTracker(float(config.get('track_iou', 0.3)),
+                                        int(config.get('track_misses', 1)))
+        self.since_full = None
+        self.inferences = 0
+        self.reused = 0
+        self.inference_time = 0.0
+        self.over_budget = 0
+
+    def _open(self, threads):
+        import onnxruntime as ort
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"No existe el modelo {self.model_path}")
+        opts = ort.SessionOptions()
+        # Un hilo: el bucle, el OCR y la captura ya compiten por la CPU
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(self.model_path, sess_options=opts, providers=['CPUExecutionProvider'])
+
+    def _prepare(self, img):
+        height, width = img.shape[:2]
+        if img.shape != self.frame_shape:
+            self.frame_shape = img.shape
+            self.scale = self.size / max(height, width)
+            self.resized = (max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale))))
+            self.canvas[:] = 114
+        nw, nh = self.resized
+        small = cv2.resize(img[..., :3], (nw, nh), interpolation=cv2.INTER_AREA)
+        # BGR -> RGB, HWC -> CHW y 0-255 -> 0-1 directamente sobre el tensor reservado
+        self.canvas[:nh, :nw] = small[..., ::-1]
+        np.multiply(self.canvas.transpose(2, 0, 1), 1.0 / 255.0, out=self.tensor[0], casting='unsafe')
+
+    def _decode(self, output):
+        # Salida YOLOv8: (1, 4 + clases, anclas) con cajas cx, cy, w, h en píxeles de entrada
+        pred = output[0]
+        if pred.shape[0] != 4 + len(self.classes):
+            pred = pred.T
+        scores = pred[4:]
+        cls_ids = scores.argmax(axis=0)
+        confs = scores[cls_ids, np.arange(scores.shape[1])]
+        keep = confs >= self.min_conf
+        if not keep.any():
+            return []
+        boxes = pred[:4, keep].T / self.scale
+        confs = confs[keep]
+        cls_ids = cls_ids[keep]
+        xywh = np.column_stack((boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2,
+                                boxes[:, 2], boxes[:, 3]))
+        # NMS por clase: se desplazan las cajas de cada clase para que no se solapen entre sí
+        offset = cls_ids[:, None].astype(np.float32) * 4096.0
+        shifted = np.column_stack((xywh[:, :2] + offset, xywh[:, 2:]))
+        idx = cv2.dnn.NMSBoxes(shifted.tolist(), confs.tolist(), self.min_conf, self.nms_iou)
+        out = []
+        for i in np.array(idx).reshape(-1):
+            x, y, w, h = xywh[i].tolist()
+            out.append(Detection(self.classes[cls_ids[i]], float(confs[i]), x, y, w, h))
+        return out
+
+    def _changed(self, img):
+        thumb = cv2.resize(img[..., :3], (32, 32), interpolation=cv2.INTER_AREA)
+        if self.thumb is None or cv2.norm(thumb, self.thumb, cv2.NORM_L1) / thumb.size > self.change_tolerance:
+            return thumb
+        return None
+
+    def infer(self, img):
+        start = time.perf_counter()
+        self._prepare(img)
+        output = self.session.run(None, {self.input_name: self.tensor})[0]
+        detections = self._decode(output)
+        elapsed = time.perf_counter() - start
+        self.inferences += 1
+        self.inference_time += elapsed
+        if elapsed > self.budget:
+            self.over_budget += 1
+        return detections
+
+    def detect(self, img):
+        # Detecciones seguidas para este frame; inferencia completa solo si toca o si cambió
+        thumb = self._changed(img)
+        due = self.since_full is None or self.since_full + 1 >= self.full_every
+        if thumb is None and not due:
+            self.since_full += 1
+            self.reused += 1
+            return self.tracker.detections()
+        self.tracker.update(self.infer(img))
+        self.thumb = thumb if thumb is not None else self.thumb
+        self.since_full = 0
+        return self.tracker.detections()
+
+    def signals(self, img):
+        # {campo de FrameSignals: (encendido, apagado con histéresis)}
+        best = {}
+        for det in self.detect(img):
+            if det.conf > best.get(det.cls, 0.0):
+                best[det.cls] = det.conf
+        out = {}
+        for field, cls in self.signal_classes.items():
+            conf = best.get(cls, 0.0)
+            out[field] = (conf >= self.signal_conf, conf >= self.signal_conf - self.hysteresis)
+        return out
+
+    def box(self, cls):
+        # Mejor caja seguida de una clase (p. ej. fish_name para el OCR) o None
+        dets = [d for d in self.tracker.detections() if d.cls == cls]
+        return max(dets, key=lambda d: d.conf) if dets else None
+
+    def reset(self):
+        self.tracker.reset()
+        self.thumb = None
+        self.since_full = None
+
+    def report(self):
+        total = self.inferences + self.reused
+        if not total:
+            return None
+        mean_ms = self.inference_time / self.inferences * 1000 if self.inferences else 0.0
+        return (f"Visión: {self.inferences} inferencias ({mean_ms:.1f} ms de media, "
+                f"{self.over_budget} sobre {self.budget * 1000:.0f} ms), "
+                f"{self.reused} frames con detecciones reutilizadas ({self.reused / total * 100:.0f}%)")
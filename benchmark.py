@@ -0,0 +1,436 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import numpy as np
+import cv2
+
+import fishing_bot
+from fishing_bot import FishingBot, FishingBrain
+from frame_sources import ImageDirFrameSource, SyntheticFrameSource, MssFrameSource, CaptureLayout
+from input_sinks import RecordingInput
+from color_stats import ColorStatsEngine
+from color_lut import ColorLut, ColorClassEngine
+from ai_vision import VisionEngine
+from panel_locator import PanelLocator
+from settings import Settings
+
+# Benchmarks de los caminos calientes del bot sobre frames grabados (dataset/images) y sintéticos.
+# Cada resultado guarda percentiles por llamada y, con tandas de duración mínima, la mejor pasada
+# sobre los frames, su ruido entre tandas y el tiempo de una carga fija de referencia, en
+# microsegundos. --baseline compara la mejor pasada con un JSON anterior (corregida por lo que
+# cambió la referencia, es decir, la velocidad de la máquina) y devuelve código 1 si alguna
+# métrica empeora más de la tolerancia y de su ruido.
+#
+#   python benchmark.py --out bench.json
+#   python benchmark.py --baseline bench.json --tolerance 0.3
+
+DATASET_DIR = os.path.join('dataset', 'images')
+
+# Duración mínima de cada tanda de measure() (--min-time)
+MIN_RUN_SECONDS = 0.2
+
+# Una métrica solo es regresión si empeora más que la tolerancia y que este múltiplo del
+# ruido medido (en la ejecución actual o en la de referencia)
+NOISE_FACTOR = 3.0
+# Tope del margen que añade el ruido: por ruidosa que sea una métrica, duplicar su tiempo
+# (+100%) siempre se marca como regresión
+MAX_NOISE_MARGIN = 0.75
+
+REFERENCE_ARRAY = np.arange(64 * 256, dtype=np.int64).reshape(64, 256)
+
+
+def reference_work():
+    # Carga fija de referencia (numpy sobre un array pequeño y algo de Python, como el bucle):
+    # se mide junto a cada métrica para descontar los cambios de velocidad de la máquina
+    total = 0
+    for row in REFERENCE_ARRAY:
+        total += int(row.sum())
+    return total
+
+
+def measure(fn, items, repeat=5, warmup=1, min_time=None, setup=None):
+    # 'repeat' tandas; cada tanda recorre los items las veces necesarias para durar al menos
+    # min_time segundos. La métrica comparable ('best_us') es la mejor pasada completa sobre los
+    # items (tiempo medio por llamada): el mínimo es lo menos sensible a interrupciones y a otros
+    # procesos. Tras cada pasada se mide también reference_work ('reference_us', su mejor
+    # tiempo), y 'noise' es cuánto varía el mínimo de una tanda a otra. Los percentiles son por
+    # llamada. setup(item), si se da, se ejecuta antes de cada llamada fuera del tiempo medido.
+    min_time = MIN_RUN_SECONDS if min_time is None else min_time
+    for item in items[:warmup]:
+        if setup is not None:
+            setup(item)
+        fn(item)
+    samples = []
+    runs = []
+    reference = []
+    for _ in range(max(1, repeat)):
+        best = None
+        elapsed = 0.0
+        while items:
+            start_pass = len(samples)
+            for item in items:
+                if setup is not None:
+                    setup(item)
+                start = time.perf_counter()
+                fn(item)
+                samples.append(time.perf_counter() - start)
+            took = sum(samples[start_pass:])
+            per_call = took / len(items)
+            best = per_call if best is None else min(best, per_call)
+            start = time.perf_counter()
+            reference_work()
+            reference.append(time.perf_counter() - start)
+            elapsed += took
+            if elapsed >= min_time:
+                break
+        if best is not None:
+            runs.append(best)
+    result = stats(samples, runs)
+    if reference:
+        result['reference_us'] = min(reference) * 1e6
+    return result
+
+
+def stats(samples, runs=None):
+    # runs: mejor tiempo por llamada de cada tanda (segundos)
+    values = np.array(samples, dtype=np.float64) * 1e6
+    p50, p95, p99 = np.percentile(values, (50, 95, 99)).tolist()
+    total = values.sum()
+    out = {
+        'count': int(values.size),
+        'mean_us': float(values.mean()),
+        'p50_us': p50,
+        'p95_us': p95,
+        'p99_us': p99,
+        'ops_per_second': float(values.size / (total / 1e6)) if total > 0 else 0.0
+    }
+    if runs:
+        per_run = np.array(runs, dtype=np.float64) * 1e6
+        best = float(per_run.min())
+        out['runs'] = int(per_run.size)
+        out['best_us'] = best
+        out['noise'] = (float(np.median(per_run)) - best) / best if best > 0 else 0.0
+    return out
+
+
+def load_frames(source, limit=None):
+    # Frames tal y como los ve el bot (ya compuestos según capture_mode)
+    frames = []
+    while limit is None or len(frames) < limit:
+        img = source.grab()
+        if img is None:
+            break
+        frames.append(img.copy())
+    return frames
+
+
+def make_bot(source):
+    # Bot sin pulsaciones reales ni cachés en disco
+    bot = FishingBot(frame_source=source, input_sink=RecordingInput(source))
+    bot.ocr.ocr_cache = None
+    bot.ocr.name_templates = None
+    return bot
+
+
+def bench_classify(bot, frames, repeat):
+    # Cadena de detección de run(): detector de cambios + clasificación + confirmación
+    def full_chain(img):
+        sig, weak = bot.classify(img)
+        bot.confirm.update(sig, weak, 0.0)
+
+    gate = bot.state_gates['minigame']
+
+    def gated_chain(img):
+        if gate.changed(img):
+            sig, weak = bot.classify(img, 'minigame')
+            bot.confirm.update(sig, weak, 0.0)
+
+    return {
+        'classify_all_rois': measure(full_chain, frames, repeat),
+        'classify_minigame_gated': measure(gated_chain, frames, repeat)
+    }
+
+
+def bench_regions(bot, frames, repeat):
+    # Coste de process_region/menu_present por ROI: cada uno con un motor de color de una sola región
+    out = {}
+    for name, rect in bot.stats.regions.items():
+        engine = ColorStatsEngine({name: rect})
+        if name == 'menu':
+            out['menu_present'] = measure(lambda img: bot.menu_present(img, engine.compute(img)),
+                                          frames, repeat)
+        else:
+            out[f'process_region:{name}'] = measure(
+                lambda img, n=name, e=engine: bot.process_region(img, n, e.compute(img)), frames, repeat)
+    return out
+
+
+def bench_lut(bot, frames, repeat):
+    # Fracciones de clase por LUT (tabla derivada de los umbrales) frente a las medias de color
+    regions = {name: rect for name, rect in bot.stats.regions.items() if name != 'menu'}
+    classes = ColorClassEngine(regions, ColorLut.from_thresholds(bot.settings))
+    means = ColorStatsEngine(regions)
+    return {
+        'lut_fractions': measure(classes.compute, frames, repeat),
+        'mean_stats': measure(means.compute, frames, repeat)
+    }
+
+
+def bench_vision(config, frames, repeat):
+    # Modelo ONNX (ai_vision.py): inferencia completa por frame y camino normal con detecciones
+    # reutilizadas; cuenta los frames que superan budget_ms
+    cfg = dict(config.get('ai_vision') or {})
+    try:
+        engine = VisionEngine(cfg)
+    except Exception as e:
+        return {'vision': {'skipped': f"modelo no disponible: {e}"}}
+    full = measure(engine.infer, frames, repeat)
+    engine.reset()
+    tracked = measure(engine.detect, frames, repeat)
+    budget_us = engine.budget * 1e6
+    full['budget_us'] = budget_us
+    tracked['budget_us'] = budget_us
+    return {'vision/full_inference': full, 'vision/tracked': tracked}
+
+
+def bench_locator(config, frames_dir, repeat):
+    # panel_locator.py sobre una pantalla 1920x1080 simulada con la ventana del juego en su
+    # capture_region: búsqueda completa por pirámide y comprobación del entorno (sin la captura)
+    settings = Settings(config)
+    names = sorted(os.listdir(frames_dir)) if os.path.isdir(frames_dir) else []
+    game = cv2.imread(os.path.join(frames_dir, names[0])) if names else None
+    if game is None:
+        game = SyntheticFrameSource(config, frames=1).templates['finished'][..., :3]
+    monitor = settings.monitor
+    rect = settings.regions.get('menu')
+    height, width = 1080, 1920
+    if rect is None or monitor['left'] + game.shape[1] > width or monitor['top'] + game.shape[0] > height:
+        return {'locator': {'skipped': "sin ancla o capture_region fuera de 1920x1080"}}
+    rng = np.random.default_rng(0)
+    screen = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    screen[monitor['top']:monitor['top'] + game.shape[0], monitor['left']:monitor['left'] + game.shape[1]] = game
+    screen = cv2.cvtColor(screen, cv2.COLOR_BGR2BGRA)
+    grab = lambda r: screen[r['top']:r['top'] + r['height'], r['left']:r['left'] + r['width']]
+    locator = PanelLocator(settings.panel_locator, grab=grab,
+                           bounds={'left': 0, 'top': 0, 'width': width, 'height': height})
+    x, y = monitor['left'] + rect['x'], monitor['top'] + rect['y']
+    locator.set_template(grab({'left': x, 'top': y, 'width': rect['w'], 'height': rect['h']}))
+    full = measure(lambda _: locator.locate(), [None] * 10, repeat)
+    track = measure(lambda _: locator.track(x, y), [None] * 50, repeat)
+    return {'locator/full_search': full, 'locator/track': track}
+
+
+def bench_capture(config, repeat):
+    # Captura en vivo con mss según capture_mode: 'bbox' hace una sola captura (la caja que une
+    # las ROIs) y 'rois' una por ROI, cada una con su coste fijo de GDI/X11
+    settings = Settings(config)
+    try:
+        source = MssFrameSource(settings.monitor)
+    except Exception as e:
+        return {'capture': {'skipped': f"mss no disponible: {e}"}}
+    out = {}
+    try:
+        for mode in ('full', 'bbox', 'rois'):
+            source.set_layout(CaptureLayout.build(mode, settings.regions))
+            out[f'capture/{mode}'] = measure(lambda _: source.grab(), [None] * 20, repeat)
+    except Exception as e:
+        return {'capture': {'skipped': f"sin pantalla que capturar: {e}"}}
+    finally:
+        source.close()
+    return out
+
+
+def bench_ocr(bot, config, repeat):
+    # read_fish_name con el modelo en frío (incluye la carga) y en caliente, sin cachés
+    if bot.settings.result_name_roi is None:
+        return {'read_fish_name': {'skipped': "result_name_roi no configurado"}}
+    try:
+        import easyocr  # noqa: F401
+    except Exception as e:
+        return {'read_fish_name': {'skipped': f"easyocr no disponible: {e}"}}
+    full = SyntheticFrameSource(config, frames=1).templates['finished']
+    ys, xs = bot.settings.slices['name']
+    roi = full[ys, xs].copy()
+    start = time.perf_counter()
+    bot.recognize_fish_name(roi)
+    cold = stats([time.perf_counter() - start])
+    warm = measure(bot.recognize_fish_name, [roi] * 5, repeat)
+    return {'read_fish_name_cold': cold, 'read_fish_name_warm': warm}
+
+
+def bench_brain(repeat):
+    # Por tecla: distribución, predicción y avance del trie sobre todas las secuencias del cebo activo
+    brain = FishingBrain(stats_path=None)
+    location, bait = brain.scope
+    puzzles = brain.fish_data.get('puzzles', {})
+    sequences = [puzzles[name] for name in brain.reachable_fish(location, bait) if puzzles[name]]
+    if not sequences:
+        return {'brain': {'skipped': "fish_data.json sin secuencias para la ubicación/cebo activos"}}
+
+    def reset(_):
+        brain.reset()
+        brain.register_bite('e')
+
+    # Cada item es una tecla; al empezar una secuencia se reinicia el cerebro (fuera del tiempo)
+    keys = [(i == 0, key) for seq in sequences for i, key in enumerate(seq)]
+
+    def restart(item):
+        if item[0]:
+            reset(None)
+
+    def step(item):
+        brain.next_key_distribution()
+        brain.predict()
+        brain.register_key(item[1])
+        brain.candidate_keys()
+
+    per_key = measure(step, keys, repeat, setup=restart)
+    reset_result = measure(reset, sequences, repeat)
+    # Reconstrucción completa del trie (cambio de ubicación/cebo)
+    build = measure(lambda _: brain.build(location, bait), [None] * 20, repeat)
+    return {'brain/reset': reset_result, 'brain/per_key': per_key, 'brain/build': build}
+
+
+def run_benchmarks(args):
+    config = fishing_bot.CONFIG
+    results = {}
+    sets = []
+    if args.synthetic > 0:
+        sets.append(('synthetic', SyntheticFrameSource(config, frames=args.synthetic)))
+    if os.path.isdir(args.frames):
+        sets.append(('dataset', ImageDirFrameSource(args.frames)))
+    else:
+        print(f"Sin frames grabados en {args.frames}: solo sintéticos")
+
+    bot = None
+    for label, source in sets:
+        bot = make_bot(source)
+        frames = load_frames(source, args.limit)
+        print(f"{label}: {len(frames)} frames")
+        for name, res in bench_classify(bot, frames, args.repeat).items():
+            results[f'{label}/{name}'] = res
+        for name, res in bench_regions(bot, frames, args.repeat).items():
+            results[f'{label}/{name}'] = res
+        for name, res in bench_lut(bot, frames, args.repeat).items():
+            results[f'{label}/{name}'] = res
+        if not args.skip_vision:
+            for name, res in bench_vision(config, frames, args.repeat).items():
+                results[f'{label}/{name}'] = res
+        bot.ocr_worker.stop(timeout=1)
+
+    for name, res in bench_brain(args.repeat).items():
+        results[name] = res
+    for name, res in bench_locator(config, args.frames, args.repeat).items():
+        results[name] = res
+    if not args.skip_capture:
+        for name, res in bench_capture(config, args.repeat).items():
+            results[name] = res
+    if not args.skip_ocr and bot is not None:
+        for name, res in bench_ocr(bot, config, 1).items():
+            results[f'ocr/{name}'] = res
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'capture_mode': bot.settings.capture_mode if bot is not None else None,
+            'repeat': args.repeat,
+            'min_time': args.min_time
+        },
+        'results': results
+    }
+
+
+def compare(current, baseline, tolerance, metric='best_us'):
+    # Devuelve (líneas de informe, hay_regresión). Si las dos ejecuciones midieron la carga de
+    # referencia, la referencia se escala por lo que cambió la velocidad de la máquina.
+    lines = []
+    regressed = False
+    base = baseline.get('results', {})
+    for name, res in sorted(current['results'].items()):
+        if metric not in res:
+            continue
+        ref = base.get(name, {})
+        old = ref.get(metric)
+        if not old:
+            lines.append(f"  {name}: {res[metric]:.1f} us (sin referencia comparable)")
+            continue
+        speed = ""
+        if ref.get('reference_us') and res.get('reference_us'):
+            factor = res['reference_us'] / ref['reference_us']
+            old = old * factor
+            speed = f", máquina x{factor:.2f}"
+        change = (res[metric] - old) / old
+        # Margen: la tolerancia o el ruido de cualquiera de las dos ejecuciones (con tope), lo que sea mayor
+        noise = NOISE_FACTOR * max(res.get('noise', 0.0), ref.get('noise', 0.0))
+        allowed = max(tolerance, min(noise, MAX_NOISE_MARGIN))
+        mark = ""
+        if change > allowed:
+            mark = "  <-- REGRESIÓN"
+            regressed = True
+        lines.append(f"  {name}: {old:.1f} -> {res[metric]:.1f} us ({change * 100:+.1f}%, "
+                     f"margen {allowed * 100:.0f}%{speed}){mark}")
+    return lines, regressed
+
+
+def print_results(data):
+    for name, res in sorted(data['results'].items()):
+        if 'skipped' in res:
+            print(f"  {name}: omitido ({res['skipped']})")
+        elif 'p50_us' in res:
+            line = (f"  {name}: p50 {res['p50_us']:.1f} us, p95 {res['p95_us']:.1f} us, "
+                    f"{res['ops_per_second']:.0f} ops/s")
+            if 'best_us' in res:
+                line += f", mejor pasada {res['best_us']:.1f} us (ruido {res['noise'] * 100:.0f}%)"
+            if 'budget_us' in res and res['p95_us'] > res['budget_us']:
+                line += f"  <-- p95 sobre el presupuesto ({res['budget_us'] / 1000:.0f} ms)"
+            print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del bot de pesca")
+    parser.add_argument('--frames', default=DATASET_DIR, help="Carpeta de capturas grabadas")
+    parser.add_argument('--synthetic', type=int, default=300, help="Frames sintéticos (0 = ninguno)")
+    parser.add_argument('--limit', type=int, default=None, help="Máximo de frames por conjunto")
+    parser.add_argument('--repeat', type=int, default=5, help="Tandas por métrica")
+    parser.add_argument('--min-time', type=float, default=MIN_RUN_SECONDS,
+                        help="Segundos mínimos de cada tanda (se repiten los frames hasta cubrirlos)")
+    parser.add_argument('--skip-ocr', action='store_true', help="No medir read_fish_name")
+    parser.add_argument('--skip-vision', action='store_true', help="No medir el modelo de ai_vision.py")
+    parser.add_argument('--skip-capture', action='store_true', help="No medir la captura en vivo (mss)")
+    parser.add_argument('--out', default=None, help="Guardar resultados en este JSON")
+    parser.add_argument('--baseline', default=None, help="JSON de referencia para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Empeoramiento relativo permitido de la mejor pasada frente a la referencia "
+                             "(se amplía si el ruido medido es mayor)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global MIN_RUN_SECONDS
+    args = parse_args(argv)
+    MIN_RUN_SECONDS = args.min_time
+    data = run_benchmarks(args)
+    print_results(data)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        print(f"Resultados guardados en {args.out}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressed = compare(data, baseline, args.tolerance)
+        print(f"Comparación con {args.baseline} (tolerancia {args.tolerance * 100:.0f}%):")
+        print("\n".join(lines))
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import mss
 import numpy as np
 import cv2
@@ -15,6 +16,17 @@ current_rect = None
 baseline = {}
 active_green = {}
 active_red_wait = None
+# Muestreo en curso (hilo aparte): nombre, capturas hechas y total
+sampling = {'label': None, 'done': 0, 'total': 0}
+show_histograms = False
+# Umbrales actuales de config_fishing.json, para marcarlos en los histogramas
+thresholds = {}
+if os.path.exists("config_fishing.json"):
+    try:
+        with open("config_fishing.json", "r") as f:
+            thresholds = json.load(f).get('thresholds', {})
+    except Exception:
+        pass
 
 def rect_to_xywh(x1, y1, x2, y2):
     x = x1 if x1 < x2 else x2
@@ -24,7 +36,7 @@ def rect_to_xywh(x1, y1, x2, y2):
     return x, y, w, h
 
 def mouse_cb(event, x, y, flags, param):
-    global dragging, start_pt, current_rect, selection_mode, capture_region, areas
+    global dragging, start_pt, current_rect, selection_mode, capture_region
     if selection_mode is None:
         return
     if event == cv2.EVENT_LBUTTONDOWN:
@@ -61,14 +73,108 @@ def put_text(img, text, y=20, color=(0, 0, 0)):
     # Texto negro (o el color que pases)
     cv2.putText(img, text, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 1)
 
+def roi_means(roi, rects):
+    # Media B, G, R de cada área ({nombre: rect}) dentro de la región de captura
+    out = {}
+    for name, rect in rects.items():
+        rroi = roi[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']]
+        if rroi.size == 0:
+            continue
+        out[name] = np.mean(rroi[..., :3], axis=(0, 1))
+    return out
+
+def sample_worker(label, region, rects, count, on_done):
+    # Hilo de muestreo: 'count' capturas de la región con su propio mss (no se comparte entre hilos).
+    # region y rects son copias: el hilo principal puede seguir editando las áreas.
+    try:
+        acc = {}
+        cnt = 0
+        with mss.mss() as sct2:
+            for i in range(count):
+                roi = np.array(sct2.grab(region))
+                for name, bgr in roi_means(roi, rects).items():
+                    acc[name] = acc.get(name, 0.0) + bgr
+                cnt += 1
+                sampling['done'] = i + 1
+        on_done({name: total / cnt for name, total in acc.items()} if cnt else {})
+        print(f"Muestreo '{label}' terminado: {cnt} capturas")
+    except Exception as e:
+        print(f"Error en el muestreo '{label}': {e}")
+    finally:
+        # Siempre se libera: si no, la interfaz quedaría en "Muestreando..." para siempre
+        sampling['label'] = None
+
+def start_sampling(label, names, count, on_done):
+    # Una sola tanda a la vez; la ventana sigue respondiendo mientras se muestrea
+    if capture_region is None or sampling['label'] is not None:
+        return
+    region = dict(capture_region)
+    rects = {name: dict(areas[name]) for name in names if areas.get(name)}
+    sampling.update({'label': label, 'done': 0, 'total': count})
+    threading.Thread(target=sample_worker, args=(label, region, rects, count, on_done), daemon=True).start()
+
+def on_background(means):
+    for name, bgr in means.items():
+        baseline[name] = {'g': float(bgr[1]), 'r': float(bgr[2])}
+
+def on_green(means):
+    for name, bgr in means.items():
+        active_green[name] = {'g': float(bgr[1])}
+
+def on_wait_red(means):
+    global active_red_wait
+    if 'wait' in means:
+        active_red_wait = float(means['wait'][2])
+
+def draw_progress(img):
+    if sampling['label'] is None:
+        return
+    total = max(1, sampling['total'])
+    done = sampling['done']
+    w = img.shape[1] - 20
+    y = img.shape[0] - 30
+    cv2.rectangle(img, (10, y), (10 + w, y + 20), (255, 255, 255), 1)
+    cv2.rectangle(img, (10, y), (10 + int(w * done / total), y + 20), (0, 200, 255), -1)
+    put_text(img, f"Muestreando {sampling['label']}: {done}/{total}", y=y - 8, color=(0, 0, 255))
+
+def draw_histograms(roi):
+    # Por área: histograma de B/G/R de sus píxeles, medias y diferencias que usa el bot
+    # (g_diff = g - max(r, b), r_diff = r - max(g, b)) y líneas en green_min (verde) y red_min (rojo)
+    names = [n for n in ('wait', 'e', 'r', 't', 'icon') if areas.get(n)]
+    row_h = 90
+    width = 256 * 2 + 20
+    panel = np.full((max(1, len(names)) * row_h + 10, width, 3), 255, dtype=np.uint8)
+    means = roi_means(roi, {name: areas[name] for name in names})
+    for i, name in enumerate(names):
+        rect = areas[name]
+        rroi = roi[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']]
+        top = i * row_h + 10
+        base = top + row_h - 25
+        if name not in means:
+            continue
+        for ch, color in ((0, (255, 0, 0)), (1, (0, 160, 0)), (2, (0, 0, 255))):
+            hist = cv2.calcHist([np.ascontiguousarray(rroi[..., ch])], [0], None, [64], [0, 256]).ravel()
+            if hist.max() > 0:
+                hist = hist / hist.max() * (row_h - 35)
+            pts = np.array([(10 + j * 8, int(base - v)) for j, v in enumerate(hist)], dtype=np.int32)
+            cv2.polylines(panel, [pts], False, color, 1)
+        for value, color in ((thresholds.get('green_min'), (0, 160, 0)), (thresholds.get('red_min'), (0, 0, 255))):
+            if value is not None:
+                x = 10 + int(value) * 2
+                cv2.line(panel, (x, top), (x, base), color, 1)
+        b, g, r = means[name]
+        text = f"{name}: g {g:.0f} r {r:.0f} g_diff {g - max(r, b):+.0f} r_diff {r - max(g, b):+.0f}"
+        cv2.putText(panel, text, (10, base + 18), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 1)
+    return panel
+
 def main():
-    global capture_region, selection_mode, current_rect
+    global selection_mode, current_rect, show_histograms
     cv2.namedWindow("Calibrador")
     cv2.setMouseCallback("Calibrador", mouse_cb)
 
     while True:
-        frame = np.array(sct.grab(monitor))
         if capture_region is None or selection_mode == 'capture':
+            frame = np.array(sct.grab(monitor))
             display = frame.copy()
             if capture_region is not None:
                 x = capture_region['left'] - monitor['left']
@@ -78,19 +184,20 @@ def main():
                 cv2.rectangle(display, (x, y), (x + w, y + h), (0, 255, 0), 2)
             put_text(display, "GLOBAL | C: caja grande | Q: salir | S: guardar")
         else:
-            x = capture_region['left'] - monitor['left']
-            y = capture_region['top'] - monitor['top']
-            w = capture_region['width']
-            h = capture_region['height']
-            roi = frame[y:y + h, x:x + w].copy()
-            display = roi
+            # Con región definida solo se captura esa región, no el monitor entero
+            roi = np.array(sct.grab(capture_region))
+            display = roi.copy()
             put_text(display, "ROI | W/E/R/T: áreas | N: nombre | M: mensaje | I: icono | S: guardar | Q: salir")
+            put_text(display, "B: fondo | G: letras verdes | K: wait rojo | H: histogramas", y=40)
             for name, rect in areas.items():
                 if rect:
                     cv2.rectangle(display, (rect['x'], rect['y']), (rect['x'] + rect['w'], rect['y'] + rect['h']), (0, 255, 0), 2)
                     cv2.putText(display, name, (rect['x'], rect['y'] - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            if show_histograms:
+                cv2.imshow("Histogramas", draw_histograms(roi))
 
         draw_overlay(display, current_rect, (255, 255, 0))
+        draw_progress(display)
         cv2.imshow("Calibrador", display)
         key = cv2.waitKey(1) & 0xFF
 
@@ -120,84 +227,19 @@ def main():
         elif key == ord('m'):
             selection_mode = 'message' if capture_region is not None else None
             current_rect = None
+        elif key == ord('h'):
+            show_histograms = not show_histograms
+            if not show_histograms:
+                cv2.destroyWindow("Histogramas")
         elif key == ord('b'):
-            if capture_region is None:
-                continue
-            x = capture_region['left'] - monitor['left']
-            y = capture_region['top'] - monitor['top']
-            w = capture_region['width']
-            h = capture_region['height']
-            acc = {}
-            cnt = 0
-            for _ in range(120):
-                frame2 = np.array(sct.grab(monitor))
-                roi2 = frame2[y:y + h, x:x + w]
-                for name, rect in areas.items():
-                    if not rect:
-                        continue
-                    rroi = roi2[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']]
-                    if rroi.size == 0:
-                        continue
-                    bgrA = np.mean(rroi, axis=(0, 1))
-                    g = bgrA[1]
-                    r = bgrA[2]
-                    if name not in acc:
-                        acc[name] = {'g': 0.0, 'r': 0.0}
-                    acc[name]['g'] += g
-                    acc[name]['r'] += r
-                cnt += 1
-            for name in acc:
-                baseline[name] = {'g': acc[name]['g'] / cnt, 'r': acc[name]['r'] / cnt}
+            # Fondo: todas las áreas en reposo
+            start_sampling('fondo', list(areas), 120, on_background)
         elif key == ord('g'):
-            if capture_region is None:
-                continue
-            x = capture_region['left'] - monitor['left']
-            y = capture_region['top'] - monitor['top']
-            w = capture_region['width']
-            h = capture_region['height']
-            acc = {}
-            cnt = 0
-            for _ in range(90):
-                frame2 = np.array(sct.grab(monitor))
-                roi2 = frame2[y:y + h, x:x + w]
-                for name in ['e', 'r', 't']:
-                    rect = areas.get(name)
-                    if not rect:
-                        continue
-                    rroi = roi2[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']]
-                    if rroi.size == 0:
-                        continue
-                    bgrA = np.mean(rroi, axis=(0, 1))
-                    g = bgrA[1]
-                    if name not in acc:
-                        acc[name] = {'g': 0.0}
-                    acc[name]['g'] += g
-                cnt += 1
-            for name in acc:
-                active_green[name] = {'g': acc[name]['g'] / cnt}
-        elif key == ord('r'):
-            if capture_region is None:
-                continue
-            rect = areas.get('wait')
-            if not rect:
-                continue
-            x = capture_region['left'] - monitor['left']
-            y = capture_region['top'] - monitor['top']
-            w = capture_region['width']
-            h = capture_region['height']
-            acc_r = 0.0
-            cnt = 0
-            for _ in range(90):
-                frame2 = np.array(sct.grab(monitor))
-                roi2 = frame2[y:y + h, x:x + w]
-                rroi = roi2[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']]
-                if rroi.size == 0:
-                    continue
-                bgrA = np.mean(rroi, axis=(0, 1))
-                acc_r += bgrA[2]
-                cnt += 1
-            if cnt > 0:
-                active_red_wait = acc_r / cnt
+            # Letras E/R/T en verde
+            start_sampling('letras verdes', ['e', 'r', 't'], 90, on_green)
+        elif key == ord('k'):
+            # Barra de espera en rojo (antes en 'r', que ya selecciona el área R)
+            start_sampling('wait rojo', ['wait'], 90, on_wait_red)
         elif key == ord('s'):
             if capture_region is None:
                 continue
@@ -235,23 +277,30 @@ def main():
             if 'r' in wait_base and active_red_wait is not None:
                  final_thresholds['red_min'] = int((wait_base['r'] + active_red_wait) / 2.0)
 
-            cfg = {
-                'capture_region': capture_region,
-                'areas': {k: v for k, v in areas.items() if k in ['wait','e','r','t'] and v is not None},
-                'thresholds': final_thresholds,
-                'keys': ['e', 'r', 't'],
-                'result_name_roi': areas.get('name') or existing_config.get('result_name_roi') or {'x': 0, 'y': 0, 'w': 0, 'h': 0},
-                'result_message_roi': areas.get('message') or existing_config.get('result_message_roi') or {'x': 0, 'y': 0, 'w': 0, 'h': 0},
-                'fishing_icon_roi': areas.get('icon') or existing_config.get('fishing_icon_roi') or {'x': 0, 'y': 0, 'w': 0, 'h': 0},
-                'use_prediction': existing_config.get('use_prediction', True),
-                'start_key': existing_config.get('start_key', '5'),
-                'start_press_on_run': existing_config.get('start_press_on_run', True),
-                'start_focus_delay_seconds': existing_config.get('start_focus_delay_seconds', 4),
-                'log_event_details': existing_config.get('log_event_details', False),
-                'log_debug_values': existing_config.get('log_debug_values', False)
-            }
-            with open("config_fishing.json", "w", encoding="utf-8") as f:
+            # Se parte de la configuración existente y solo se sustituyen las claves calibradas:
+            # el resto (capture_mode, scheduler, confirm, input, event_log, ...) se conserva
+            cfg = dict(existing_config)
+            cfg['capture_region'] = capture_region
+            cfg_areas = dict(existing_config.get('areas') or {})
+            cfg_areas.update({k: v for k, v in areas.items() if k in ['wait','e','r','t'] and v is not None})
+            cfg['areas'] = cfg_areas
+            cfg['thresholds'] = final_thresholds
+            for roi_key, area_key in (('result_name_roi', 'name'), ('result_message_roi', 'message'),
+                                      ('fishing_icon_roi', 'icon')):
+                cfg[roi_key] = areas.get(area_key) or existing_config.get(roi_key) or {'x': 0, 'y': 0, 'w': 0, 'h': 0}
+            # Valores por defecto solo si el fichero aún no los tenía
+            cfg.setdefault('keys', ['e', 'r', 't'])
+            cfg.setdefault('use_prediction', True)
+            cfg.setdefault('start_key', '5')
+            cfg.setdefault('start_press_on_run', True)
+            cfg.setdefault('start_focus_delay_seconds', 4)
+            cfg.setdefault('log_event_details', False)
+            cfg.setdefault('log_debug_values', False)
+            # Escritura atómica: el bot recarga el fichero en caliente y no debe leerlo a medias
+            tmp = "config_fishing.json.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
                 json.dump(cfg, f, indent=2)
+            os.replace(tmp, "config_fishing.json")
             
             print("\n" + "="*40)
             print("   ¡CONFIGURACIÓN GUARDADA CORRECTAMENTE!")
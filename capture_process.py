@@ -0,0 +1,293 @@
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from frame_sources import FrameSource, MssFrameSource, CaptureLayout, create_frame_source
+
+# Captura en un proceso aparte.
+# El proceso hijo captura y escribe cada frame en un buffer circular de memoria compartida
+# (FrameRing) junto con su número de secuencia y su instante de captura. El bot copia el último
+# frame (sin cola): si el bucle va más lento que la captura, los frames intermedios se descartan
+# y se cuentan. Así ni el OCR ni la GUI (que comparten el GIL con el bucle) frenan la captura, y
+# captura y decisión usan núcleos distintos.
+#
+# Lectura tipo seqlock: se copia el slot y después se comprueba que su seq no cambió; si el hijo
+# lo reescribió durante la copia (dio la vuelta al buffer) se reintenta con el último. El frame
+# entregado es del bot y no cambia aunque el hijo siga escribiendo.
+# El hijo avisa de cada frame con un Event (el bot no sondea) y captura al ritmo que pide el
+# planificador del bot (set_pace), con fps como tope: en 'esperando' y 'cooldown' también ahorra.
+
+HEADER_FIELDS = 2   # [último seq escrito, frames escritos]
+
+
+class FrameRing:
+    # Cabecera int64 + seq por slot (int64) + instante de captura por slot (float64) + frames.
+    # name=None crea el bloque; con nombre se adjunta a uno existente (proceso hijo).
+    def __init__(self, shape, slots=4, name=None):
+        self.shape = tuple(shape)
+        self.slots = max(2, int(slots))
+        meta = (HEADER_FIELDS + 2 * self.slots) * 8
+        # Frames alineados a 64 bytes
+        offset = (meta + 63) // 64 * 64
+        size = offset + int(np.prod(self.shape)) * self.slots
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        buf = self.shm.buf
+        self.header = np.ndarray((HEADER_FIELDS,), np.int64, buf, 0)
+        self.seqs = np.ndarray((self.slots,), np.int64, buf, HEADER_FIELDS * 8)
+        self.times = np.ndarray((self.slots,), np.float64, buf, (HEADER_FIELDS + self.slots) * 8)
+        self.frames = np.ndarray((self.slots,) + self.shape, np.uint8, buf, offset)
+        if self.owner:
+            self.header[:] = (-1, 0)
+            self.seqs[:] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, img, captured_at):
+        seq = int(self.header[0]) + 1
+        slot = seq % self.slots
+        # -1 mientras se escribe: un lector nunca toma un slot a medias
+        self.seqs[slot] = -1
+        self.frames[slot] = img
+        self.times[slot] = captured_at
+        self.seqs[slot] = seq
+        self.header[0] = seq
+        self.header[1] += 1
+
+    @property
+    def written(self):
+        return int(self.header[1])
+
+    def latest_seq(self):
+        return int(self.header[0])
+
+    def latest(self, retries=3):
+        # (seq, copia del frame, instante de captura) del último frame completo, o None
+        for _ in range(retries):
+            seq = int(self.header[0])
+            if seq < 0:
+                return None
+            slot = seq % self.slots
+            if int(self.seqs[slot]) != seq:
+                continue
+            frame = self.frames[slot].copy()
+            captured_at = float(self.times[slot])
+            # Validación tras la copia: si el slot se reescribió, la copia puede estar rota
+            if int(self.seqs[slot]) == seq:
+                return seq, frame, captured_at
+        return None
+
+    def close(self):
+        # Las vistas de numpy deben soltarse antes de cerrar la memoria compartida
+        self.header = self.seqs = self.times = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Aún hay vistas vivas del último frame: el mapeo se libera con ellas
+            pass
+        if self.owner:
+            self.shm.unlink()
+
+
+def capture_main(ring_name, shape, slots, monitor, spec, config, layout, fps, stop, ready, pace, wake):
+    # Proceso hijo: captura y escribe hasta que se pide parar o la fuente se agota.
+    # ready: se activa tras cada frame; pace: FPS que pide el bot (0 = fps); wake: cambio de ritmo
+    ring = FrameRing(shape, slots, ring_name)
+    if not spec or spec == 'live':
+        source = MssFrameSource(monitor)
+    else:
+        source = create_frame_source(spec, config)
+    if layout is not None:
+        parts, width, height = layout
+        source.set_layout(CaptureLayout(parts, width, height, {}))
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            img = source.grab()
+            if img is None:
+                break
+            ring.write(img, source.last_capture_time)
+            ready.set()
+            target = pace.value
+            if fps and fps > 0:
+                target = min(target, fps) if target > 0 else fps
+            period = 1.0 / target if target > 0 else 0.0
+            rest = period - (time.perf_counter() - start)
+            if rest > 0:
+                # Espera interrumpible: si el bot sube el ritmo (p. ej. '!' rojo) se captura ya
+                wake.wait(rest)
+                wake.clear()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        ring.close()
+
+
+class ProcessFrameSource(FrameSource):
+    # FrameSource que lee del proceso de captura. config: bloque capture_process.
+    # spec/source_config: fuente del hijo ('live' por defecto; replays solo para pruebas).
+    live = True
+
+    def __init__(self, monitor, config=None, spec=None, source_config=None):
+        super().__init__()
+        config = config or {}
+        self.monitor = dict(monitor)
+        self.spec = spec
+        # Con un replay en el hijo el bucle no se limita: el ritmo lo marca la captura
+        self.live = not spec or spec == 'live'
+        self.source_config = dict(source_config or {})
+        self.slots = int(config.get('slots', 4))
+        self.fps = float(config.get('fps', 60))
+        # Plazo máximo de cada espera de frame antes de comprobar que el hijo sigue vivo
+        self.wait_timeout = float(config.get('wait_timeout_seconds', 0.1))
+        # spawn igual en Windows y Linux: el hijo no hereda el estado del bot
+        self.ctx = mp.get_context('spawn')
+        self.process = None
+        self.ring = None
+        self.stop_event = None
+        self.ready = None
+        self.pace = None
+        self.wake = None
+        self.pace_fps = 0.0
+        self.last_seq = -1
+        self.torn = 0
+        self.dropped = 0
+        self.written_before = 0
+        self.region_source = None
+
+    def _start(self):
+        self._stop()
+        if self.layout is not None:
+            shape = (self.layout.height, self.layout.width, 4)
+            # Copias simples: las regiones compiladas son de solo lectura y no se serializan
+            parts = [(dict(r), dx, dy) for r, dx, dy in self.layout.parts]
+            layout = (parts, self.layout.width, self.layout.height)
+        else:
+            shape = (self.monitor['height'], self.monitor['width'], 4)
+            layout = None
+        self.ring = FrameRing(shape, self.slots)
+        self.stop_event = self.ctx.Event()
+        self.ready = self.ctx.Event()
+        self.wake = self.ctx.Event()
+        self.pace = self.ctx.Value('d', self.pace_fps, lock=False)
+        process = self.ctx.Process(
+            target=capture_main, name="capture", daemon=True,
+            args=(self.ring.name, shape, self.slots, self.monitor, self.spec, self.source_config,
+                  layout, self.fps, self.stop_event, self.ready, self.pace, self.wake))
+        try:
+            process.start()
+        except Exception:
+            self._stop()
+            raise
+        self.process = process
+        self.last_seq = -1
+
+    def _stop(self):
+        if self.process is not None:
+            self.stop_event.set()
+            self.process.join(2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.ring is not None:
+            self.written_before += self.ring.written
+            self.last_full = None
+            self.ring.close()
+            self.ring = None
+
+    def set_layout(self, layout):
+        # El tamaño del buffer depende de la layout: se reinicia el proceso si ya corría
+        self.layout = layout
+        if self.process is not None:
+            self._start()
+
+    def set_pace(self, fps):
+        # Ritmo que pide el planificador del bot (None = sin límite propio: fps del bloque)
+        fps = float(fps) if fps else 0.0
+        if fps == self.pace_fps:
+            return
+        faster = self.pace_fps > 0 and (fps == 0 or fps > self.pace_fps)
+        self.pace_fps = fps
+        if self.pace is not None:
+            self.pace.value = fps
+            if faster:
+                self.wake.set()
+
+    def next_item(self):
+        # Último frame nuevo (copiado y validado), o None si aún no hay
+        if self.ring.latest_seq() <= self.last_seq:
+            return None
+        item = self.ring.latest()
+        if item is None:
+            # El hijo reescribió el slot durante cada intento de copia
+            self.torn += 1
+            return None
+        if item[0] <= self.last_seq:
+            return None
+        return item
+
+    def grab(self):
+        if self.process is None:
+            self._start()
+        while True:
+            item = self.next_item()
+            if item is not None:
+                break
+            # Se desactiva el aviso y se vuelve a mirar: un frame escrito entre medias no se pierde
+            self.ready.clear()
+            item = self.next_item()
+            if item is not None:
+                break
+            if not self.process.is_alive():
+                # Proceso terminado (fuente de replay agotada o error): solo queda lo ya escrito
+                item = self.next_item()
+                if item is None:
+                    return None
+                break
+            self.ready.wait(self.wait_timeout)
+        seq, frame, captured_at = item
+        if self.last_seq >= 0:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.frames_grabbed += 1
+        self.last_capture_time = captured_at
+        self.last_full = frame if self.layout is None else None
+        return frame
+
+    def now(self):
+        if not self.live:
+            # Replay: reloj simulado del hijo
+            return self.last_capture_time if self.last_capture_time is not None else time.time()
+        return time.time()
+
+    def grab_region(self, rect):
+        if self.layout is None:
+            return super().grab_region(rect)
+        if not self.live:
+            return None
+        # En vivo, recorte puntual desde este proceso (p. ej. el nombre del pez para el OCR)
+        if self.region_source is None:
+            self.region_source = MssFrameSource(self.monitor)
+        self.region_source.monitor = self.monitor
+        return self.region_source.grab_region(rect)
+
+    @property
+    def written(self):
+        return self.written_before + (self.ring.written if self.ring is not None else 0)
+
+    def report(self):
+        report = (f"Proceso de captura: {self.written} frames escritos, {self.frames_grabbed} leídos, "
+                  f"{self.dropped} descartados sin leer")
+        if self.torn:
+            report += f", {self.torn} lecturas repetidas por reescritura"
+        return report
+
+    def close(self):
+        self._stop()
+        if self.region_source is not None:
+            self.region_source.close()
+            self.region_source = None
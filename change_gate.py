@@ -0,0 +1,97 @@
+import numpy as np
+
+# Detector de cambios por ROI.
+# Guarda una muestra submuestreada (1 de cada 'step' filas y columnas) de los píxeles de cada
+# región y la compara con la del frame anterior mediante la suma de diferencias absolutas (SAD).
+# Si ninguna región cambió más que la tolerancia, el bot reutiliza la clasificación anterior.
+
+
+class ChangeGate:
+    def __init__(self, regions, config=None):
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.step = max(1, int(config.get('step', 2)))
+        # Diferencia media permitida por byte (0 = solo frames idénticos se consideran iguales)
+        self.tolerance = float(config.get('tolerance', 1.0))
+        self.regions = {name: rect for name, rect in regions.items()
+                        if rect and rect.get('w', 0) > 0 and rect.get('h', 0) > 0}
+        self.shape = None
+        self.names = []
+        self.index = None
+        self.offsets = None
+        self.counts = None
+        self.previous = None
+        self.frames = 0
+        self.skipped = 0
+        self.changed_counts = {}
+
+    def compile(self, shape):
+        height, width = shape[:2]
+        names, chunks, offsets, counts = [], [], [], []
+        pos = 0
+        for name, rect in self.regions.items():
+            x, y, w, h = rect['x'], rect['y'], rect['w'], rect['h']
+            if y + h > height or x + w > width:
+                continue
+            ys = np.arange(y, y + h, self.step, dtype=np.intp)
+            xs = np.arange(x, x + w, self.step, dtype=np.intp)
+            idx = (ys[:, None] * width + xs[None, :]).ravel()
+            chunks.append(idx)
+            names.append(name)
+            offsets.append(pos)
+            counts.append(idx.size)
+            pos += idx.size
+        self.shape = shape
+        self.names = names
+        self.index = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.intp)
+        self.offsets = np.array(offsets, dtype=np.intp)
+        self.counts = np.array(counts, dtype=np.float64)
+        self.previous = None
+
+    def _sample(self, img):
+        channels = img.shape[2]
+        if channels == 4 and img.flags.c_contiguous:
+            return img.view(np.uint32).reshape(-1)[self.index].view(np.uint8).reshape(-1, 4)
+        return img.reshape(-1, channels)[self.index]
+
+    def changed_regions(self, img):
+        # Devuelve la lista de ROIs que cambiaron (todas en el primer frame)
+        if img.shape != self.shape:
+            self.compile(img.shape)
+        sample = self._sample(img)
+        previous = self.previous
+        if previous is None or not self.names:
+            self.previous = sample
+            return list(self.names)
+        if np.array_equal(sample, previous):
+            return []
+        diff = np.abs(sample.astype(np.int16) - previous).sum(axis=1)
+        sad = np.add.reduceat(diff, self.offsets) / (self.counts * sample.shape[1])
+        changed = [name for name, value in zip(self.names, sad.tolist()) if value > self.tolerance]
+        if changed:
+            # La referencia es el último frame clasificado: así una deriva lenta acaba detectándose
+            self.previous = sample
+        return changed
+
+    def changed(self, img):
+        self.frames += 1
+        if not self.enabled:
+            return True
+        changed = self.changed_regions(img)
+        for name in changed:
+            self.changed_counts[name] = self.changed_counts.get(name, 0) + 1
+        if changed:
+            return True
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        self.previous = None
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def report(self, label=None):
+        name = f" ({label})" if label else ""
+        return f"Frames sin cambios{name}: {self.skipped}/{self.frames} ({self.skip_ratio * 100:.1f}% clasificaciones evitadas)"
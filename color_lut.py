@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import argparse
+from collections import namedtuple
+import numpy as np
+import cv2
+
+from color_stats import region_pixel_index, gather_pixels
+from settings import CONFIG_FILE, Settings, read_config
+
+# Clasificador de píxeles por tabla de color (LUT 3D).
+# Cada color BGR se cuantiza a 'bits' bits por canal y la tabla dice su clase: neutro, verde
+# (letra activa / espera) o rojo (letra fallada / ¡pez picó!). Por frame, cada ROI se resume en
+# la fracción de sus píxeles de cada clase con un np.take y un bincount; a diferencia de la media
+# de color, los bordes suavizados del glifo y el fondo no diluyen la señal.
+#
+# La tabla se construye offline a partir de frames etiquetados (dataset/labels.json) y se guarda
+# en color_lut.npz, junto a config_fishing.json:
+#   python color_lut.py                    # construir desde dataset/labels.json
+#   python color_lut.py --from-thresholds  # tabla inicial a partir de los umbrales actuales
+#
+# dataset/labels.json: {"fichero.jpg": {"wait": "red", "e": "green", "r": "neutral", ...}, ...}
+# Solo hace falta etiquetar las ROIs que se vean claras en cada captura.
+
+CLASSES = ('neutral', 'green', 'red')
+NEUTRAL, GREEN, RED = range(3)
+DEFAULT_BITS = 5
+LUT_FILE = 'color_lut.npz'
+LABELS_FILE = os.path.join('dataset', 'labels.json')
+IMAGES_DIR = os.path.join('dataset', 'images')
+LUT_ROIS = ('wait', 'e', 'r', 't')
+
+# Fracción de píxeles de cada clase en una ROI
+ClassFractions = namedtuple('ClassFractions', 'neutral green red')
+
+EMPTY_FRACTIONS = ClassFractions(1.0, 0.0, 0.0)
+
+
+def color_index(pixels, bits):
+    # Índice de la tabla para píxeles (N, >=3) BGR(A) uint8
+    shift = 8 - bits
+    b = pixels[:, 0] >> shift
+    g = pixels[:, 1] >> shift
+    r = pixels[:, 2] >> shift
+    return (b.astype(np.intp) << (2 * bits)) | (g.astype(np.intp) << bits) | r
+
+
+class ColorLut:
+    def __init__(self, table, bits=DEFAULT_BITS):
+        self.bits = int(bits)
+        self.table = np.ascontiguousarray(table, dtype=np.uint8).reshape(-1)
+        if self.table.size != 1 << (3 * self.bits):
+            raise ValueError(f"Tabla de {self.table.size} entradas no válida para {self.bits} bits")
+        # Copia indexada directamente por el píxel BGRA empaquetado (uint32 >> shift & mask):
+        # cada canal cuantizado queda en su byte y no hace falta recomponer el índice
+        m = (1 << self.bits) - 1
+        q = np.arange(self.table.size)
+        b, g, r = q >> (2 * self.bits), (q >> self.bits) & m, q & m
+        self.shift = 8 - self.bits
+        self.mask = m | (m << 8) | (m << 16)
+        self.packed = np.zeros(1 << (16 + self.bits), dtype=np.uint8)
+        self.packed[b | (g << 8) | (r << 16)] = self.table
+
+    @classmethod
+    def load(cls, path=LUT_FILE):
+        with np.load(path) as data:
+            return cls(data['table'], int(data['bits']))
+
+    def save(self, path=LUT_FILE):
+        tmp = path + '.tmp.npz'
+        np.savez_compressed(tmp, table=self.table, bits=np.int64(self.bits))
+        os.replace(tmp, path)
+
+    @staticmethod
+    def centers(bits):
+        # Color central (B, G, R) de cada celda de la tabla, en el orden del índice
+        levels = (np.arange(1 << bits) << (8 - bits)) + (1 << (7 - bits))
+        b, g, r = np.meshgrid(levels, levels, levels, indexing='ij')
+        return b.ravel(), g.ravel(), r.ravel()
+
+    @classmethod
+    def from_thresholds(cls, settings, bits=DEFAULT_BITS):
+        # Misma regla que las medias por ROI, aplicada a cada color: punto de partida sin datos
+        b, g, r = cls.centers(bits)
+        table = np.full(b.size, NEUTRAL, dtype=np.uint8)
+        green = (g >= settings.green_min) & (g - np.maximum(r, b) > settings.green_diff_min)
+        red = (r >= settings.red_min) & (r - np.maximum(g, b) > settings.letter_red_diff_min)
+        table[green] = GREEN
+        table[red] = RED
+        return cls(table, bits)
+
+    @classmethod
+    def from_counts(cls, counts, bits=DEFAULT_BITS, ratio=4.0, min_count=3):
+        # counts: (3, celdas) píxeles de cada celda en ROIs etiquetadas con cada clase.
+        # Una celda es verde/roja si es 'ratio' veces más frecuente en esas ROIs que en las
+        # neutras (el fondo y los bordes aparecen en todas y quedan neutros).
+        totals = counts.sum(axis=1, keepdims=True).astype(np.float64)
+        freq = counts / np.maximum(totals, 1.0)
+        hits = {}
+        for cls_id in (GREEN, RED):
+            score = freq[cls_id] / np.maximum(freq[NEUTRAL], 1e-9)
+            hits[cls_id] = (counts[cls_id] >= min_count) & (score >= ratio)
+        table = np.full(counts.shape[1], NEUTRAL, dtype=np.uint8)
+        table[hits[GREEN]] = GREEN
+        # Celda candidata a las dos clases: gana la más frecuente
+        table[hits[RED] & ~(hits[GREEN] & (freq[GREEN] >= freq[RED]))] = RED
+        return cls(table, bits)
+
+    def coverage(self):
+        return {name: int((self.table == i).sum()) for i, name in enumerate(CLASSES)}
+
+
+class ColorClassEngine:
+    # Fracciones de clase de todas las regiones en una sola pasada por frame
+    def __init__(self, regions, lut):
+        self.regions = {name: rect for name, rect in regions.items() if rect}
+        self.lut = lut
+        self.shape = None
+        self.names = []
+        self.index = None
+        self.bins = None
+        self.counts = None
+
+    def compile(self, shape):
+        names, index, counts = region_pixel_index(self.regions, shape)
+        self.shape = shape
+        self.names = names
+        self.index = index
+        self.counts = np.array(counts, dtype=np.float64)
+        # Región de cada píxel recogido, ya multiplicada por el nº de clases para el bincount
+        self.bins = np.repeat(np.arange(len(names), dtype=np.intp) * len(CLASSES), counts)
+
+    def compute(self, img):
+        if img.shape != self.shape:
+            self.compile(img.shape)
+        result = dict.fromkeys(self.regions, EMPTY_FRACTIONS)
+        if not self.names:
+            return result
+        lut = self.lut
+        if img.shape[2] == 4 and img.flags.c_contiguous:
+            # BGRA (mss): un desplazamiento y una máscara sobre el píxel como uint32
+            packed = img.view(np.uint32).reshape(-1)[self.index]
+            np.right_shift(packed, lut.shift, out=packed)
+            np.bitwise_and(packed, lut.mask, out=packed)
+            classes = np.take(lut.packed, packed)
+        else:
+            classes = np.take(lut.table, color_index(gather_pixels(img, self.index), lut.bits))
+        hist = np.bincount(self.bins + classes, minlength=len(self.names) * len(CLASSES))
+        fractions = hist.reshape(-1, len(CLASSES)) / self.counts[:, None]
+        for name, row in zip(self.names, fractions.tolist()):
+            result[name] = ClassFractions(*row)
+        return result
+
+
+def load_labels(path=LABELS_FILE):
+    with open(path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    out = {}
+    for name, rois in labels.items():
+        rois = {roi: label for roi, label in rois.items() if label in CLASSES}
+        if rois:
+            out[name] = rois
+    return out
+
+
+def labeled_rois(images_dir, labels, regions):
+    # (ROI, clase, píxeles BGR) de cada ROI etiquetada en las capturas que existen
+    for name, rois in sorted(labels.items()):
+        img = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Sin imagen para la etiqueta {name}")
+            continue
+        for roi, label in rois.items():
+            rect = regions.get(roi)
+            if rect is None:
+                continue
+            x, y, w, h = rect['x'], rect['y'], rect['w'], rect['h']
+            patch = img[y:y+h, x:x+w]
+            if patch.shape[:2] != (h, w):
+                continue
+            yield roi, CLASSES.index(label), patch.reshape(-1, 3)
+
+
+def collect_counts(samples, bits):
+    counts = np.zeros((len(CLASSES), 1 << (3 * bits)), dtype=np.int64)
+    for _, cls_id, pixels in samples:
+        counts[cls_id] += np.bincount(color_index(pixels, bits), minlength=counts.shape[1])
+    return counts
+
+
+def suggest_fractions(lut, samples):
+    # Umbral por clase: punto medio entre la fracción más baja de las ROIs de esa clase
+    # y la más alta de las demás (None si no hay ejemplos de las dos)
+    out = {}
+    for cls_id in (GREEN, RED):
+        pos, neg = [], []
+        for _, label, pixels in samples:
+            frac = float((np.take(lut.table, color_index(pixels, lut.bits)) == cls_id).mean())
+            (pos if label == cls_id else neg).append(frac)
+        if pos and neg:
+            out[CLASSES[cls_id]] = {'min_positive': min(pos), 'max_negative': max(neg),
+                                    'suggested': (min(pos) + max(neg)) / 2}
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construye la LUT de color de las ROIs")
+    parser.add_argument('--labels', default=LABELS_FILE, help="Etiquetas por captura y ROI")
+    parser.add_argument('--images', default=IMAGES_DIR, help="Carpeta de capturas")
+    parser.add_argument('--out', default=None, help=f"Fichero de salida (por defecto color_lut.path o {LUT_FILE})")
+    parser.add_argument('--bits', type=int, default=DEFAULT_BITS, help="Bits por canal (4-6)")
+    parser.add_argument('--ratio', type=float, default=4.0,
+                        help="Cuántas veces más frecuente que en ROIs neutras debe ser un color")
+    parser.add_argument('--from-thresholds', action='store_true',
+                        help="Construir desde los umbrales de config_fishing.json, sin etiquetas")
+    args = parser.parse_args(argv)
+    config = read_config(CONFIG_FILE)
+    settings = Settings(config)
+    out = args.out or settings.color_lut.get('path', LUT_FILE)
+
+    if args.from_thresholds:
+        lut = ColorLut.from_thresholds(settings, args.bits)
+        samples = []
+    else:
+        if not os.path.exists(args.labels):
+            print(f"No existe {args.labels}; usa --from-thresholds o etiqueta algunas capturas")
+            return 1
+        labels = load_labels(args.labels)
+        regions = {name: rect for name, rect in settings.regions.items() if name in LUT_ROIS}
+        samples = list(labeled_rois(args.images, labels, regions))
+        if not samples:
+            print("No hay ROIs etiquetadas utilizables")
+            return 1
+        per_class = {name: sum(1 for _, c, _ in samples if c == i) for i, name in enumerate(CLASSES)}
+        print(f"ROIs etiquetadas: {per_class}")
+        if not per_class['neutral']:
+            print("Aviso: sin ROIs neutras el fondo no se distingue; etiqueta también ROIs apagadas")
+        lut = ColorLut.from_counts(collect_counts(samples, args.bits), args.bits, ratio=args.ratio)
+
+    lut.save(out)
+    print(f"LUT guardada en {out} ({args.bits} bits/canal): celdas por clase {lut.coverage()}")
+    for name, info in suggest_fractions(lut, samples).items():
+        line = (f"  {name}: fracción mín. en sus ROIs {info['min_positive']:.2f}, "
+                f"máx. en el resto {info['max_negative']:.2f}")
+        if info['min_positive'] > info['max_negative']:
+            line += f" -> sugerido color_lut.{name}_fraction = {info['suggested']:.2f}"
+        else:
+            line += " -> se solapan: revisa las etiquetas o prueba otro --ratio"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
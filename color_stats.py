@@ -0,0 +1,89 @@
+from collections import namedtuple
+import numpy as np
+
+# Estadísticas de color de todas las regiones en una sola pasada por frame.
+# En lugar de recortar cada ROI y hacer un np.mean por canal, se precalculan los índices
+# de píxel de todas las regiones (una vez por tamaño de frame), se recogen de golpe y se
+# suman por región con un único producto matricial (matriz de pertenencia región x píxel).
+
+# g, r, b: medias por canal | g_diff = g - max(r, b) | r_diff = r - max(g, b)
+# mean: media de todos los canales (incluido alfa), como hacía menu_present
+RegionStats = namedtuple('RegionStats', 'g r b g_diff r_diff mean')
+
+EMPTY_STATS = RegionStats(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+
+def _valid_rect(rect):
+    return bool(rect) and rect.get('w', 0) > 0 and rect.get('h', 0) > 0
+
+
+def region_pixel_index(regions, shape):
+    # Índices planos de los píxeles de cada región válida, concatenados en orden.
+    # Devuelve (nombres, índices, píxeles por región)
+    height, width = shape[:2]
+    names, chunks, counts = [], [], []
+    for name, rect in regions.items():
+        if not _valid_rect(rect):
+            continue
+        x, y, w, h = rect['x'], rect['y'], rect['w'], rect['h']
+        # Misma regla que process_region: si se sale del frame no se analiza
+        if y + h > height or x + w > width:
+            continue
+        ys = np.arange(y, y + h, dtype=np.intp)
+        xs = np.arange(x, x + w, dtype=np.intp)
+        chunks.append((ys[:, None] * width + xs[None, :]).ravel())
+        names.append(name)
+        counts.append(w * h)
+    index = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.intp)
+    return names, index, counts
+
+
+def gather_pixels(img, index):
+    # (N, canales) con los píxeles de index
+    channels = img.shape[2]
+    if channels == 4 and img.flags.c_contiguous:
+        # BGRA (mss): recoger cada píxel como un uint32 es ~10x más rápido que por filas
+        return img.view(np.uint32).reshape(-1)[index].view(np.uint8).reshape(-1, 4)
+    return img.reshape(-1, channels)[index]
+
+
+class ColorStatsEngine:
+    def __init__(self, regions):
+        # regions: {nombre: {'x', 'y', 'w', 'h'}} en coordenadas de la región de captura
+        self.regions = {name: rect for name, rect in regions.items() if rect}
+        self.shape = None
+        self.names = []
+        self.index = None
+        self.counts = None
+        self.membership = None
+
+    def compile(self, shape):
+        names, index, counts = region_pixel_index(self.regions, shape)
+        self.shape = shape
+        self.names = names
+        self.index = index
+        self.counts = np.array(counts, dtype=np.float64)
+        # Sumas en float32 son exactas: max 255 * píxeles de la ROI << 2**24
+        self.membership = np.zeros((len(names), index.size), dtype=np.float32)
+        start = 0
+        for i, count in enumerate(counts):
+            self.membership[i, start:start + count] = 1.0
+            start += count
+
+    def compute(self, img):
+        if img.shape != self.shape:
+            self.compile(img.shape)
+        result = dict.fromkeys(self.regions, EMPTY_STATS)
+        if not self.names:
+            return result
+        pixels = gather_pixels(img, self.index)
+        sums = self.membership @ pixels.astype(np.float32)
+        means = sums / self.counts[:, None]
+        b, g, r = means[:, 0], means[:, 1], means[:, 2]
+        g_diff = g - np.maximum(r, b)
+        r_diff = r - np.maximum(g, b)
+        mean_all = means.mean(axis=1)
+        rows = zip(g.tolist(), r.tolist(), b.tolist(), g_diff.tolist(), r_diff.tolist(), mean_all.tolist())
+        for name, row in zip(self.names, rows):
+            result[name] = RegionStats(*row)
+        return result
@@ -0,0 +1,113 @@
+# Confirmación de señales por frames con histéresis.
+# Una señal (p. ej. la letra E activa) se confirma cuando supera los umbrales de encendido
+# durante 'frames' frames seguidos y además ha pasado 'min_latency_seconds' desde la captura
+# del primer frame que la cumplió. Una vez confirmada se mantiene mientras cumpla los umbrales
+# de apagado (más permisivos, umbral - 'hysteresis') y se suelta tras 'release_frames' frames
+# sin cumplirlos. Los tiempos son los de captura del frame, no los del bucle.
+
+DEFAULTS = {
+    'frames': 2,
+    'min_latency_seconds': 0.03,
+    'release_frames': 2,
+    'hysteresis': 8.0
+}
+
+
+class Confirmer:
+    __slots__ = ('frames', 'min_latency', 'release', 'margin',
+                 'count', 'first_at', 'off_count', 'on', 'confirmed_at',
+                 'confirmations', 'latency_total')
+
+    def __init__(self, frames=2, min_latency=0.03, release=2, margin=8.0):
+        self.frames = max(1, int(frames))
+        self.min_latency = max(0.0, float(min_latency))
+        self.release = max(1, int(release))
+        self.margin = float(margin)
+        self.confirmations = 0
+        self.latency_total = 0.0
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.first_at = None
+        self.off_count = 0
+        self.on = False
+        self.confirmed_at = None
+
+    @property
+    def seen(self):
+        # Hay al menos un frame que la cumple (pendiente o ya confirmada)
+        return self.on or self.count > 0
+
+    def update(self, strong, weak, captured_at):
+        # strong: cumple los umbrales de encendido | weak: cumple los de apagado
+        if self.on:
+            if weak:
+                self.off_count = 0
+            else:
+                self.off_count += 1
+                if self.off_count >= self.release:
+                    self.reset()
+            return self.on
+        if strong:
+            if self.count == 0:
+                self.first_at = captured_at
+            self.count += 1
+            if self.count >= self.frames and captured_at - self.first_at >= self.min_latency:
+                self.on = True
+                self.off_count = 0
+                self.confirmed_at = captured_at
+                self.confirmations += 1
+                self.latency_total += captured_at - self.first_at
+        elif not weak:
+            # Ni siquiera cumple los de apagado: se descarta lo acumulado
+            # (entre los dos umbrales la cuenta se conserva, pero no avanza)
+            self.count = 0
+            self.first_at = None
+        return self.on
+
+
+class ConfirmEngine:
+    def __init__(self, signals, config=None):
+        # signals: {campo de FrameSignals: ROI}; la configuración puede afinarse por ROI
+        config = config or {}
+        per_roi = config.get('rois', {})
+        self.signals = dict(signals)
+        self.confirmers = {}
+        self.margins = {}
+        for name, roi in self.signals.items():
+            opts = dict(DEFAULTS)
+            opts.update({k: v for k, v in config.items() if k in DEFAULTS})
+            opts.update(per_roi.get(roi, {}))
+            self.confirmers[name] = Confirmer(opts['frames'], opts['min_latency_seconds'],
+                                              opts['release_frames'], opts['hysteresis'])
+            self.margins[roi] = float(opts['hysteresis'])
+
+    def __getitem__(self, name):
+        return self.confirmers[name]
+
+    def margin(self, roi):
+        return self.margins.get(roi, DEFAULTS['hysteresis'])
+
+    def update(self, strong, weak, captured_at):
+        # strong/weak: señales del frame con umbrales de encendido/apagado
+        for name, confirmer in self.confirmers.items():
+            confirmer.update(getattr(strong, name), getattr(weak, name), captured_at)
+
+    def reset(self):
+        for confirmer in self.confirmers.values():
+            confirmer.reset()
+
+    def summary(self):
+        out = {}
+        for name, c in self.confirmers.items():
+            out[name] = {
+                'confirmations': c.confirmations,
+                'mean_latency': c.latency_total / c.confirmations if c.confirmations else 0.0
+            }
+        return out
+
+    def report(self):
+        parts = [f"{name}: {info['confirmations']}x, media {info['mean_latency'] * 1000:.0f} ms"
+                 for name, info in self.summary().items() if info['confirmations']]
+        return "Confirmación " + " | ".join(parts) if parts else None
@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import json
+import time
+import glob
+import queue
+import argparse
+import threading
+
+# Registro estructurado de eventos (JSON Lines, solo se añade).
+# emit() no toca disco ni consola: encola el evento y un hilo escritor lo vuelca por lotes
+# (todo lo que haya en la cola en cada vuelta) y también imprime su mensaje, si lo tiene.
+# Cuando el fichero supera max_bytes se rota: events.jsonl -> events.jsonl.1 -> ... -> .N
+#
+# Analítica (recorre los ficheros línea a línea, sin cargarlos enteros):
+#   python event_log.py [logs/events.jsonl] [--json] [--all]   # --all: incluir replays/sintéticos
+
+EVENTS_FILE = os.path.join('logs', 'events.jsonl')
+# Fuentes de captura real (para registros sin el campo 'live' en bot_start)
+LIVE_SOURCES = ('MssFrameSource', 'ProcessFrameSource')
+
+
+class EventLog:
+    def __init__(self, path=EVENTS_FILE, max_bytes=5_000_000, backups=5, enabled=True,
+                 echo_all=False, maxsize=10000):
+        self.path = path
+        self.max_bytes = int(max_bytes)
+        self.backups = max(0, int(backups))
+        self.enabled = enabled and bool(path)
+        # echo_all: imprimir también los eventos sin mensaje (detalle de estados, etc.)
+        self.echo_all = echo_all
+        self.written = 0
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.file = None
+        self.thread = threading.Thread(target=self._loop, name="event-log", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def from_config(cls, config, echo_all=False):
+        config = config or {}
+        return cls(config.get('path', EVENTS_FILE),
+                   max_bytes=config.get('max_bytes', 5_000_000),
+                   backups=config.get('backups', 5),
+                   enabled=config.get('enabled', True),
+                   echo_all=echo_all)
+
+    def emit(self, kind, message=None, t=None, **fields):
+        event = {'t': round(time.time() if t is None else t, 3), 'kind': kind}
+        event.update(fields)
+        try:
+            self.queue.put_nowait((event, message))
+        except queue.Full:
+            # Nunca se bloquea al bucle: el evento se pierde y se cuenta
+            self.dropped += 1
+
+    def _open(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _rotate(self):
+        self.file.close()
+        self.file = None
+        if self.backups == 0:
+            os.remove(self.path)
+        else:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def _write(self, batch):
+        lines = []
+        for event, message in batch:
+            if message:
+                print(message)
+            elif self.echo_all:
+                print(f"[{event['kind']}] " + " ".join(f"{k}={v}" for k, v in event.items()
+                                                      if k not in ('t', 'kind')))
+            lines.append(json.dumps(event, ensure_ascii=False))
+        if not self.enabled:
+            return
+        try:
+            if self.file is None:
+                self._open()
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            self.written += len(lines)
+            if self.max_bytes > 0 and self.file.tell() >= self.max_bytes:
+                self._rotate()
+        except Exception as e:
+            print(f"Error escribiendo {self.path}: {e}")
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            stop = False
+            # Lote: el primer evento y todo lo que ya esté en cola
+            while True:
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if stop:
+                break
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self, timeout=5.0):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+        if self.dropped:
+            print(f"Registro de eventos: {self.dropped} eventos descartados (cola llena)")
+
+
+def log_files(path):
+    # Ficheros rotados del más antiguo al más reciente, y por último el actual
+    rotated = []
+    for name in glob.glob(glob.escape(path) + '.*'):
+        match = re.search(r'\.(\d+)$', name)
+        if match:
+            rotated.append((int(match.group(1)), name))
+    files = [name for _, name in sorted(rotated, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_events(path):
+    for name in log_files(path):
+        with open(name, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Línea cortada (p. ej. el bot se cerró a mitad de escritura)
+                    continue
+
+
+def run_is_live(ev):
+    # Registros antiguos sin 'live': solo la captura de pantalla cuenta como partida real
+    return ev.get('live', ev.get('source') in LIVE_SOURCES)
+
+
+def analyze(events, include_replay=False):
+    # Agregados en una sola pasada. Los replays, --headless con --source y los sintéticos
+    # escriben en el mismo fichero: sus ejecuciones (bot_start con live false) se cuentan
+    # aparte y no entran en las cifras salvo con include_replay.
+    active = 0.0
+    runs = {}
+    last_t = None
+    catches = 0
+    per_scope = {}
+    timeouts = 0
+    lost = 0.0
+    skipped_runs = 0
+    for ev in events:
+        t = ev.get('t')
+        kind = ev.get('kind')
+        # Cada cliente (multi_bot.py) tiene su propia ejecución
+        client = ev.get('client')
+        run = runs.get(client)
+        if kind == 'bot_start':
+            if run is not None and run[1] and last_t is not None:
+                # Ejecución anterior sin bot_stop (cierre brusco): cuenta hasta su último evento
+                active += last_t - run[0]
+            counted = include_replay or run_is_live(ev)
+            if not counted:
+                skipped_runs += 1
+            runs[client] = (t, counted)
+            last_t = t
+            continue
+        if run is None or not run[1]:
+            # Fuera de una ejecución contada
+            continue
+        if kind == 'bot_stop':
+            active += t - run[0]
+            del runs[client]
+        elif kind == 'catch':
+            catches += 1
+            scope = f"{ev.get('location') or '?'} / {ev.get('bait') or '?'}"
+            fish = ev.get('fish') or '(desconocido)'
+            counts = per_scope.setdefault(scope, {})
+            counts[fish] = counts.get(fish, 0) + 1
+        elif kind == 'timeout':
+            timeouts += 1
+            lost += float(ev.get('lost_seconds', 0.0))
+        last_t = t
+    if last_t is not None:
+        for start, counted in runs.values():
+            if counted:
+                active += last_t - start
+    hours = active / 3600.0
+    return {
+        'active_hours': hours,
+        'catches': catches,
+        'catches_per_hour': catches / hours if hours > 0 else 0.0,
+        'fish_per_scope': per_scope,
+        'timeouts': timeouts,
+        'timeout_lost_seconds': lost,
+        'timeout_lost_ratio': lost / active if active > 0 else 0.0,
+        'skipped_replay_runs': skipped_runs
+    }
+
+
+def print_summary(summary):
+    print(f"Tiempo activo: {summary['active_hours']:.2f} h")
+    print(f"Capturas: {summary['catches']} ({summary['catches_per_hour']:.1f}/h)")
+    print(f"Timeouts: {summary['timeouts']}, {summary['timeout_lost_seconds']:.0f}s perdidos "
+          f"({summary['timeout_lost_ratio'] * 100:.1f}% del tiempo activo)")
+    if summary['skipped_replay_runs']:
+        print(f"Ejecuciones de replay/sintéticas omitidas: {summary['skipped_replay_runs']} (usa --all para incluirlas)")
+    for scope, counts in sorted(summary['fish_per_scope'].items()):
+        total = sum(counts.values())
+        print(f"{scope}: {total} capturas")
+        for fish, n in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"  {fish}: {n} ({n / total * 100:.0f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analítica del registro de eventos del bot")
+    parser.add_argument('path', nargs='?', default=EVENTS_FILE, help="Fichero de eventos (incluye sus rotaciones)")
+    parser.add_argument('--json', action='store_true', help="Salida en JSON")
+    parser.add_argument('--all', action='store_true', help="Incluir ejecuciones de replay y sintéticas")
+    args = parser.parse_args(argv)
+    if not log_files(args.path):
+        print(f"No hay eventos en {args.path}")
+        return 1
+    summary = analyze(iter_events(args.path), include_replay=args.all)
+    if args.json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print_summary(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
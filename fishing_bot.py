@@ -1,189 +1,771 @@
 import time
 import json
 import random
+from collections import namedtuple
 import os
 import sys
 import warnings
-import mss
-import numpy as np
+import threading
+import argparse
 import cv2
-import pyautogui
-import easyocr
+
+from frame_sources import MssFrameSource, CaptureLayout, create_frame_source
+from capture_process import ProcessFrameSource
+from input_sinks import PyAutoGuiInput, QueuedInput, RecordingInput
+from color_stats import ColorStatsEngine, EMPTY_STATS
+from color_lut import ColorLut, ColorClassEngine, EMPTY_FRACTIONS, LUT_FILE
+from ai_vision import VisionEngine
+from panel_locator import PanelLocator
+from scheduler import FrameScheduler
+from change_gate import ChangeGate
+from state_machine import StateMachine, StateSpec
+from confirm import ConfirmEngine
+from latency import LatencyTracker
+from event_log import EventLog
+from ocr_worker import OcrWorker, LazyOcrReader
+from ocr_cache import OcrCache, name_hash
+from name_templates import NameTemplateLibrary, load_label_aliases, canonical_name
+from settings import CONFIG_FILE, Settings, SettingsWatcher, read_config
 
 # Suprimir advertencia de torch sobre pin_memory (no afecta al funcionamiento)
 warnings.filterwarnings("ignore", category=UserWarning, message=".*pin_memory.*")
 
-# Configuración global
-CONFIG_FILE = 'config_fishing.json'
-
+# Configuración global (diccionario crudo; el bucle usa FishingBot.settings, ya compilado)
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    return read_config(CONFIG_FILE)
 
 CONFIG = load_config()
 
+# Resultado de clasificar un frame (solo depende de los píxeles y los umbrales)
+FrameSignals = namedtuple('FrameSignals', 'menu wait_red wait_green e_red e_active r_red r_active t_red t_active')
+
+# Señales de un estado sin ROIs válidas (áreas vacías o fuera de la región): todo apagado
+EMPTY_SIGNALS = FrameSignals(*([False] * len(FrameSignals._fields)))
+
+# Estados del bot: cada uno clasifica solo las ROIs que necesita
+BOT_STATES = (
+    StateSpec('casting', ('menu', 'wait'), 'on_casting'),              # tras pulsar la tecla de inicio
+    StateSpec('waiting_bite', ('menu', 'wait'), 'on_waiting_bite'),    # anzuelo en el agua
+    StateSpec('minigame', ('menu', 'e', 'r', 't'), 'on_minigame'),     # secuencia E/R/T
+    StateSpec('finishing', ('menu', 'e', 'r', 't'), 'on_finishing'),   # menú desaparecido, confirmando
+    StateSpec('cooldown', (), 'on_cooldown'),                          # pausa antes del siguiente lanzamiento
+)
+
+# Señales que se confirman por frames antes de pulsar: {campo de FrameSignals: ROI}
+CONFIRMED_SIGNALS = {'wait_red': 'wait', 'e_active': 'e', 'r_active': 'r', 't_active': 't'}
+
+FISH_DATA_FILE = 'fish_data.json'
+CATCH_STATS_FILE = 'catch_stats.json'
+
 class FishingBrain:
-    def __init__(self):
+    # Predicción de la secuencia de teclas del minijuego.
+    # Las secuencias de 'puzzles' de los peces alcanzables con la ubicación y cebo activos
+    # se compilan en un trie: avanzar una tecla y consultar las siguientes posibles es O(1).
+    # El trie solo se reconstruye cuando cambia la ubicación o el cebo.
+    # Las capturas observadas por ubicación+cebo ponderan la probabilidad de cada siguiente tecla.
+    def __init__(self, path=FISH_DATA_FILE, stats_path=CATCH_STATS_FILE):
+        self.path = path
+        self.stats_path = stats_path
+        # {"ubicación|cebo": {pez: capturas}}
+        self.catch_counts = {}
+        self.stats_dirty = False
+        self.dist_cache = {}
+        self.lock = threading.Lock()
         self.fish_data = {}
+        self.data_mtime = None
+        self.scope = None
         self.history = ""
-        self.possible_fish = []
+        # Ya se respondió al '!' (pez enganchado): estamos dentro del minijuego
+        self.in_sequence = False
+        # Trie: por nodo, hijos {tecla: nodo}, peces alcanzables y peces que terminan ahí
+        self.children = [{}]
+        self.fish_under = [()]
+        self.fish_end = [()]
+        self.next_keys = [frozenset()]
+        self.node = 0
         self.load_data()
+        self.load_catch_stats()
+        self.reset()
 
     def load_data(self):
-        if os.path.exists('fish_data.json'):
+        if os.path.exists(self.path):
             try:
-                with open('fish_data.json', 'r', encoding='utf-8') as f:
+                with open(self.path, 'r', encoding='utf-8') as f:
                     self.fish_data = json.load(f)
+                self.data_mtime = os.stat(self.path).st_mtime_ns
+            except Exception as e:
+                print(f"Error cargando {self.path}: {e}")
+
+    def load_catch_stats(self):
+        if self.stats_path and os.path.exists(self.stats_path):
+            try:
+                with open(self.stats_path, 'r', encoding='utf-8') as f:
+                    self.catch_counts = json.load(f)
             except Exception as e:
-                print(f"Error cargando fish_data.json: {e}")
+                print(f"Error cargando {self.stats_path}: {e}")
+
+    def save_catch_stats(self):
+        with self.lock:
+            if not self.stats_path or not self.stats_dirty:
+                return
+            data = json.dumps(self.catch_counts, indent=2, ensure_ascii=False)
+            self.stats_dirty = False
+        try:
+            with open(self.stats_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+        except Exception as e:
+            print(f"Error guardando {self.stats_path}: {e}")
+
+    def scope_key(self):
+        return f"{self.scope[0]}|{self.scope[1]}" if self.scope else "|"
+
+    def record_catch(self, fish):
+        # Se llama desde el hilo del OCR
+        if not fish:
+            return
+        with self.lock:
+            counts = self.catch_counts.setdefault(self.scope_key(), {})
+            counts[fish] = counts.get(fish, 0) + 1
+            self.stats_dirty = True
+            self.dist_cache = {}
+
+    def refresh_data(self):
+        # El GUI cambia ubicación/cebo guardando fish_data.json: recargar solo si cambió
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self.data_mtime:
+            self.load_data()
+
+    def reachable_fish(self, location, bait):
+        puzzles = self.fish_data.get('puzzles', {})
+        fish = self.fish_data.get('locations', {}).get(location, {}).get(bait)
+        if fish is None:
+            # Sin ubicación/cebo conocidos: todos los peces con secuencia
+            fish = list(puzzles)
+        return [name for name in fish if name in puzzles]
+
+    def build(self, location, bait):
+        puzzles = self.fish_data.get('puzzles', {})
+        children = [{}]
+        fish_under = [[]]
+        fish_end = [[]]
+        for name in self.reachable_fish(location, bait):
+            node = 0
+            fish_under[0].append(name)
+            for key in puzzles[name]:
+                key = str(key).lower()
+                child = children[node].get(key)
+                if child is None:
+                    child = len(children)
+                    children[node][key] = child
+                    children.append({})
+                    fish_under.append([])
+                    fish_end.append([])
+                node = child
+                fish_under[node].append(name)
+            fish_end[node].append(name)
+        self.children = children
+        self.fish_under = [tuple(f) for f in fish_under]
+        self.fish_end = [tuple(f) for f in fish_end]
+        self.next_keys = [frozenset(c) for c in children]
+        self.scope = (location, bait)
+        self.dist_cache = {}
 
     def reset(self):
+        self.refresh_data()
+        scope = (self.fish_data.get('active_location'), self.fish_data.get('active_bait'))
+        if scope != self.scope:
+            self.build(*scope)
         self.history = ""
-        self.possible_fish = self.fish_data.get('fish_sequences', [])
+        self.in_sequence = False
+        self.node = 0
+
+    @property
+    def possible_fish(self):
+        if self.node is None:
+            return ()
+        return self.fish_under[self.node]
+
+    def register_bite(self, key):
+        # La tecla que engancha el pez no forma parte de la secuencia del puzzle
+        self.in_sequence = True
 
     def register_key(self, key):
         self.history += key
-        self.filter_fish()
+        self.in_sequence = True
+        if self.node is not None:
+            # None: la secuencia ya no coincide con ningún pez conocido
+            self.node = self.children[self.node].get(key)
 
     def register_wrong_key(self, key):
         pass
 
-    def filter_fish(self):
-        if not self.possible_fish:
-            return
-        new_possible = []
-        for fish in self.possible_fish:
-            seq = fish.get('sequence', '').lower()
-            if seq.startswith(self.history):
-                new_possible.append(fish)
-        self.possible_fish = new_possible
-
-    def predict_next_key(self):
+    def candidate_keys(self):
+        if self.node is None:
+            return frozenset()
+        return self.next_keys[self.node]
+
+    def completed_fish(self):
+        if self.node is None:
+            return ()
+        return self.fish_end[self.node]
+
+    def next_key_distribution(self):
+        # {tecla: probabilidad}; lo que falta hasta 1 es la probabilidad de que la secuencia termine
+        node = self.node
+        if node is None:
+            return {}
+        with self.lock:
+            dist = self.dist_cache.get(node)
+            if dist is None:
+                # Suavizado de Laplace: un pez nunca visto sigue siendo posible
+                counts = self.catch_counts.get(self.scope_key(), {})
+                weight = {name: counts.get(name, 0) + 1 for name in self.fish_under[node]}
+                total = float(sum(weight.values()))
+                dist = {}
+                if total > 0:
+                    for key, child in self.children[node].items():
+                        dist[key] = sum(weight[name] for name in self.fish_under[child]) / total
+                self.dist_cache[node] = dist
+        return dist
+
+    def predict(self):
+        # (tecla más probable, probabilidad) o (None, 0.0)
+        dist = self.next_key_distribution()
+        if not dist:
+            return None, 0.0
+        key = max(dist, key=dist.get)
+        return key, dist[key]
+
+    def predict_next_key(self, min_confidence=None):
         if not CONFIG.get('use_prediction', False):
             return None
-        if not self.possible_fish:
-            return None
-        
-        next_chars = set()
-        idx = len(self.history)
-        for fish in self.possible_fish:
-            seq = fish.get('sequence', '').lower()
-            if idx < len(seq):
-                next_chars.add(seq[idx])
+        if min_confidence is None:
+            min_confidence = CONFIG.get('prediction_confidence', 0.8)
+        key, prob = self.predict()
+        if key is not None and prob >= min_confidence:
+            return key
+        return None
+
+class OcrServices:
+    # Todo lo necesario para leer el nombre del pez. Un bot crea el suyo; en modo multi
+    # (multi_bot.py) un único lector, caché, plantillas y worker sirven a todos los clientes.
+    def __init__(self, settings):
+        # OCR diferido: easyocr/torch se importan y cargan en segundo plano al arrancar run(),
+        # mientras se hace el primer lanzamiento
+        self.reader = LazyOcrReader(['es', 'en'], gpu=False)
+        # Los nombres se repiten: caché por hash perceptual antes de pasar por la red neuronal
+        cache_cfg = settings.ocr_cache
+        self.ocr_cache = None
+        if cache_cfg.get('enabled', True):
+            self.ocr_cache = OcrCache(cache_cfg.get('path', 'ocr_cache.json'),
+                                      capacity=cache_cfg.get('capacity', 256),
+                                      max_distance=cache_cfg.get('max_distance', 4))
+        # Plantillas de nombres aprendidas de lecturas OCR confirmadas; EasyOCR queda de respaldo
+        tpl_cfg = settings.name_templates
+        self.fish_aliases = load_label_aliases()
+        self.name_templates = None
+        if tpl_cfg.get('enabled', True):
+            self.name_templates = NameTemplateLibrary(tpl_cfg.get('path', 'name_templates.npz'),
+                                                      threshold=tpl_cfg.get('threshold', 0.8),
+                                                      per_name=tpl_cfg.get('per_name', 3))
+        # El OCR del nombre corre en segundo plano para no dejar ciego al bucle;
+        # cada recorte lleva el callback del bot que lo pidió
+        self.worker = OcrWorker(self.recognize, None, maxsize=settings.ocr_queue_size)
+
+    def recognize(self, roi):
+        key = None
+        if self.ocr_cache is not None:
+            key = name_hash(roi)
+            if key is not None:
+                cached = self.ocr_cache.get(key)
+                if cached:
+                    return cached
+
+        if self.name_templates is not None:
+            match = self.name_templates.match(roi)
+            if match is not None:
+                text = match[1]
+                if key is not None:
+                    self.ocr_cache.put(key, text)
+                return text
+
+        # Convertir a RGB para EasyOCR
+        roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
         
-        if len(next_chars) == 1:
-            return list(next_chars)[0]
+        try:
+            results = self.reader.readtext(roi_rgb, detail=0)
+            if results:
+                text = " ".join(results)
+                if key is not None:
+                    self.ocr_cache.put(key, text)
+                # Lectura confirmada (pez conocido): se añade como plantilla
+                if self.name_templates is not None:
+                    canonical = canonical_name(text, self.fish_aliases)
+                    if canonical:
+                        self.name_templates.add(roi, canonical, text)
+                return text
+        except Exception as e:
+            print(f"Error OCR: {e}")
+            
         return None
 
+    def stop(self, timeout):
+        # Dar tiempo a que se entreguen los nombres pendientes
+        self.worker.stop(timeout=timeout)
+
+    def save(self):
+        if self.ocr_cache is not None:
+            print(self.ocr_cache.report())
+            self.ocr_cache.save()
+        if self.name_templates is not None:
+            print(self.name_templates.report())
+            self.name_templates.save()
+
+
 class FishingBot:
-    def __init__(self):
-        self.sct = mss.mss()
-        self.load_settings()
+    def __init__(self, frame_source=None, input_sink=None, settings=None, ocr=None, events=None, name=None):
+        # settings/ocr/events se inyectan en modo multi (multi_bot.py); name identifica al cliente
+        # Referencia para medir el tiempo hasta el primer lanzamiento
+        self.created_at = time.perf_counter()
+        self.name = name
+        self.load_settings(settings)
+        # Fuente de frames (en vivo por defecto, opcionalmente desde un proceso de captura)
+        # y destino de las teclas
+        self.source = frame_source or self.create_live_source()
+        if input_sink is None:
+            # En vivo las teclas salen desde un hilo propio: la pausa de pyautogui no frena el bucle
+            input_cfg = self.settings.input
+            input_sink = PyAutoGuiInput(input_cfg.get('pause_seconds', 0.1))
+            if input_cfg.get('queued', True):
+                input_sink = QueuedInput(input_sink, input_cfg.get('queue_size', 32))
+        self.input = input_sink
+        self.input.on_sent = self.on_key_sent
+        self.input.on_dropped = self.on_key_dropped
+        self.source.set_layout(self.layout)
+        # Recarga en caliente de config_fishing.json (umbrales, tiempos, regiones);
+        # con configuración inyectada la recarga la hace quien la inyectó
+        self.owns_settings = settings is None
+        self.settings_watcher = SettingsWatcher(CONFIG_FILE, self.settings.hot_reload_seconds if self.owns_settings else 0)
+        # Reloj del bot: real en vivo, simulado en replay
+        self.now = self.source.now
         self.running = True
-        self.brain = FishingBrain()
+        self.brain = FishingBrain(stats_path=self.settings.get('catch_stats_file', CATCH_STATS_FILE))
         
         # Estado de sesión
         self.session_start_time = None
         self.last_detection_time = None
         self.last_press_time = None
-        self.awaiting_completion = False
         self.menu_absent_since = None
-        self.last_state = None
         self.last_pressed_key = None
         self.sequence_fallback_done = False
+        # Plazo del estado cooldown y acción a ejecutar al vencer (por defecto, nueva sesión)
+        self.cooldown_until = None
+        self.cooldown_then = None
+        self.last_catch_time = None
+        self.session_id = 0
+        self.catch_log = []
+        # (pez deducido del trie, (ubicación, cebo)) por sesión, por si el OCR no lee el nombre
+        self.session_guesses = {}
+        # Tecla pre-armada por la predicción: se pulsa en el primer frame que la confirma
+        self.armed_key = None
+        self.prediction_stats = {'hits': 0, 'misses': 0, 'saved': 0.0}
         
-        # Flags y tiempos de detección
+        # Una pulsación por activación confirmada
         self.pressed_flags = {'e': False, 'r': False, 't': False, 'wait_red': False}
-        self.detect_times = {'e': None, 'r': None, 't': None, 'wait_red': None}
         self.letter_red_registered = {'e': False, 'r': False, 't': False}
         
         # Control de reinicio
         self.next_session_delay_until = None
-        self.session_start_timeout = CONFIG.get('start_wait_timeout_seconds', 5)
+        self.session_start_timeout = self.settings.start_wait_timeout
+        # Se arranca en cooldown: run() fija el plazo para cambiar a la ventana del juego
+        self.machine = StateMachine(BOT_STATES, self, 'cooldown', clock=self.now)
+        
+        # Ritmo de captura por estado (solo en vivo; los replays van a máxima velocidad)
+        self.scheduler = FrameScheduler(self.settings.scheduler, enabled=self.source.live)
+        # Seguimiento de la ventana del juego en pantalla (solo con captura en vivo propia)
+        self.locator = self.create_locator()
+        # Registro estructurado: los mensajes del bucle se imprimen desde su hilo
+        self.owns_events = events is None
+        self.events = events or EventLog.from_config(self.settings.event_log,
+                                                     echo_all=self.settings.log_event_details)
+        self.logged_signals = None
+        # Duración de cada etapa del bucle y tiempo de reacción por tecla
+        self.latency = LatencyTracker(self.settings.latency)
+        # Informes periódicos por el hilo del registro: el bucle no escribe en consola
+        self.scheduler.on_report = lambda report: self.log('pace_report', report, states=self.scheduler.summary())
+        self.latency.on_report = lambda report: self.log('latency_report', report, stages=self.latency.summary())
+        # Ruta donde volcar las latencias al terminar (None = no volcar)
+        self.latency_dump = None
         
-        # Inicializar OCR
-        print("Cargando modelo OCR... (puede tardar un poco)")
-        self.reader = easyocr.Reader(['es', 'en'], gpu=False)
-        print("Modelo OCR cargado.")
+        # OCR (lector, caché, plantillas y worker): propio o compartido entre bots (multi_bot.py)
+        self.owns_ocr = ocr is None
+        self.ocr = ocr or OcrServices(self.settings)
+        self.reader = self.ocr.reader
+        self.fish_aliases = self.ocr.fish_aliases
+        self.ocr_worker = self.ocr.worker
+        self.first_cast_at = None
+        # Pasado start_focus_delay (el juego ya debería estar en primer plano)
+        self.focus_ready = False
+        self.frames = 0
+        self.started = time.perf_counter()
+
+    def create_live_source(self):
+        capture_cfg = self.settings.capture_process
+        if capture_cfg.get('enabled', False):
+            return ProcessFrameSource(self.monitor, capture_cfg)
+        return MssFrameSource(self.monitor)
+
+    def create_locator(self):
+        cfg = self.settings.panel_locator
+        if not cfg.get('enabled', False):
+            return None
+        if not (self.source.live and isinstance(self.source, (MssFrameSource, ProcessFrameSource))):
+            return None
+        locator = PanelLocator(cfg)
+        locator.load_template()
+        return locator
 
-    def load_settings(self):
+    def load_settings(self, settings=None):
         global CONFIG
-        CONFIG = load_config()
-        capture = CONFIG.get('capture_region', {})
-        self.monitor = {
-            "top": capture.get('top', 0),
-            "left": capture.get('left', 0),
-            "width": capture.get('width', 1920),
-            "height": capture.get('height', 1080)
-        }
-        self.areas = CONFIG.get('areas', {})
-        self.thresh = CONFIG.get('thresholds', {})
-
-    def process_region(self, img, region_name):
-        area = self.areas.get(region_name)
-        if not area:
-            return 0, 0, 0
-        x, y, w, h = area['x'], area['y'], area['w'], area['h']
-        if y+h > img.shape[0] or x+w > img.shape[1]:
+        if settings is None:
+            CONFIG = load_config()
+            settings = Settings(CONFIG)
+        else:
+            CONFIG = dict(settings.raw)
+        self.settings = settings
+        self.monitor = dict(settings.monitor)
+        self.areas = settings.areas
+        # Todas las regiones que se analizan por frame: wait/e/r/t + icono del menú.
+        # capture_mode: 'full' captura toda la región; 'bbox' solo la caja que une las ROIs;
+        # 'rois' solo las ROIs, pegadas en una tira. El nombre del pez se captura aparte.
+        # Con visión por modelo se captura siempre la región entera (el modelo busca los objetos).
+        self.vision = self.load_vision(settings)
+        mode = 'full' if self.vision is not None else settings.capture_mode
+        self.layout = CaptureLayout.build(mode, settings.regions)
+        regions = settings.regions
+        if self.layout is not None:
+            regions = self.layout.regions
+        self.stats = ColorStatsEngine(regions)
+        # Con LUT de color, wait/e/r/t se deciden por fracción de píxeles verdes/rojos y
+        # las medias solo se calculan para el icono del menú
+        self.lut = self.load_color_lut(settings)
+        lut_cfg = settings.color_lut
+        self.lut_fractions = (float(lut_cfg.get('green_fraction', 0.15)),
+                              float(lut_cfg.get('red_fraction', 0.15)),
+                              float(lut_cfg.get('hysteresis_fraction', 0.05)))
+        self.classes = None
+        if self.lut is not None:
+            self.classes = ColorClassEngine({n: r for n, r in regions.items() if n != 'menu'}, self.lut)
+        # Motor de color y detector de cambios por estado, solo con sus ROIs
+        self.state_stats = {}
+        self.state_classes = {}
+        self.state_gates = {}
+        for spec in BOT_STATES:
+            sub = {name: regions[name] for name in spec.rois if name in regions}
+            if self.lut is not None:
+                self.state_stats[spec.name] = ColorStatsEngine({n: r for n, r in sub.items() if n == 'menu'})
+                self.state_classes[spec.name] = ColorClassEngine({n: r for n, r in sub.items() if n != 'menu'},
+                                                                 self.lut)
+            else:
+                self.state_stats[spec.name] = ColorStatsEngine(sub)
+            self.state_gates[spec.name] = ChangeGate(sub, settings.change_gate)
+        self.confirm = ConfirmEngine(CONFIRMED_SIGNALS, settings.confirm)
+        self.last_signals = None
+
+    def load_color_lut(self, settings):
+        cfg = settings.color_lut
+        if not cfg.get('enabled', False):
+            return None
+        path = cfg.get('path', LUT_FILE)
+        try:
+            return ColorLut.load(path)
+        except Exception as e:
+            print(f"No se pudo cargar la LUT de color {path} ({e}): se usan los umbrales")
+            return None
+
+    def load_vision(self, settings):
+        cfg = settings.ai_vision
+        if not cfg.get('enabled', False):
+            return None
+        current = getattr(self, 'vision', None)
+        if current is not None and current.config == cfg:
+            # Misma configuración: se conserva la sesión ya cargada
+            return current
+        try:
+            return VisionEngine(cfg)
+        except Exception as e:
+            print(f"Visión por modelo no disponible ({e}): se usan los umbrales")
+            return None
+
+    def apply_settings(self, settings):
+        # Sustituye la configuración en caliente sin reiniciar el bot ni recargar el OCR
+        global CONFIG
+        previous = self.settings
+        if (settings.same_geometry(self.settings) and settings.color_lut == self.settings.color_lut
+                and settings.ai_vision == self.settings.ai_vision):
+            # Misma geometría: se conservan los motores, solo se fuerza a reclasificar
+            self.settings = settings
+            CONFIG = dict(settings.raw)
+            self.confirm = ConfirmEngine(CONFIRMED_SIGNALS, settings.confirm)
+            self.last_signals = None
+        else:
+            self.load_settings(settings)
+            if isinstance(self.source, (MssFrameSource, ProcessFrameSource)):
+                self.source.monitor = self.monitor
+            self.source.set_layout(self.layout)
+        self.scheduler.configure(settings.scheduler)
+        if settings.panel_locator != previous.panel_locator:
+            if self.locator is not None:
+                self.locator.close()
+            self.locator = self.create_locator()
+        if self.owns_settings:
+            self.settings_watcher.interval = settings.hot_reload_seconds
+        self.log('reload', "Configuración recargada.")
+
+    def process_region(self, img, region_name, stats=None):
+        # stats: resultado de self.stats.compute(img) si ya se calculó para este frame
+        if stats is None:
+            stats = self.stats.compute(img)
+        st = stats.get(region_name)
+        if st is None:
             return 0, 0, 0
-            
-        roi = img[y:y+h, x:x+w]
-        b = np.mean(roi[..., 0])
-        g = np.mean(roi[..., 1])
-        r = np.mean(roi[..., 2])
-        return g, r, b
-
-    def menu_present(self, img):
-        roi_cfg = CONFIG.get('fishing_icon_roi') or CONFIG.get('result_name_roi')
-        if not roi_cfg:
-            return False
-        x, y, w, h = roi_cfg['x'], roi_cfg['y'], roi_cfg['w'], roi_cfg['h']
-        if y+h > img.shape[0] or x+w > img.shape[1]:
+        return st.g, st.r, st.b
+
+    def menu_present(self, img, stats=None):
+        if stats is None:
+            stats = self.stats.compute(img)
+        st = stats.get('menu')
+        if st is None:
             return False
-        roi = img[y:y+h, x:x+w]
         
         # Umbral configurable para detección del icono/menú
         # Default bajado a 75 para ser más tolerante con iconos no-blancos
-        threshold = CONFIG.get('fishing_icon_threshold', 75)
-        
-        val = np.mean(roi)
-        if CONFIG.get('log_debug_values', False):
-            # Solo imprimir cada X frames para no saturar, o confiar en que el usuario lo activa a propósito
-            pass 
-            
-        if val > threshold: 
+        if st.mean > self.settings.icon_threshold: 
             return True
         return False
 
+    def classify(self, img, state=None):
+        # Una sola pasada de color para las ROIs del estado (todas por defecto);
+        # las que no están en el estado dan señales apagadas.
+        # Devuelve (señales con umbrales de encendido, señales con umbrales de apagado)
+        if self.vision is not None:
+            return self.classify_vision(img)
+        stats = (self.state_stats[state] if state else self.stats).compute(img)
+        if self.lut is not None:
+            fractions = (self.state_classes[state] if state else self.classes).compute(img)
+            return self.classify_fractions(img, stats, fractions)
+        cfg = self.settings
+        red_min = cfg.red_min
+        green_min = cfg.green_min
+        letter_red_diff = cfg.letter_red_diff_min
+        green_diff = cfg.green_diff_min
+
+        wait = stats.get('wait', EMPTY_STATS)
+        m = self.confirm.margin('wait')
+        wait_red = (wait.r > red_min and wait.r_diff > cfg.wait_red_diff_min)
+        wait_red_weak = (wait.r > red_min - m and wait.r_diff > cfg.wait_red_diff_min - m)
+        wait_green = (wait.g >= green_min and wait.g_diff > cfg.wait_green_diff_min)
+
+        letters = []
+        letters_weak = []
+        for k in ('e', 'r', 't'):
+            st = stats.get(k, EMPTY_STATS)
+            m = self.confirm.margin(k)
+            is_red = (st.r >= red_min and st.r_diff > letter_red_diff)
+            active = (st.g >= green_min and st.g_diff > green_diff and not is_red)
+            active_weak = (st.g >= green_min - m and st.g_diff > green_diff - m and not is_red)
+            letters.extend((is_red, active))
+            letters_weak.extend((is_red, active_weak))
+
+        menu = self.menu_present(img, stats)
+        return (FrameSignals(menu, wait_red, wait_green, *letters),
+                FrameSignals(menu, wait_red_weak, wait_green, *letters_weak))
+
+    def classify_fractions(self, img, stats, fractions):
+        # Igual que classify pero con la fracción de píxeles de cada clase de la LUT
+        green_min, red_min, m = self.lut_fractions
+        wait = fractions.get('wait', EMPTY_FRACTIONS)
+        wait_red = wait.red >= red_min
+        wait_red_weak = wait.red >= red_min - m
+        wait_green = wait.green >= green_min
+
+        letters = []
+        letters_weak = []
+        for k in ('e', 'r', 't'):
+            fr = fractions.get(k, EMPTY_FRACTIONS)
+            is_red = fr.red >= red_min
+            letters.extend((is_red, fr.green >= green_min and not is_red))
+            letters_weak.extend((is_red, fr.green >= green_min - m and not is_red))
+
+        menu = self.menu_present(img, stats)
+        return (FrameSignals(menu, wait_red, wait_green, *letters),
+                FrameSignals(menu, wait_red_weak, wait_green, *letters_weak))
+
+    def classify_vision(self, img):
+        # Señales a partir de las detecciones del modelo (ai_vision.py) en toda la región
+        values = self.vision.signals(img)
+        strong = [values.get(field, (False, False))[0] for field in FrameSignals._fields]
+        weak = [values.get(field, (False, False))[1] for field in FrameSignals._fields]
+        return FrameSignals(*strong), FrameSignals(*weak)
+
     def read_fish_name(self, img):
-        roi_cfg = CONFIG.get('result_name_roi')
-        if not roi_cfg:
+        # Versión síncrona (recorte + OCR en el mismo hilo)
+        roi = self.crop_fish_name(img)
+        if roi is None:
             return None
-            
-        x, y, w, h = roi_cfg['x'], roi_cfg['y'], roi_cfg['w'], roi_cfg['h']
-        if w == 0 or h == 0:
+        return self.recognize_fish_name(roi)
+
+    def crop_fish_name(self, img):
+        # result_name_roi ya validado al compilar la configuración
+        roi_cfg = self.settings.result_name_roi
+        if self.vision is not None:
+            # El modelo localiza el nombre; si no lo ve se usa la ROI calibrada
+            box = self.vision.box('fish_name')
+            if box is not None:
+                x, y = max(0, int(box.x)), max(0, int(box.y))
+                roi = img[y:y + int(box.h), x:x + int(box.w)]
+                if roi.size:
+                    return roi.copy()
+        if roi_cfg is None:
             return None
             
-        if y+h > img.shape[0] or x+w > img.shape[1]:
+        if self.layout is not None:
+            # El frame no contiene el nombre: se captura solo esa zona, justo ahora
+            roi = self.source.grab_region(roi_cfg)
+            if roi is None:
+                return None
+        else:
+            ys, xs = self.settings.slices['name']
+            if ys.stop > img.shape[0] or xs.stop > img.shape[1]:
+                return None
+            roi = img[ys, xs]
+        # Copia: el frame puede reutilizarse mientras el worker lo procesa
+        return roi.copy()
+
+    def recognize_fish_name(self, roi):
+        return self.ocr.recognize(roi)
+
+    def on_fish_name(self, job, fish_name):
+        # Llamado desde el hilo del OCR cuando termina un recorte
+        if fish_name:
+            message = f"CAPTURADO: {fish_name} (sesión {job.session_id})"
+        else:
+            message = f"CAPTURADO: (No se detectó texto) (sesión {job.session_id})"
+        self.catch_log.append({'session': job.session_id, 'time': job.captured_at, 'name': fish_name})
+        guess, scope = self.session_guesses.pop(job.session_id, (None, None))
+        self.record_catch(job.session_id, fish_name, guess, scope, message)
+
+    def record_catch(self, session, text, guess, scope, message=None):
+        fish = canonical_name(text, self.fish_aliases) if text else None
+        # Solo las capturas de partidas reales ponderan la predicción: los replays y los
+        # sintéticos (también benchmark.py) no tocan catch_stats.json
+        if self.source.live:
+            self.brain.record_catch(fish or guess)
+        location, bait = scope or (None, None)
+        self.log('catch', message, session=session, fish=fish or guess, text=text, guess=guess,
+                 location=location, bait=bait)
+
+    def log(self, kind, message=None, session=None, **fields):
+        # Evento con el reloj del bot (simulado en replay); no escribe nada en este hilo
+        if self.name is not None:
+            fields['client'] = self.name
+            if message:
+                message = f"[{self.name}] {message}"
+        self.events.emit(kind, message, t=self.now(),
+                         session=self.session_id if session is None else session, **fields)
+
+    def arm_prediction(self):
+        # Tras cada tecla del minijuego: pre-armar la siguiente si la predicción es fiable
+        self.armed_key = None
+        if self.settings.use_prediction:
+            key, prob = self.brain.predict()
+            if key is not None and prob >= self.settings.prediction_confidence:
+                self.armed_key = key
+
+    def prediction_report(self):
+        st = self.prediction_stats
+        total = st['hits'] + st['misses']
+        if not total:
             return None
-            
-        roi = img[y:y+h, x:x+w]
-        # Convertir a RGB para EasyOCR
-        roi_rgb = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
-        
+        ratio = st['hits'] / total * 100
+        saved_ms = st['saved'] / st['hits'] * 1000 if st['hits'] else 0.0
+        return (f"Predicción: {st['hits']} aciertos / {st['misses']} fallos ({ratio:.0f}%), "
+                f"{saved_ms:.0f} ms ahorrados por pulsación acertada")
+
+    def relocate(self, left, top):
+        # La ventana del juego se movió: se desplaza capture_region (las áreas son relativas a ella)
+        old = self.monitor
+        config = dict(self.settings.raw)
+        config['capture_region'] = dict(config.get('capture_region') or {}, left=left, top=top)
+        self.log('relocate', f"Ventana del juego desplazada ({left - old['left']:+d}, {top - old['top']:+d}): "
+                             f"región de captura en ({left}, {top})", left=left, top=top)
+        self.apply_settings(Settings(config))
+
+    def locate_panel(self):
+        # Búsqueda completa al arrancar, ya pasado start_focus_delay (el juego en primer plano)
+        if not self.locator.ensure_template():
+            if (self.locator.anchor == 'menu' and self.vision is None and
+                    self.settings.panel_locator.get('auto_capture', True)):
+                print(f"Localizador: sin plantilla en {self.locator.path}; se guardará cuando se vea el icono")
+            else:
+                print(f"Localizador: sin plantilla en {self.locator.path}; ejecuta 'python panel_locator.py --save'")
+            return
+        found = self.locator.locate()
+        moved = self.locator.offset(self.settings, found)
+        if moved is not None:
+            self.relocate(*moved)
+        elif found is None or found[2] < self.locator.threshold:
+            print("Localizador: ventana del juego no encontrada; se usa capture_region")
+
+    def capture_anchor(self, img, sig):
+        # Sin plantilla: se recorta el ancla del propio frame solo si es el icono, ya pasó
+        # start_focus_delay y menu_present acaba de confirmarlo en su posición calibrada
+        # (con el modelo de visión la señal no dice dónde está el icono)
+        if self.locator.anchor != 'menu' or not self.settings.panel_locator.get('auto_capture', True):
+            return
+        if self.vision is not None:
+            return
+        if not self.focus_ready or sig is None or not sig.menu:
+            return
+        # Posición del ancla dentro del frame entregado (con capture_mode 'bbox'/'rois' está remapeada)
+        regions = self.layout.regions if self.layout is not None else self.settings.regions
+        rect = regions.get(self.locator.anchor)
+        if rect is None:
+            return
         try:
-            results = self.reader.readtext(roi_rgb, detail=0)
-            if results:
-                return " ".join(results)
+            self.locator.save_template(img[rect['y']:rect['y'] + rect['h'], rect['x']:rect['x'] + rect['w']])
         except Exception as e:
-            print(f"Error OCR: {e}")
-            
-        return None
+            print(f"Localizador: no se pudo guardar la plantilla ({e})")
+            return
+        print(f"Localizador: plantilla del ancla guardada en {self.locator.path}")
+
+    def track_panel(self):
+        if self.locator.pyramid is None:
+            # Aún sin plantilla (se guarda en tick cuando se ve el icono)
+            return
+        # Comprobación barata cada track_every_seconds; la búsqueda completa (si se perdió el
+        # ancla) solo en cooldown, sin lanzar: esperando la picada la reacción al '!' es crítica
+        moved = self.locator.update(self.settings, allow_full=self.machine.state == 'cooldown')
+        if moved is not None:
+            self.relocate(*moved)
+
+    def pace_state(self):
+        # Estado que marca el ritmo de captura del siguiente frame
+        state = self.machine.state
+        if state == 'cooldown' or (self.last_catch_time is not None and
+                                   self.now() - self.last_catch_time < self.settings.cooldown_seconds):
+            return 'cooldown'
+        if state in ('minigame', 'finishing') or self.confirm['wait_red'].seen:
+            return 'burst'
+        if state == 'waiting_bite':
+            return 'esperando'
+        return 'default'
 
     def ensure_session(self):
-        now = time.time()
+        now = self.now()
         if self.next_session_delay_until and now < self.next_session_delay_until:
             return 
 
@@ -191,237 +773,393 @@ class FishingBot:
             self.reset_session()
 
     def reset_session(self):
-        self.session_start_time = time.time()
+        self.session_id += 1
+        self.session_start_time = self.now()
         self.last_detection_time = None
         self.last_press_time = None
-        self.awaiting_completion = False
         self.menu_absent_since = None
-        self.last_state = None
         self.last_pressed_key = None
         self.sequence_fallback_done = False
         self.pressed_flags = {'e': False, 'r': False, 't': False, 'wait_red': False}
-        self.detect_times = {'e': None, 'r': None, 't': None, 'wait_red': None}
         self.letter_red_registered = {'e': False, 'r': False, 't': False}
+        self.armed_key = None
+        self.confirm.reset()
         self.brain.reset()
         
         # Calcular timeout dinámico para esta sesión
-        min_wait = CONFIG.get('start_wait_timeout_min_seconds', 18)
-        max_wait = CONFIG.get('start_wait_timeout_max_seconds', 21)
-        self.session_start_timeout = random.uniform(min_wait, max_wait)
+        self.session_start_timeout = random.uniform(self.settings.start_wait_min, self.settings.start_wait_max)
         
     def try_start(self):
-        if CONFIG.get('start_press_on_run', True):
-            key = CONFIG.get('start_key', '5')
-            print(f"Iniciando pesca con '{key}'...")
-            pyautogui.press(key)
-            self.session_start_time = time.time()
+        if self.settings.start_press_on_run:
+            key = self.settings.start_key
+            self.log('cast', f"Iniciando pesca con '{key}'...", key=key)
+            self.press_key(key)
+            if self.first_cast_at is None:
+                self.first_cast_at = time.perf_counter()
+                seconds = self.first_cast_at - self.created_at
+                self.log('first_cast', f"Primer lanzamiento a los {seconds:.2f}s de crear el bot",
+                         seconds=round(seconds, 3))
+            self.session_start_time = self.now()
             # Calcular timeout dinámico para el inicio
-            min_wait = CONFIG.get('start_wait_timeout_min_seconds', 18)
-            max_wait = CONFIG.get('start_wait_timeout_max_seconds', 21)
-            self.session_start_timeout = random.uniform(min_wait, max_wait)
+            self.session_start_timeout = random.uniform(self.settings.start_wait_min, self.settings.start_wait_max)
 
-    def run(self):
-        print("--- BOT INICIADO ---")
-        print("Presiona Ctrl+C en la terminal para detener.")
-        delay = float(CONFIG.get('start_focus_delay_seconds', 0))
-        if delay > 0:
-            time.sleep(delay)
+    def press_key(self, key, series=None, seen_at=None):
+        # No bloquea; seen_at: captura del primer frame que mostró la señal (reloj de la fuente)
+        tag = (series, seen_at) if series is not None and seen_at is not None else None
+        self.input.send(key, tag)
+        self.log('key', key=key, state=self.machine.state)
+
+    def on_key_sent(self, key, tag, queued_at, started_at, sent_at):
+        # Puede llamarse desde el hilo de entrada
+        self.latency.add('input:queue', started_at - queued_at)
+        self.latency.add('press', sent_at - started_at)
+        if tag is not None:
+            series, seen_at = tag
+            self.latency.add(series, self.now() - seen_at)
+
+    def on_key_dropped(self, key, tag):
+        self.log('input_dropped', f"Entrada saturada: tecla '{key}' descartada", key=key)
+
+    def wait_then(self, seconds, action):
+        # Espera sin dormir: el estado cooldown ejecuta action(cfg) cuando vence el plazo
+        self.cooldown_until = self.now() + max(0.0, seconds)
+        self.cooldown_then = action
+        if self.machine.state != 'cooldown':
+            self.enter('cooldown')
+
+    def enter(self, state):
+        source = self.machine.transition(state)
+        self.log('state', source=source, target=state)
+        # El nuevo estado mira otras ROIs: se clasifica de nuevo en el siguiente frame
+        self.last_signals = None
+        self.state_gates[state].reset()
+
+    def restart_session(self, cfg, message=None):
+        self.reset_session()
+        if cfg.start_press_on_run:
+            self.log('cast', message, key=cfg.start_key)
+            self.press_key(cfg.start_key)
+        self.enter('casting')
+
+    # --- Handlers de estado: (frame, señales, configuración) ---
+
+    def check_bite(self, sig, cfg):
+        # '!' ROJO con el menú visible: el pez picó. Devuelve True si el frame queda atendido.
+        red = self.confirm['wait_red']
+        if not (red.seen and sig.menu):
+            self.pressed_flags['wait_red'] = False
+            return False
+        if red.on and not self.pressed_flags['wait_red']:
+            key = random.choice(cfg.keys)
+            self.log('bite', f"¡PEZ PICÓ! → Presionando {key.upper()}", key=key)
+            self.press_key(key, 'reaction:bite', red.first_at)
+            self.brain.register_bite(key)
+            self.arm_prediction()
+            self.pressed_flags['wait_red'] = True
+            self.last_detection_time = self.now()
+            self.enter('minigame')
+        return True
+
+    def check_start_timeout(self, cfg):
+        # El lanzamiento no llegó a verse (ni verde ni rojo): reintentar
+        if (self.session_start_time is None
+                or self.now() - self.session_start_time < self.session_start_timeout):
+            return
+        # Fallback siempre 'e' para reiniciar el lanzamiento
+        fb_key = 'e'
+        waited = self.now() - self.session_start_time
+        self.log('timeout', f"Tiempo de espera agotado ({self.session_start_timeout:.1f}s) → Reiniciando con '{fb_key.upper()}'",
+                 waited=round(waited, 3), lost_seconds=round(waited + cfg.fallback_after_timeout, 3),
+                 state=self.machine.state)
+        self.press_key(fb_key)
+        message = f"Reiniciando pesca tras timeout con '{cfg.start_key}'..."
+        self.wait_then(cfg.fallback_after_timeout, lambda c: self.restart_session(c, message))
+
+    def on_casting(self, img, sig, cfg):
+        # Prioridad: el rojo se mira antes que el verde
+        if self.check_bite(sig, cfg):
+            return
+        if sig.wait_green:
+            self.log('waiting', "Esperando...")
+            self.enter('waiting_bite')
+            return
+        self.check_start_timeout(cfg)
+
+    def on_waiting_bite(self, img, sig, cfg):
+        if self.check_bite(sig, cfg) or sig.wait_green:
+            return
+        self.check_start_timeout(cfg)
+
+    def sequence_idle(self, cfg):
+        # Mucho tiempo sin teclas en plena secuencia: menu_present da falso positivo o algo va mal
+        last = self.last_press_time or self.last_detection_time
+        if last is None:
+            return False
+        idle_time = self.now() - last
+        if idle_time > cfg.max_sequence_idle:
+            self.log('idle_finish', f"DEBUG: Tiempo de inactividad excedido ({idle_time:.1f}s). Forzando finalización.",
+                     idle=round(idle_time, 3))
+            return True
+        return False
+
+    def on_minigame(self, img, sig, cfg):
+        for k, is_red in (('e', sig.e_red), ('r', sig.r_red), ('t', sig.t_red)):
+            if is_red and not self.letter_red_registered[k]:
+                self.brain.register_wrong_key(k)
+                self.letter_red_registered[k] = True
+
+        # Detección de teclas con prioridad E > R > T: manda la primera letra visible
+        pressed_key = None
+        for k in ('e', 'r', 't'):
+            c = self.confirm[f'{k}_active']
+            if not c.seen:
+                # Letra soltada: la siguiente activación vuelve a pulsarse
+                self.pressed_flags[k] = False
+                continue
+            if self.pressed_flags[k]:
+                continue
+            # Pre-armada: se pulsa en el primer frame que la cumple, sin esperar confirmación
+            if c.on or k == self.armed_key:
+                pressed_key = k
+            break
+
+        if pressed_key:
+            key_names = {'e': 'ESPERA', 'r': 'REEL', 't': 'TIRA'}
+            self.log('letter', f"{key_names[pressed_key]} DETECTADO → Presionando '{pressed_key.upper()}'",
+                     key=pressed_key, armed=pressed_key == self.armed_key)
+            c = self.confirm[f'{pressed_key}_active']
+            self.press_key(pressed_key, f'reaction:{pressed_key}', c.first_at)
+            if self.armed_key is not None:
+                if pressed_key == self.armed_key:
+                    waited = self.source.last_capture_time - c.first_at
+                    self.prediction_stats['hits'] += 1
+                    self.prediction_stats['saved'] += max(0.0, c.min_latency - waited)
+                else:
+                    self.prediction_stats['misses'] += 1
+            self.brain.register_key(pressed_key)
+            self.arm_prediction()
+            self.pressed_flags[pressed_key] = True
+            self.last_detection_time = self.now()
+            self.last_press_time = self.last_detection_time
+            self.last_pressed_key = pressed_key
+
+        if self.sequence_idle(cfg):
+            self.finish_catch(img, cfg)
+            return
+        letters_present = sig.e_active or sig.r_active or sig.t_active
+        if not sig.menu and self.last_press_time is not None and not letters_present:
+            self.menu_absent_since = self.now()
+            self.enter('finishing')
+
+    def on_finishing(self, img, sig, cfg):
+        if self.sequence_idle(cfg):
+            self.finish_catch(img, cfg)
+            return
+        if sig.menu or sig.e_active or sig.r_active or sig.t_active:
+            # Falsa alarma: volvió el menú o hay otra letra
+            self.menu_absent_since = None
+            self.enter('minigame')
+            return
+        now = self.now()
+        if (now - self.menu_absent_since >= cfg.menu_absent_hold and
+                now - self.last_press_time >= cfg.post_last_key_min):
+            self.finish_catch(img, cfg)
+
+    def finish_catch(self, img, cfg):
+        # Si la secuencia identifica un único pez, sirve de respaldo al OCR
+        completed = self.brain.completed_fish()
+        guess = completed[0] if len(completed) == 1 else None
+        scope = self.brain.scope
+        # Recortar el nombre y leerlo en segundo plano; el bucle sigue
+        try:
+            roi = self.crop_fish_name(img)
+            if roi is None:
+                self.record_catch(self.session_id, None, guess, scope, "CAPTURADO: (Sin región de nombre)")
+            else:
+                self.session_guesses[self.session_id] = (guess, scope)
+                if not self.ocr_worker.submit(self.session_id, roi, self.now(), self.on_fish_name):
+                    self.session_guesses.pop(self.session_id, None)
+                    self.record_catch(self.session_id, None, guess, scope, "OCR saturado: nombre descartado")
+        except Exception as e:
+            self.log('error', f"Error capturando nombre: {e}")
+
+        self.log('finish', "✓ Pesca completada → Reiniciando", state=self.machine.state)
+        self.last_catch_time = self.now()
+        jitter = cfg.post_finish_jitter
+        delay_secs = random.uniform(jitter[0], jitter[1]) if jitter is not None else 0.0
+        self.wait_then(delay_secs, self.restart_session)
+
+    def on_cooldown(self, img, sig, cfg):
+        if self.cooldown_until is not None and self.now() < self.cooldown_until:
+            return
+        action = self.cooldown_then or self.restart_session
+        self.cooldown_until = None
+        self.cooldown_then = None
+        action(cfg)
+
+    def first_start(self, cfg):
+        self.focus_ready = True
+        if self.locator is not None:
+            self.locate_panel()
         self.try_start()
-        
+        self.enter('casting')
+
+    def start(self):
+        print("--- BOT INICIADO ---" if self.name is None else f"--- BOT {self.name} INICIADO ---")
+        print("Presiona Ctrl+C en la terminal para detener.")
+        print("Cargando modelo OCR en segundo plano...")
+        self.reader.start_loading()
+        location, bait = self.brain.scope or (None, None)
+        self.log('bot_start', location=location, bait=bait, source=type(self.source).__name__,
+                 live=self.source.live, capture_mode=self.settings.capture_mode)
+        # Tiempo para cambiar a la ventana del juego; el bucle (y la carga del OCR) ya corren.
+        # En replay no hay ventana que enfocar: el plazo gastaría frames del reloj simulado
+        delay = self.settings.start_focus_delay if self.source.live else 0.0
+        self.wait_then(delay, self.first_start)
+        self.frames = 0
+        self.started = time.perf_counter()
+
+    def tick(self):
+        # Un frame completo: captura, clasificación y decisión. False si la fuente se agotó.
+        new_settings = self.settings_watcher.poll()
+        if new_settings is not None:
+            self.apply_settings(new_settings)
+        # Una sola referencia por frame: una recarga no mezcla valores viejos y nuevos
+        if self.locator is not None:
+            self.track_panel()
+        cfg = self.settings
+        self.ensure_session()
+        t0 = time.perf_counter()
+        img = self.source.grab()
+        if img is None:
+            # Fuente de replay agotada
+            return False
+        self.frames += 1
+        t = self.latency.since('grab', t0)
+
+        # Solo se clasifican las ROIs del estado actual; si no cambiaron se reutiliza
+        # la clasificación anterior. El handler se ejecuta siempre (lleva los tiempos).
+        state = self.machine.state
+        gate = self.state_gates[state]
+        if self.vision is not None:
+            # El modelo lleva su propio control de cambios (miniatura + detecciones seguidas)
+            refresh = bool(self.machine.spec.rois)
+        else:
+            refresh = bool(gate.regions) and (gate.changed(img) or self.last_signals is None)
+        if not refresh and self.machine.spec.rois and not gate.regions and self.vision is None:
+            # El estado debería mirar ROIs pero ninguna es válida: señales apagadas (como las
+            # medias a cero), nunca None ni señales de otro estado
+            self.last_signals = (EMPTY_SIGNALS, EMPTY_SIGNALS)
+        if refresh:
+            self.last_signals = self.classify(img, state)
+            t = self.latency.since('classify', t)
+            if cfg.log_debug_values and self.last_signals[0] != self.logged_signals:
+                self.logged_signals = self.last_signals[0]
+                self.log('signals', state=state, **self.logged_signals._asdict())
+        sig = None
+        if self.last_signals is not None:
+            sig, weak = self.last_signals
+            # Confirmación por frames con el instante de captura del frame
+            self.confirm.update(sig, weak, self.source.last_capture_time)
+            if refresh and self.locator is not None and self.locator.pyramid is None:
+                self.capture_anchor(img, sig)
+        self.machine.step(img, sig, cfg)
+        self.latency.since('decide', t)
+        self.latency.since('frame', t0)
+        self.latency.maybe_report()
+        return True
+
+    def shutdown(self):
+        frames = self.frames
+        elapsed = time.perf_counter() - self.started
+        fps = frames / elapsed if elapsed > 0 else 0.0
+        # Dar tiempo a que se entreguen los nombres pendientes y vaciar el registro
+        if self.owns_ocr:
+            self.ocr.stop(self.settings.ocr_flush_timeout)
+        self.log('bot_stop', frames=frames, elapsed=round(elapsed, 3))
+        if self.owns_events:
+            self.events.close()
+        if self.name is not None:
+            print(f"--- {self.name} ---")
+        print(f"Frames procesados: {frames} en {elapsed:.2f}s ({fps:.1f} FPS)")
+        if self.scheduler.stats:
+            print(self.scheduler.report())
+        for state, gate in self.state_gates.items():
+            if gate.frames:
+                print(gate.report(state))
+        print(self.machine.report())
+        report = self.confirm.report()
+        if report:
+            print(report)
+        if self.vision is not None:
+            report = self.vision.report()
+            if report:
+                print(report)
+        report = self.latency.report()
+        if report:
+            print(report)
+        if self.latency_dump:
+            self.latency.dump(self.latency_dump)
+        if self.owns_ocr:
+            self.ocr.save()
+        report = self.prediction_report()
+        if report:
+            print(report)
+        self.brain.save_catch_stats()
+        if isinstance(self.input, QueuedInput):
+            print(self.input.report())
+        if isinstance(self.source, ProcessFrameSource):
+            print(self.source.report())
+        if self.locator is not None:
+            report = self.locator.report()
+            if report:
+                print(report)
+            self.locator.close()
+        self.input.close()
+        self.source.close()
+
+    def run(self):
+        self.start()
         try:
             while self.running:
-                self.ensure_session()
-                sct_img = self.sct.grab(self.monitor)
-                img = np.array(sct_img)
-
-                menu_is_present = self.menu_present(img)
-
-                wait_g, wait_r, wait_b = self.process_region(img, 'wait')
-                wg_diff = wait_g - max(wait_r, wait_b)
-                wr_diff = wait_r - max(wait_g, wait_b)
-
-                # 1. PRIORIDAD ABSOLUTA: Detectar '!' ROJO (Pez picó)
-                # Chequeamos esto PRIMERO para evitar que el estado "Esperando" lo bloquee
-                # FIX: Añadido chequeo de menu_present y not already_in_sequence para evitar falsos positivos al final
-                already_in_sequence = (len(self.brain.history) > 0)
-                wait_red_active = (wait_r > self.thresh['red_min'] and 
-                                 wr_diff > CONFIG['thresholds'].get('wait_red_diff_min', 15) and
-                                 menu_is_present and 
-                                 not already_in_sequence)
-                
-                if wait_red_active:
-                    if self.detect_times['wait_red'] is None:
-                        self.detect_times['wait_red'] = time.time()
-                    elif not self.pressed_flags['wait_red'] and time.time() - self.detect_times['wait_red'] >= float(CONFIG.get('press_delay_seconds', 0.5)):
-                        key = random.choice(CONFIG['keys'])
-                        print(f"¡PEZ PICÓ! → Presionando {key.upper()}")
-                        pyautogui.press(key)
-                        self.brain.register_key(key)
-                        self.pressed_flags['wait_red'] = True
-                        self.last_detection_time = time.time()
-                        self.awaiting_completion = True
-                    # Si detectamos rojo, no hacemos nada más en este frame
-                    continue
-                else:
-                    self.detect_times['wait_red'] = None
-                    self.pressed_flags['wait_red'] = False
-
-                # 2. Estado "Esperando" (Verde/Grisáceo)
-                # Solo si NO hay rojo y NO estamos ya en una secuencia de letras
-                wait_green_active = (wait_g >= self.thresh['green_min'] and wg_diff > CONFIG['thresholds'].get('wait_green_diff_min', -30))
-                # already_in_sequence ya calculado arriba
-                
-                if wait_green_active and not already_in_sequence:
-                    if self.last_state != 'esperando':
-                        print("Esperando...")
-                        self.last_state = 'esperando'
-                    # RESTAURADO: continue
-                    # Evita falsos positivos de letras mientras esperamos.
-                    # Como ya priorizamos el ROJO arriba, esto es seguro.
-                    continue
-
-                # Detección de teclas con prioridad
-                e_g, e_r, e_b = self.process_region(img, 'e')
-                e_diff = e_g - max(e_r, e_b)
-                e_rdiff = e_r - max(e_g, e_b)
-                e_is_red = (e_r >= self.thresh['red_min'] and e_rdiff > CONFIG['thresholds'].get('letter_red_diff_min', 15))
-                if e_is_red and not self.letter_red_registered['e']:
-                    self.brain.register_wrong_key('e')
-                    self.letter_red_registered['e'] = True
-                e_active = (e_g >= self.thresh['green_min'] and e_diff > CONFIG['thresholds'].get('green_diff_min', 20) and not e_is_red)
-                
-                r_g, r_r, r_b = self.process_region(img, 'r')
-                r_diff = r_g - max(r_r, r_b)
-                r_rdiff = r_r - max(r_g, r_b)
-                r_is_red = (r_r >= self.thresh['red_min'] and r_rdiff > CONFIG['thresholds'].get('letter_red_diff_min', 15))
-                if r_is_red and not self.letter_red_registered['r']:
-                    self.brain.register_wrong_key('r')
-                    self.letter_red_registered['r'] = True
-                r_active = (r_g >= self.thresh['green_min'] and r_diff > CONFIG['thresholds'].get('green_diff_min', 20) and not r_is_red)
-                
-                t_g, t_r, t_b = self.process_region(img, 't')
-                t_diff = t_g - max(t_r, t_b)
-                t_rdiff = t_r - max(t_g, t_b)
-                t_is_red = (t_r >= self.thresh['red_min'] and t_rdiff > CONFIG['thresholds'].get('letter_red_diff_min', 15))
-                if t_is_red and not self.letter_red_registered['t']:
-                    self.brain.register_wrong_key('t')
-                    self.letter_red_registered['t'] = True
-                t_active = (t_g >= self.thresh['green_min'] and t_diff > CONFIG['thresholds'].get('green_diff_min', 20) and not t_is_red)
-                
-                pressed_key = None
-                if e_active and not self.pressed_flags['e']:
-                    if self.detect_times['e'] is None:
-                        self.detect_times['e'] = time.time()
-                        self.last_state = 'e_detectada'
-                    elif time.time() - self.detect_times['e'] >= float(CONFIG.get('press_delay_seconds', 0.5)):
-                        pressed_key = 'e'
-                elif r_active and not self.pressed_flags['r']:
-                    if self.detect_times['r'] is None:
-                        self.detect_times['r'] = time.time()
-                        self.last_state = 'r_detectada'
-                    elif time.time() - self.detect_times['r'] >= float(CONFIG.get('press_delay_seconds', 0.5)):
-                        pressed_key = 'r'
-                elif t_active and not self.pressed_flags['t']:
-                    if self.detect_times['t'] is None:
-                        self.detect_times['t'] = time.time()
-                        self.last_state = 't_detectada'
-                    elif time.time() - self.detect_times['t'] >= float(CONFIG.get('press_delay_seconds', 0.5)):
-                        pressed_key = 't'
-                
-                if pressed_key:
-                    key_names = {'e': 'ESPERA', 'r': 'REEL', 't': 'TIRA'}
-                    print(f"{key_names[pressed_key]} DETECTADO → Presionando '{pressed_key.upper()}'")
-                    pyautogui.press(pressed_key)
-                    self.brain.register_key(pressed_key)
-                    self.pressed_flags[pressed_key] = True
-                    self.last_detection_time = time.time()
-                    self.last_press_time = self.last_detection_time
-                    self.awaiting_completion = True
-                    self.last_state = pressed_key
-                    self.last_pressed_key = pressed_key
-                else:
-                    if not e_active:
-                        self.detect_times['e'] = None
-                        self.pressed_flags['e'] = False
-                    if not r_active:
-                        self.detect_times['r'] = None
-                        self.pressed_flags['r'] = False
-                    if not t_active:
-                        self.detect_times['t'] = None
-                        self.pressed_flags['t'] = False
-
-                letters_present = e_active or r_active or t_active
-
-                # Lógica de finalización / Bloqueo
-                # Si ha pasado mucho tiempo desde la última tecla y seguimos "pescando", algo va mal.
-                # Esto soluciona el caso donde menu_present da falso positivo.
-                force_finish = False
-                if self.awaiting_completion and self.last_press_time:
-                    idle_time = time.time() - self.last_press_time
-                    if idle_time > CONFIG.get('max_sequence_idle_seconds', 8.0):
-                        print(f"DEBUG: Tiempo de inactividad excedido ({idle_time:.1f}s). Forzando finalización.")
-                        force_finish = True
-
-                if menu_is_present and not force_finish:
-                    self.menu_absent_since = None
-                else:
-                    if (self.last_press_time is not None and not letters_present) or force_finish:
-                        if self.menu_absent_since is None:
-                            self.menu_absent_since = time.time()
-                        else:
-                            hold = CONFIG.get('menu_absent_hold_seconds', 2.0)
-                            # Si forzamos, reducimos el tiempo de espera
-                            if force_finish: 
-                                hold = 0.5
-                                
-                            post_key = CONFIG.get('post_last_key_min_seconds', 2.0)
-                            if (time.time() - self.menu_absent_since >= hold and
-                                time.time() - self.last_press_time >= post_key) or force_finish:
-                                
-                                # Intentar leer nombre antes de reiniciar
-                                try:
-                                    print("Intentando leer resultado...")
-                                    fish_name = self.read_fish_name(img)
-                                    if fish_name:
-                                        print(f"CAPTURADO: {fish_name}")
-                                    else:
-                                        print("CAPTURADO: (No se detectó texto)")
-                                except Exception as e:
-                                    print(f"Error capturando nombre: {e}")
-
-                                print("✓ Pesca completada → Reiniciando")
-                                jitter = CONFIG.get('post_finish_delay_jitter')
-                                if isinstance(jitter, dict):
-                                    delay_secs = random.uniform(jitter.get('min', 1.0), jitter.get('max', 1.0))
-                                    time.sleep(delay_secs)
-                                self.reset_session()
-                                if CONFIG.get('start_press_on_run', True):
-                                    pyautogui.press(CONFIG.get('start_key', '5'))
-                                continue
-                    else:
-                        self.menu_absent_since = None
-
-                if (not self.awaiting_completion and self.last_detection_time is None 
-                    and self.session_start_time is not None 
-                    and time.time() - self.session_start_time >= self.session_start_timeout):
-                    # Fallback siempre 'e' para reiniciar el lanzamiento
-                    fb_key = 'e'
-                    fb_wait = CONFIG.get('fallback_after_timeout_seconds', 1.5)
-                    print(f"Tiempo de espera agotado ({self.session_start_timeout:.1f}s) → Reiniciando con '{fb_key.upper()}'")
-                    # DEBUG DIAGNÓSTICO: Imprimir valores si falla para ajustar
-                    # print(f"DEBUG VALORES: Wait(R:{int(wait_r)} G:{int(wait_g)} diff:{int(wr_diff)})")
-                    # print(f"DEBUG E: G:{int(e_g)} diff:{int(e_diff)} | R: G:{int(r_g)} diff:{int(r_diff)} | T: G:{int(t_g)} diff:{int(t_diff)}")
-                    pyautogui.press(fb_key)
-                    time.sleep(fb_wait)
-                    self.reset_session()
-                    if CONFIG.get('start_press_on_run', True):
-                        start_key = CONFIG.get('start_key', '5')
-                        print(f"Reiniciando pesca tras timeout con '{start_key}'...")
-                        pyautogui.press(start_key)
-                    
+                state = self.pace_state()
+                # La captura en otro proceso sigue el mismo ritmo que el bucle
+                self.source.set_pace(self.scheduler.pace(state))
+                self.scheduler.wait(state)
+                if not self.tick():
+                    break
         except KeyboardInterrupt:
             print("\nDeteniendo bot...")
+        finally:
+            self.shutdown()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bot de pesca")
+    parser.add_argument('--source', default=None,
+                        help="Fuente de frames: 'live' (defecto), carpeta de imágenes, vídeo o 'synthetic[:N]'")
+    parser.add_argument('--headless', action='store_true',
+                        help="No pulsar teclas ni esperar (replay/perfilado)")
+    parser.add_argument('--record-keys', default=None, metavar='PATH',
+                        help="Con --headless, guardar la secuencia de teclas (instante, tecla) en un JSON")
+    parser.add_argument('--capture-process', action='store_true',
+                        help="Capturar en un proceso aparte (también con --source, para pruebas)")
+    parser.add_argument('--latency-dump', nargs='?', const='latency_dump.json', default=None,
+                        help="Volcar las latencias a un JSON al terminar")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    bot = FishingBot()
+    args = parse_args()
+    source = None
+    if args.capture_process:
+        settings = Settings(CONFIG)
+        source = ProcessFrameSource(settings.monitor, settings.capture_process, args.source, CONFIG)
+    elif args.source:
+        source = create_frame_source(args.source, CONFIG)
+    sink = RecordingInput(source) if args.headless else None
+    bot = FishingBot(frame_source=source, input_sink=sink)
+    bot.latency_dump = args.latency_dump
     bot.run()
+    if sink is not None and args.record_keys:
+        with open(args.record_keys, 'w', encoding='utf-8') as f:
+            json.dump([{'t': t, 'key': key} for t, key in sink.events], f, indent=1)
+        print(f"{len(sink.events)} pulsaciones guardadas en {args.record_keys}")
@@ -1,8 +1,12 @@
+import time
+
+# Referencia para medir cuánto tarda en abrirse la ventana
+GUI_START = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox
 import json
 import threading
-import time
 import os
 import sys
 
@@ -18,7 +22,7 @@ class FishingGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Panel de Control - Fishing Bot")
-        self.root.geometry("400x450")
+        self.root.geometry("400x490")
         self.root.resizable(False, False)
         
         # Estilo
@@ -110,6 +114,10 @@ class FishingGUI:
                                   relief=tk.RAISED, bd=3)
         self.start_btn.pack(fill=tk.X, pady=10, ipady=10)
         
+        # Volcado de latencias del bot en marcha
+        self.latency_btn = ttk.Button(main_frame, text="Guardar latencias", command=self.dump_latency)
+        self.latency_btn.pack(fill=tk.X)
+        
         # Etiqueta de Estado
         self.status_lbl = tk.Label(main_frame, text="Estado: DETENIDO", fg="red", font=("Arial", 10))
         self.status_lbl.pack(pady=5)
@@ -185,6 +193,14 @@ class FishingGUI:
             # Cuando el bot termina (por error o parada voluntaria), actualizar UI
             self.root.after(0, self.stop_bot_ui)
 
+    def dump_latency(self):
+        if not self.bot:
+            messagebox.showinfo("Latencias", "El bot no está corriendo.")
+            return
+        path = self.bot.latency.dump()
+        if path:
+            messagebox.showinfo("Latencias", f"Guardadas en {os.path.abspath(path)}")
+
     def stop_bot(self):
         if self.bot:
             print("Deteniendo bot...")
@@ -225,4 +241,5 @@ class FishingGUI:
 if __name__ == "__main__":
     root = tk.Tk()
     app = FishingGUI(root)
+    root.after_idle(lambda: print(f"Ventana abierta en {time.perf_counter() - GUI_START:.2f}s"))
     root.mainloop()
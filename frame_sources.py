@@ -0,0 +1,403 @@
+import os
+import time
+import glob
+import numpy as np
+import cv2
+
+# Fuentes de frames para FishingBot.
+# Todas devuelven imágenes BGRA (igual que mss) con el tamaño de la región de captura,
+# o None cuando la fuente se agota (modo replay).
+# Las fuentes de replay usan un reloj simulado (1/fps por frame) para que los tiempos
+# del bot (confirmación por frames, timeouts) se comporten como en vivo aunque se procese a máxima velocidad.
+#
+# Con una CaptureLayout activa (capture_mode 'bbox' o 'rois') la fuente solo entrega los
+# píxeles que leen los detectores, y grab_region() permite pedir aparte otras zonas
+# (p.ej. result_name_roi justo antes del OCR).
+# En vivo 'bbox' es una sola captura; 'rois' hace una por ROI y cada una paga el coste fijo de
+# GDI/X11, así que solo compensa si las ROIs están muy separadas (benchmark.py mide capture/*).
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+CAPTURE_MODES = ('full', 'bbox', 'rois')
+
+
+def valid_rect(rect):
+    return bool(rect) and rect.get('w', 0) > 0 and rect.get('h', 0) > 0
+
+
+def union_rect(rects):
+    rects = [r for r in rects if valid_rect(r)]
+    if not rects:
+        return None
+    x1 = min(r['x'] for r in rects)
+    y1 = min(r['y'] for r in rects)
+    x2 = max(r['x'] + r['w'] for r in rects)
+    y2 = max(r['y'] + r['h'] for r in rects)
+    return {'x': x1, 'y': y1, 'w': x2 - x1, 'h': y2 - y1}
+
+
+class CaptureLayout:
+    # Describe qué trozos de la región de captura se copian y dónde quedan en el frame entregado.
+    # parts: lista de (rect_origen, x_destino, y_destino); regions: rects remapeados al frame nuevo
+    def __init__(self, parts, width, height, regions):
+        self.parts = parts
+        self.width = width
+        self.height = height
+        self.regions = regions
+
+    @classmethod
+    def build(cls, mode, regions):
+        valid = {name: rect for name, rect in regions.items() if valid_rect(rect)}
+        if mode == 'full' or not valid:
+            return None
+        if mode == 'bbox':
+            box = union_rect(valid.values())
+            mapped = {name: {'x': r['x'] - box['x'], 'y': r['y'] - box['y'], 'w': r['w'], 'h': r['h']}
+                      for name, r in valid.items()}
+            return cls([(box, 0, 0)], box['w'], box['h'], mapped)
+        if mode == 'rois':
+            # Cada ROI se pega en una tira horizontal (atlas); el frame resultante es diminuto
+            parts, mapped = [], {}
+            x = 0
+            for name, r in valid.items():
+                parts.append((r, x, 0))
+                mapped[name] = {'x': x, 'y': 0, 'w': r['w'], 'h': r['h']}
+                x += r['w']
+            height = max(r['h'] for r in valid.values())
+            return cls(parts, x, height, mapped)
+        raise ValueError(f"capture_mode desconocido: {mode}")
+
+    def compose(self, full):
+        # Construye el frame de la layout a partir de un frame completo (fuentes de replay)
+        if len(self.parts) == 1:
+            r, _, _ = self.parts[0]
+            return np.ascontiguousarray(full[r['y']:r['y']+r['h'], r['x']:r['x']+r['w']])
+        out = np.zeros((self.height, self.width, full.shape[2]), dtype=full.dtype)
+        for r, dx, dy in self.parts:
+            out[dy:dy+r['h'], dx:dx+r['w']] = full[r['y']:r['y']+r['h'], r['x']:r['x']+r['w']]
+        return out
+
+
+def to_bgra(img):
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGRA)
+    if img.shape[2] == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+    return img
+
+
+class FrameSource:
+    # Interfaz mínima: grab() -> ndarray BGRA o None si no hay más frames
+    live = False
+
+    def __init__(self, fps=None):
+        self.frames_grabbed = 0
+        self.last_capture_time = None
+        self.interval = 1.0 / fps if fps else None
+        self.sim_time = time.time()
+        self.layout = None
+        self.last_full = None
+
+    def grab(self):
+        raise NotImplementedError
+
+    def set_layout(self, layout):
+        self.layout = layout
+
+    def set_pace(self, fps):
+        # FPS que pide el planificador del bot; solo lo usa la captura en otro proceso
+        pass
+
+    def grab_region(self, rect):
+        # Recorte puntual en coordenadas de la región de captura (del último frame en replay)
+        if self.last_full is None or not valid_rect(rect):
+            return None
+        x, y, w, h = rect['x'], rect['y'], rect['w'], rect['h']
+        if y + h > self.last_full.shape[0] or x + w > self.last_full.shape[1]:
+            return None
+        return self.last_full[y:y+h, x:x+w]
+
+    def _deliver(self, full):
+        # Fuentes de replay: guardan el frame completo y entregan solo la layout
+        self.last_full = full
+        self._mark()
+        if self.layout is None:
+            return full
+        return self.layout.compose(full)
+
+    def now(self):
+        if self.interval is None:
+            return time.time()
+        return self.sim_time
+
+    def _mark(self):
+        self.frames_grabbed += 1
+        if self.interval is not None:
+            self.sim_time += self.interval
+        self.last_capture_time = self.now()
+
+    def close(self):
+        pass
+
+
+class MssFrameSource(FrameSource):
+    # Captura en vivo de la ventana del juego
+    live = True
+
+    def __init__(self, monitor):
+        super().__init__()
+        import mss
+        self.sct = mss.mss()
+        self.monitor = monitor
+        self.part_monitors = []
+
+    def _to_monitor(self, rect):
+        return {
+            "top": self.monitor['top'] + rect['y'],
+            "left": self.monitor['left'] + rect['x'],
+            "width": rect['w'],
+            "height": rect['h']
+        }
+
+    def set_layout(self, layout):
+        self.layout = layout
+        self.part_monitors = []
+        if layout is not None:
+            self.part_monitors = [(self._to_monitor(r), dx, dy) for r, dx, dy in layout.parts]
+
+    def grab(self):
+        if self.layout is None:
+            img = np.array(self.sct.grab(self.monitor))
+        elif len(self.part_monitors) == 1:
+            img = np.array(self.sct.grab(self.part_monitors[0][0]))
+        else:
+            img = np.zeros((self.layout.height, self.layout.width, 4), dtype=np.uint8)
+            for mon, dx, dy in self.part_monitors:
+                img[dy:dy+mon['height'], dx:dx+mon['width']] = np.array(self.sct.grab(mon))
+        self._mark()
+        return img
+
+    def grab_region(self, rect):
+        # En vivo se captura solo ese rectángulo, en el momento en que se necesita
+        if not valid_rect(rect):
+            return None
+        return np.array(self.sct.grab(self._to_monitor(rect)))
+
+    def close(self):
+        self.sct.close()
+
+
+class ImageDirFrameSource(FrameSource):
+    # Reproduce una carpeta de capturas (p.ej. dataset/images) en orden de nombre
+    def __init__(self, path, loop=False, repeat=1, fps=30):
+        super().__init__(fps)
+        self.files = sorted(f for f in glob.glob(os.path.join(path, '*'))
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.files:
+            raise ValueError(f"No hay imágenes en {path}")
+        self.loop = loop
+        # Cada imagen se entrega 'repeat' veces seguidas para simular varios frames iguales
+        self.repeat = max(1, int(repeat))
+        self.index = 0
+        self.cache = {}
+
+    def _load(self, path):
+        img = self.cache.get(path)
+        if img is None:
+            img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if img is None:
+                raise ValueError(f"No se pudo leer {path}")
+            img = to_bgra(img)
+            self.cache[path] = img
+        return img
+
+    def grab(self):
+        total = len(self.files) * self.repeat
+        if self.index >= total:
+            if not self.loop:
+                return None
+            self.index = 0
+        img = self._load(self.files[self.index // self.repeat])
+        self.index += 1
+        return self._deliver(img)
+
+
+class VideoFrameSource(FrameSource):
+    # Reproduce un vídeo grabado de la región de captura
+    def __init__(self, path, loop=False, fps=None):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"No se pudo abrir el vídeo {path}")
+        super().__init__(fps or self.cap.get(cv2.CAP_PROP_FPS) or 30)
+        self.path = path
+        self.loop = loop
+
+    def grab(self):
+        ok, img = self.cap.read()
+        if not ok:
+            if not self.loop:
+                return None
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, img = self.cap.read()
+            if not ok:
+                return None
+        return self._deliver(to_bgra(img))
+
+    def close(self):
+        self.cap.release()
+
+
+class SyntheticFrameSource(FrameSource):
+    # Genera frames a partir de las áreas configuradas, recorriendo las fases de una pesca:
+    # esperando (verde) -> picó (rojo) -> letras E/R/T en verde -> menú cerrado.
+    # Duración de cada fase en segundos de reloj simulado.
+    PHASES = (('wait_green', 2.0), ('wait_red', 1.0), ('e', 1.0), ('r', 1.0), ('t', 1.0), ('finished', 5.0))
+
+    def __init__(self, config, frames=1000, noise=0, seed=0, fps=30):
+        super().__init__(fps)
+        capture = config.get('capture_region', {})
+        self.width = capture.get('width', 1920)
+        self.height = capture.get('height', 1080)
+        self.areas = config.get('areas', {})
+        self.icon = config.get('fishing_icon_roi')
+        self.name_roi = config.get('result_name_roi')
+        self.total = frames
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.index = 0
+        self.templates = {phase: self._render(phase) for phase, _ in self.PHASES}
+        # Secuencia de fases frame a frame para un ciclo completo
+        self.cycle = []
+        for phase, seconds in self.PHASES:
+            self.cycle.extend([phase] * max(1, int(round(seconds * fps))))
+
+    def _paint(self, img, rect, bgr):
+        if not rect or rect.get('w', 0) <= 0 or rect.get('h', 0) <= 0:
+            return
+        x, y, w, h = rect['x'], rect['y'], rect['w'], rect['h']
+        img[y:y+h, x:x+w, :3] = bgr
+
+    def _render(self, phase):
+        img = np.full((self.height, self.width, 4), 40, dtype=np.uint8)
+        img[..., 3] = 255
+        green = (60, 200, 60)
+        red = (40, 40, 220)
+        grey = (90, 90, 90)
+        if phase != 'finished':
+            self._paint(img, self.icon, (230, 230, 230))
+        elif valid_rect(self.name_roi):
+            # Nombre del pez al terminar, para ejercitar el OCR y su caché
+            r = self.name_roi
+            cv2.putText(img, "Carpa", (r['x'] + 4, r['y'] + r['h'] - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (230, 230, 230, 255), 2)
+        self._paint(img, self.areas.get('wait'), red if phase == 'wait_red' else green if phase == 'wait_green' else grey)
+        for key in ('e', 'r', 't'):
+            self._paint(img, self.areas.get(key), green if phase == key else grey)
+        return img
+
+    def grab(self):
+        if self.total is not None and self.index >= self.total:
+            return None
+        phase = self.cycle[self.index % len(self.cycle)]
+        self.index += 1
+        img = self.templates[phase]
+        if self.noise:
+            img = img.copy()
+            jitter = self.rng.integers(-self.noise, self.noise + 1, size=img[..., :3].shape)
+            img[..., :3] = np.clip(img[..., :3].astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+        return self._deliver(img)
+
+
+class TiledFrameSource(FrameSource):
+    # Replay del modo multi: pega en un lienzo el frame de cada fuente (una por cliente)
+    # en su rect, como si fuesen varias ventanas del juego en la misma pantalla.
+    def __init__(self, sources, rects, width, height, fps=30):
+        super().__init__(fps)
+        self.sources = list(zip(sources, rects))
+        self.width = width
+        self.height = height
+
+    def grab(self):
+        canvas = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        for source, r in self.sources:
+            img = source.grab()
+            if img is None:
+                return None
+            canvas[r['y']:r['y']+r['h'], r['x']:r['x']+r['w']] = img[:r['h'], :r['w']]
+        return self._deliver(canvas)
+
+    def close(self):
+        for source, _ in self.sources:
+            source.close()
+
+
+class SharedFrameGrabber:
+    # Modo multi (multi_bot.py): una sola captura por vuelta de la región que une a todos los
+    # clientes; cada ClientViewSource recorta de ella su ventana sin volver a capturar.
+    def __init__(self, source):
+        self.source = source
+        self.source.set_layout(None)
+        self.frame = None
+
+    @property
+    def live(self):
+        return self.source.live
+
+    def now(self):
+        return self.source.now()
+
+    def tick(self):
+        # Captura el frame de la vuelta; None si la fuente de replay se agotó
+        self.frame = self.source.grab()
+        return self.frame
+
+    def close(self):
+        self.source.close()
+
+
+class ClientViewSource(FrameSource):
+    # Vista de un cliente dentro del frame compartido: rect en coordenadas de la captura común.
+    # El recorte es una vista de numpy (sin copia) salvo que la layout del cliente componga otra.
+    def __init__(self, shared, rect):
+        super().__init__()
+        self.shared = shared
+        self.rect = rect
+        self.live = shared.live
+
+    def now(self):
+        return self.shared.now()
+
+    def _mark(self):
+        self.frames_grabbed += 1
+        self.last_capture_time = self.shared.source.last_capture_time
+
+    def grab(self):
+        frame = self.shared.frame
+        if frame is None:
+            return None
+        r = self.rect
+        return self._deliver(frame[r['y']:r['y']+r['h'], r['x']:r['x']+r['w']])
+
+    def close(self):
+        # La captura es del grabber compartido
+        pass
+
+
+def create_frame_source(spec, config):
+    # spec: None/'live' -> mss; 'synthetic[:N]'; carpeta -> imágenes; fichero -> vídeo
+    capture = config.get('capture_region', {})
+    monitor = {
+        "top": capture.get('top', 0),
+        "left": capture.get('left', 0),
+        "width": capture.get('width', 1920),
+        "height": capture.get('height', 1080)
+    }
+    if not spec or spec == 'live':
+        return MssFrameSource(monitor)
+    if spec.startswith('synthetic'):
+        _, _, count = spec.partition(':')
+        return SyntheticFrameSource(config, frames=int(count) if count else 1000)
+    if os.path.isdir(spec):
+        return ImageDirFrameSource(spec)
+    if os.path.isfile(spec):
+        return VideoFrameSource(spec)
+    raise ValueError(f"Fuente de frames desconocida: {spec}")
@@ -0,0 +1,198 @@
+import time
+import queue
+import threading
+
+# Destinos de entrada para FishingBot: a dónde van las pulsaciones de teclas.
+# El bot llama a send(tecla, etiqueta); al salir la tecla se avisa a on_sent con los instantes
+# (perf_counter) de encolado, inicio y fin del envío. QueuedInput hace el envío en un hilo
+# propio para que el bucle de captura nunca se bloquee por la entrada (p. ej. el PAUSE de
+# pyautogui). Ninguna espera del bot pasa por aquí: los retrasos son plazos del propio bucle.
+# En modo multi (multi_bot.py) cada cliente tiene un ClientInput que encola en un único
+# QueuedInput compartido: el hilo da el foco a la ventana del cliente antes de sus teclas.
+
+
+class InputSink:
+    def __init__(self):
+        self.presses = 0
+        # on_sent(tecla, etiqueta, encolada, inicio, fin)
+        self.on_sent = None
+        # on_dropped(tecla, etiqueta): tecla descartada por cola llena (el bot la registra como evento)
+        self.on_dropped = None
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def send(self, key, tag=None):
+        # Envío síncrono; QueuedInput lo sustituye por uno en segundo plano
+        queued = time.perf_counter()
+        self.press(key)
+        self._sent(key, tag, queued, queued)
+
+    def _sent(self, key, tag, queued_at, started_at):
+        if self.on_sent is not None:
+            try:
+                self.on_sent(key, tag, queued_at, started_at, time.perf_counter())
+            except Exception as e:
+                print(f"Error registrando pulsación: {e}")
+
+    def focus(self, sink):
+        # Llamado por QueuedInput antes de la primera tecla de este destino tras otro distinto
+        pass
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiInput(InputSink):
+    # Pulsaciones reales sobre la ventana del juego
+    def __init__(self, pause=None):
+        super().__init__()
+        # Import diferido: pyautogui necesita un display y no existe en máquinas de build
+        import pyautogui
+        self.pyautogui = pyautogui
+        # Pausa que pyautogui aplica tras cada llamada (0.1s por defecto)
+        if pause is not None:
+            pyautogui.PAUSE = pause
+
+    def press(self, key):
+        self.pyautogui.press(key)
+        self.presses += 1
+
+    def click(self, x, y):
+        self.pyautogui.click(x, y)
+
+
+class NullInput(InputSink):
+    # No pulsa nada: para replays y perfiles headless
+    def __init__(self, source=None):
+        super().__init__()
+        self.source = source
+
+    def press(self, key):
+        self.presses += 1
+
+
+class RecordingInput(NullInput):
+    # Como NullInput, pero guarda (instante, tecla) de cada pulsación para comprobar la
+    # secuencia exacta en replays. El instante es el reloj de la fuente (simulado en replay).
+    def __init__(self, source=None):
+        super().__init__(source)
+        self.events = []
+
+    def press(self, key):
+        now = self.source.now() if self.source is not None else time.perf_counter()
+        self.events.append((now, key))
+        self.presses += 1
+
+    @property
+    def keys(self):
+        return [key for _, key in self.events]
+
+    def intervals(self):
+        # Segundos entre pulsaciones consecutivas
+        times = [t for t, _ in self.events]
+        return [b - a for a, b in zip(times, times[1:])]
+
+
+class QueuedInput(InputSink):
+    # Envía las teclas de otro destino desde un hilo propio, en orden de llegada.
+    # send() nunca bloquea: si la cola está llena la tecla se descarta y se cuenta.
+    def __init__(self, sink, maxsize=32):
+        super().__init__()
+        self.sink = sink
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.max_wait = 0.0
+        self.thread = threading.Thread(target=self._loop, name="input-dispatch", daemon=True)
+        self.thread.start()
+
+    def press(self, key):
+        self.send(key)
+
+    def send(self, key, tag=None):
+        return self.submit(self, key, tag)
+
+    def submit(self, owner, key, tag=None):
+        # owner: destino que pidió la tecla (él mismo o un ClientInput); recibe el aviso on_sent
+        try:
+            self.jobs.put_nowait((owner, key, tag, time.perf_counter()))
+        except queue.Full:
+            self.dropped += 1
+            if owner.on_dropped is not None:
+                owner.on_dropped(key, tag)
+            else:
+                print(f"Entrada saturada: tecla '{key}' descartada")
+            return False
+        return True
+
+    def _loop(self):
+        focused = None
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            owner, key, tag, queued_at = job
+            started = time.perf_counter()
+            self.max_wait = max(self.max_wait, started - queued_at)
+            try:
+                if owner is not focused:
+                    owner.focus(self.sink)
+                    focused = owner
+                self.sink.press(key)
+                self.presses += 1
+                if owner is not self:
+                    owner.presses += 1
+            except Exception as e:
+                print(f"Error enviando tecla '{key}': {e}")
+            else:
+                owner._sent(key, tag, queued_at, started)
+            self.jobs.task_done()
+
+    @property
+    def pending(self):
+        return self.jobs.qsize()
+
+    def report(self):
+        return (f"Entrada: {self.presses} teclas enviadas, {self.dropped} descartadas, "
+                f"espera máx. en cola {self.max_wait * 1000:.0f} ms")
+
+    def close(self, timeout=2.0):
+        # Deja salir las teclas pendientes y para el hilo
+        try:
+            self.jobs.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
+        self.sink.close()
+
+
+class ClientInput(InputSink):
+    # Entrada de un cliente en modo multi: encola en el QueuedInput compartido, que serializa
+    # las teclas de todos los clientes y hace clic en focus_point (coordenadas de pantalla)
+    # para activar su ventana antes de pulsar.
+    def __init__(self, dispatcher, focus_point=None, focus_delay=0.05):
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.focus_point = focus_point
+        self.focus_delay = focus_delay
+        self.focus_changes = 0
+
+    def press(self, key):
+        self.send(key)
+
+    def send(self, key, tag=None):
+        return self.dispatcher.submit(self, key, tag)
+
+    def focus(self, sink):
+        # Corre en el hilo de entrada: la espera no frena a ningún bot
+        if not self.focus_point or not hasattr(sink, 'click'):
+            return
+        sink.click(self.focus_point['x'], self.focus_point['y'])
+        self.focus_changes += 1
+        if self.focus_delay > 0:
+            time.sleep(self.focus_delay)
+
+    def close(self):
+        # El dispatcher es compartido: lo cierra quien lo creó
+        pass
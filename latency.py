@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import numpy as np
+
+# Instrumentación de latencias.
+# Cada serie (etapa del bucle o tecla) guarda sus últimas 'capacity' muestras en un buffer
+# circular de numpy; añadir una muestra es O(1) y no reserva memoria. Los percentiles se
+# calculan solo al pedir el resumen (periódico o al volcar a fichero).
+
+PERCENTILES = (50, 95, 99)
+
+
+class RingBuffer:
+    __slots__ = ('data', 'pos', 'count', 'total')
+
+    def __init__(self, capacity):
+        self.data = np.zeros(max(1, int(capacity)), dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+        # Muestras vistas desde el inicio (no solo las que caben)
+        self.total = 0
+
+    def add(self, value):
+        self.data[self.pos] = value
+        self.pos += 1
+        if self.pos == self.data.size:
+            self.pos = 0
+        if self.count < self.data.size:
+            self.count += 1
+        self.total += 1
+
+    def values(self):
+        # En orden cronológico
+        if self.count < self.data.size:
+            return self.data[:self.count].copy()
+        return np.concatenate((self.data[self.pos:], self.data[:self.pos]))
+
+
+class LatencyTracker:
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get('enabled', True)
+        self.capacity = int(config.get('capacity', 2048))
+        self.report_every = float(config.get('report_every_seconds', 0))
+        self.dump_path = config.get('dump_path', 'latency_dump.json')
+        self.series = {}
+        self.started = time.perf_counter()
+        self.last_report = self.started
+        # Destino del informe periódico: el bot lo envía al registro de eventos (hilo escritor)
+        self.on_report = print
+
+    def add(self, name, seconds):
+        if not self.enabled:
+            return
+        buf = self.series.get(name)
+        if buf is None:
+            buf = self.series[name] = RingBuffer(self.capacity)
+        buf.add(seconds)
+
+    def since(self, name, start):
+        # Añade la duración desde 'start' (perf_counter) y devuelve el instante actual
+        now = time.perf_counter()
+        self.add(name, now - start)
+        return now
+
+    def summary(self):
+        out = {}
+        for name, buf in list(self.series.items()):
+            values = buf.values()
+            if values.size == 0:
+                continue
+            p = np.percentile(values, PERCENTILES)
+            out[name] = {
+                'count': buf.total,
+                'window': int(values.size),
+                'mean_ms': float(values.mean() * 1000),
+                'max_ms': float(values.max() * 1000),
+            }
+            for q, v in zip(PERCENTILES, p.tolist()):
+                out[name][f'p{q}_ms'] = v * 1000
+        return out
+
+    def report(self):
+        parts = [f"{name} {info['p50_ms']:.1f}/{info['p95_ms']:.1f}/{info['p99_ms']:.1f}"
+                 for name, info in self.summary().items()]
+        if not parts:
+            return None
+        return "Latencias ms p50/p95/p99: " + " | ".join(parts)
+
+    def maybe_report(self):
+        if self.report_every <= 0:
+            return
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            report = self.report()
+            if report:
+                self.on_report(report)
+
+    def dump(self, path=None):
+        # Resumen y muestras crudas (en ms) de la ventana actual
+        path = path or self.dump_path
+        data = {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'uptime_seconds': time.perf_counter() - self.started,
+            'summary': self.summary(),
+            'samples_ms': {name: (buf.values() * 1000).round(3).tolist()
+                           for name, buf in list(self.series.items())}
+        }
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Error guardando {path}: {e}")
+            return None
+        print(f"Latencias guardadas en {path}")
+        return path
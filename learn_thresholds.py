@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import cv2
+
+from color_lut import CLASSES, LABELS_FILE, IMAGES_DIR, load_labels
+from color_stats import region_pixel_index
+from settings import CONFIG_FILE, DEFAULT_THRESHOLDS, Settings, read_config
+
+# Calibración offline de los umbrales de color (bloque "thresholds" de config_fishing.json).
+# Carga las capturas etiquetadas (dataset/images + dataset/labels.json, el mismo formato que
+# color_lut.py) en un único array, calcula las medias de todas las ROIs de todos los frames de
+# una vez y busca los umbrales que mejor separan cada clase: por cada regla se cuentan los
+# ejemplos en un histograma 2D (valor del canal, diferencia) cuya suma acumulada da aciertos y
+# falsos positivos para todos los pares de umbrales posibles a la vez.
+#
+#   python learn_thresholds.py              # aprende, muestra las matrices y escribe la config
+#   python learn_thresholds.py --dry-run    # solo muestra el resultado
+#
+# Reglas del bot (fishing_bot.classify) que se aprenden, con los mínimos compartidos (un mínimo
+# compartido solo se aprende si todas las reglas que lo usan tienen ejemplos):
+#   wait verde:   g >= green_min  y g_diff > wait_green_diff_min
+#   letra verde:  g >= green_min  y g_diff > green_diff_min
+#   wait rojo:    r >  red_min    y r_diff > wait_red_diff_min
+#   letra roja:   r >= red_min    y r_diff > letter_red_diff_min
+
+LETTERS = ('e', 'r', 't')
+
+# (umbral de diferencia, ROIs, clase positiva, umbral mínimo compartido, mínimo estricto)
+RULES = (
+    ('wait_green_diff_min', ('wait',), 'green', 'green_min', False),
+    ('green_diff_min', LETTERS, 'green', 'green_min', False),
+    ('wait_red_diff_min', ('wait',), 'red', 'red_min', True),
+    ('letter_red_diff_min', LETTERS, 'red', 'red_min', False),
+)
+
+# Rango de las diferencias (canal - máximo de los otros dos)
+DIFF_OFFSET = 255
+
+
+def load_stack(images_dir, labels, shape=None):
+    # (nombres, array (N, alto, ancho, 3)) con las capturas etiquetadas del tamaño de la región
+    names, frames = [], []
+    for name in sorted(labels):
+        img = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+        if img is None:
+            print(f"Sin imagen para la etiqueta {name}")
+            continue
+        if shape is None:
+            shape = img.shape[:2]
+        if img.shape[:2] != tuple(shape):
+            print(f"{name}: {img.shape[1]}x{img.shape[0]} no coincide con la región de captura, se omite")
+            continue
+        names.append(name)
+        frames.append(img)
+    if not frames:
+        return names, None
+    return names, np.stack(frames)
+
+
+def region_means(stack, regions):
+    # {ROI: (N, 3) medias B, G, R} de todos los frames en una pasada
+    count, height, width = stack.shape[:3]
+    names, index, counts = region_pixel_index(regions, (height, width))
+    if not names:
+        return {}
+    pixels = stack.reshape(count, height * width, 3)[:, index].astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sums = np.add.reduceat(pixels, starts, axis=1)
+    means = sums / np.array(counts, dtype=np.float64)[None, :, None]
+    return {name: means[:, i] for i, name in enumerate(names)}
+
+
+def channel_features(means, cls):
+    # (valor del canal, diferencia con el máximo de los otros) como en RegionStats
+    b, g, r = means[:, 0], means[:, 1], means[:, 2]
+    if cls == 'green':
+        return g, g - np.maximum(r, b)
+    return r, r - np.maximum(g, b)
+
+
+def suffix_counts(values, diffs, strict):
+    # S[i, j] = nº de ejemplos con valor en el índice >= i y ceil(diff) >= j - DIFF_OFFSET.
+    # Con umbral entero t: v >= t <=> floor(v) >= t, y v > t <=> ceil(v) >= t + 1.
+    hist = np.zeros((257 + 1, 2 * DIFF_OFFSET + 2 + 1), dtype=np.int64)
+    rounded = np.ceil(values) if strict else np.floor(values)
+    vi = np.clip(rounded, 0, 256).astype(np.intp)
+    di = np.clip(np.ceil(diffs) + DIFF_OFFSET, 0, 2 * DIFF_OFFSET + 1).astype(np.intp)
+    np.add.at(hist, (vi, di), 1)
+    return hist[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1]
+
+
+def rule_data(samples, rule):
+    # (valores, diferencias, es positivo) de todas las ROIs de la regla
+    _, rois, positive, _, _ = rule
+    values, diffs, labels = [], [], []
+    for roi in rois:
+        if roi not in samples:
+            continue
+        means, roi_labels = samples[roi]
+        v, d = channel_features(means, positive)
+        values.append(v)
+        diffs.append(d)
+        labels.append(roi_labels == positive)
+    if not values:
+        return None
+    return np.concatenate(values), np.concatenate(diffs), np.concatenate(labels)
+
+
+def rule_scores(values, diffs, labels, strict):
+    # Exactitud equilibrada (media de aciertos en positivos y en negativos) para cada par
+    # (mínimo 0..255, diferencia -255..255); None si faltan positivos o negativos
+    pos, neg = int(labels.sum()), int((~labels).sum())
+    if not pos or not neg:
+        return None
+    s_pos = suffix_counts(values[labels], diffs[labels], strict)
+    s_neg = suffix_counts(values[~labels], diffs[~labels], strict)
+    mins = np.arange(256) + (1 if strict else 0)
+    # diff > t <=> ceil(diff) >= t + 1
+    cols = np.arange(-DIFF_OFFSET, DIFF_OFFSET + 1) + 1 + DIFF_OFFSET
+    tp = s_pos[np.ix_(mins, cols)]
+    fp = s_neg[np.ix_(mins, cols)]
+    return 0.5 * (tp / pos + (neg - fp) / neg)
+
+
+def plateau_center(row, best, lo, hi):
+    # Centro del tramo más largo de valores óptimos dentro de [lo, hi] (el rango de los datos):
+    # el umbral queda lo más lejos posible de los ejemplos de ambos lados
+    idx = np.flatnonzero(row >= best - 1e-12)
+    inside = idx[(idx >= lo) & (idx <= hi)]
+    if inside.size:
+        idx = inside
+    runs = np.split(idx, np.flatnonzero(np.diff(idx) > 1) + 1)
+    run = max(runs, key=len)
+    return int(run[len(run) // 2])
+
+
+def span(values, offset=0):
+    # Índices de umbral entre el ejemplo más bajo (todos pasan) y el más alto (ninguno pasa)
+    return int(np.floor(values.min())) - 1 + offset, int(np.ceil(values.max())) + offset
+
+
+def learn(samples, current):
+    # {umbral: valor}, {umbral de diferencia: exactitud equilibrada} y {mínimo compartido
+    # conservado: reglas sin ejemplos} para las reglas aprendibles
+    thresholds, scores, kept = {}, {}, {}
+    data, grids = {}, {}
+    for rule in RULES:
+        found = rule_data(samples, rule)
+        grid = rule_scores(*found, rule[4]) if found is not None else None
+        if grid is not None:
+            data[rule[0]] = found
+            grids[rule[0]] = grid
+    for shared in ('green_min', 'red_min'):
+        sharing = [r[0] for r in RULES if r[3] == shared]
+        rules = [key for key in sharing if key in grids]
+        if not rules:
+            continue
+        missing = [key for key in sharing if key not in grids]
+        if missing:
+            # Un mínimo compartido solo se mueve si todas sus reglas tienen ejemplos: si no, se
+            # cambiaría el umbral efectivo de una regla sin datos. Se conserva el actual y solo
+            # se aprenden las diferencias de las reglas con ejemplos.
+            best_min = int(np.clip(round(float(current[shared])), 0, 255))
+            kept[shared] = missing
+        else:
+            # El mínimo compartido maximiza la suma de la mejor exactitud de cada regla
+            total = sum(grids[key].max(axis=1) for key in rules)
+            values = np.concatenate([data[key][0] for key in rules])
+            best_min = plateau_center(total, total.max(), *span(values))
+            thresholds[shared] = best_min
+        for key in rules:
+            row = grids[key][best_min]
+            diffs = data[key][1]
+            thresholds[key] = plateau_center(row, row.max(), *span(diffs, DIFF_OFFSET)) - DIFF_OFFSET
+            scores[key] = float(row.max())
+    return thresholds, scores, kept
+
+
+def predict(samples, th):
+    # Clase que daría fishing_bot.classify a cada ROI con los umbrales th
+    out = {}
+    for roi, (means, _) in samples.items():
+        g, g_diff = channel_features(means, 'green')
+        r, r_diff = channel_features(means, 'red')
+        if roi == 'wait':
+            red = (r > th['red_min']) & (r_diff > th['wait_red_diff_min'])
+            green = (g >= th['green_min']) & (g_diff > th['wait_green_diff_min'])
+        else:
+            red = (r >= th['red_min']) & (r_diff > th['letter_red_diff_min'])
+            green = (g >= th['green_min']) & (g_diff > th['green_diff_min'])
+        pred = np.full(len(means), 'neutral', dtype=object)
+        pred[green] = 'green'
+        pred[red] = 'red'
+        out[roi] = pred
+    return out
+
+
+def confusion(samples, th):
+    # {ROI: matriz 3x3 etiqueta x predicción en el orden de CLASSES}
+    out = {}
+    for roi, pred in predict(samples, th).items():
+        labels = samples[roi][1]
+        matrix = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+        for i, label in enumerate(CLASSES):
+            for j, cls in enumerate(CLASSES):
+                matrix[i, j] = int(((labels == label) & (pred == cls)).sum())
+        out[roi] = matrix
+    return out
+
+
+def print_confusion(title, matrices):
+    print(title)
+    header = ''.join(f"{c:>9}" for c in CLASSES)
+    for roi, matrix in matrices.items():
+        ok = int(np.trace(matrix))
+        print(f"  {roi}: {ok}/{int(matrix.sum())} correctas")
+        print(f"    {'etiqueta':<9}{header}")
+        for label, row in zip(CLASSES, matrix):
+            if row.sum():
+                print(f"    {label:<9}" + ''.join(f"{v:>9}" for v in row))
+
+
+def write_thresholds(path, thresholds):
+    config = read_config(path)
+    block = dict(config.get('thresholds') or {})
+    block.update(thresholds)
+    config['thresholds'] = block
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    # Sustitución atómica: la recarga en caliente del bot nunca ve el fichero a medias
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aprende los umbrales de color desde capturas etiquetadas")
+    parser.add_argument('--labels', default=LABELS_FILE, help="Etiquetas por captura y ROI")
+    parser.add_argument('--images', default=IMAGES_DIR, help="Carpeta de capturas")
+    parser.add_argument('--config', default=CONFIG_FILE, help="Configuración a leer y actualizar")
+    parser.add_argument('--dry-run', action='store_true', help="No escribir config_fishing.json")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.labels):
+        print(f"No existe {args.labels}: etiqueta algunas capturas (ver color_lut.py)")
+        return 1
+    settings = Settings(read_config(args.config))
+    monitor = settings.monitor
+    labels = load_labels(args.labels)
+    names, stack = load_stack(args.images, labels, (monitor['height'], monitor['width']))
+    if stack is None:
+        print("No hay capturas etiquetadas utilizables")
+        return 1
+
+    regions = {roi: settings.regions[roi] for roi in ('wait',) + LETTERS if roi in settings.regions}
+    means = region_means(stack, regions)
+    samples = {}
+    for roi, roi_means in means.items():
+        rows = [i for i, name in enumerate(names) if roi in labels[name]]
+        if rows:
+            samples[roi] = (roi_means[rows], np.array([labels[names[i]][roi] for i in rows], dtype=object))
+    if not samples:
+        print("Ninguna ROI configurada tiene etiquetas")
+        return 1
+    print(f"{len(names)} capturas, ROIs etiquetadas: "
+          + ', '.join(f"{roi} {len(lab)}" for roi, (_, lab) in samples.items()))
+
+    current = dict(DEFAULT_THRESHOLDS)
+    current.update(settings.get('thresholds') or {})
+    learned, scores, kept = learn(samples, current)
+    if not learned:
+        print("Faltan ejemplos positivos y negativos para todas las reglas: nada que aprender")
+        return 1
+    final = dict(current)
+    final.update(learned)
+
+    print_confusion("Umbrales actuales:", confusion(samples, current))
+    print_confusion("Umbrales aprendidos:", confusion(samples, final))
+    print("Umbrales:")
+    for key in DEFAULT_THRESHOLDS:
+        note = f" (exactitud equilibrada {scores[key]:.2f})" if key in scores else ""
+        if key in kept:
+            note = f" (compartido; sin ejemplos de {', '.join(kept[key])}: se conserva)"
+        elif key not in learned:
+            note = " (sin ejemplos: se conserva)"
+        print(f"  {key}: {current[key]} -> {final[key]}{note}")
+
+    if args.dry_run:
+        return 0
+    write_thresholds(args.config, learned)
+    print(f"Umbrales guardados en {args.config}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
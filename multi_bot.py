@@ -0,0 +1,215 @@
+import time
+import argparse
+
+from fishing_bot import FishingBot, OcrServices
+from capture_process import ProcessFrameSource
+from frame_sources import (MssFrameSource, SharedFrameGrabber, ClientViewSource, TiledFrameSource,
+                           SyntheticFrameSource, create_frame_source, union_rect)
+from input_sinks import PyAutoGuiInput, QueuedInput, ClientInput, RecordingInput
+from scheduler import FrameScheduler
+from event_log import EventLog
+from settings import CONFIG_FILE, Settings, SettingsWatcher, read_config
+
+# Varios clientes del juego con un solo proceso.
+# En cada vuelta se hace UNA captura de la región que une a todos los clientes y cada bot
+# recorta su ventana (vista de numpy, sin copia). Los bots comparten el lector OCR (el modelo
+# se carga una vez), la caché y las plantillas de nombres, el registro de eventos y un único
+# hilo de entrada que serializa las teclas: antes de pulsar para otro cliente hace clic en su
+# focus_point para darle el foco. Cada cliente conserva su máquina de estados, su confirmación
+# de señales y su cerebro (estadísticas en catch_stats.<nombre>.json).
+#
+# En config_fishing.json, cada entrada de "clients" sobrescribe claves de la configuración base:
+#   "clients": [
+#     {"name": "izq", "capture_region": {"top": 0, "left": 0, "width": 960, "height": 1080},
+#      "focus_point": {"x": 480, "y": 20}},
+#     {"name": "der", "capture_region": {"top": 0, "left": 960, "width": 960, "height": 1080},
+#      "focus_point": {"x": 1440, "y": 20}}
+#   ]
+# areas, result_name_roi y fishing_icon_roi son relativas a la capture_region de cada cliente
+# (por defecto las de la base, si todas las ventanas tienen el mismo tamaño).
+#
+#   python multi_bot.py [--source synthetic:N] [--headless]
+
+# Orden de exigencia para el ritmo de captura común: manda el cliente más activo
+PACE_PRIORITY = ('burst', 'default', 'esperando', 'cooldown')
+
+# Claves de un cliente que no son configuración del bot
+CLIENT_ONLY_KEYS = ('name', 'focus_point')
+
+
+def client_configs(config):
+    # [(nombre, configuración completa del cliente, focus_point)]
+    out = []
+    for i, client in enumerate(config.get('clients', [])):
+        name = client.get('name') or f"cliente{i + 1}"
+        merged = {k: v for k, v in config.items() if k != 'clients'}
+        merged.update({k: v for k, v in client.items() if k not in CLIENT_ONLY_KEYS})
+        merged.setdefault('catch_stats_file', f"catch_stats.{name}.json")
+        out.append((name, merged, client.get('focus_point')))
+    return out
+
+
+def union_monitor(monitors):
+    box = union_rect([{'x': m['left'], 'y': m['top'], 'w': m['width'], 'h': m['height']}
+                      for m in monitors])
+    return {"top": box['y'], "left": box['x'], "width": box['w'], "height": box['h']}
+
+
+def view_rect(monitor, union):
+    # Ventana del cliente en coordenadas de la captura común
+    return {'x': monitor['left'] - union['left'], 'y': monitor['top'] - union['top'],
+            'w': monitor['width'], 'h': monitor['height']}
+
+
+class MultiBot:
+    def __init__(self, config=None, frame_source=None, input_sink=None):
+        # config inyectada (pruebas, replays): sin recarga en caliente
+        self.owns_config = config is None
+        self.config = read_config(CONFIG_FILE) if config is None else config
+        clients = client_configs(self.config)
+        if not clients:
+            raise ValueError(f"{CONFIG_FILE} no define 'clients'")
+        base = Settings(self.config)
+        self.settings = base
+        client_settings = [(name, Settings(cfg), focus) for name, cfg, focus in clients]
+        self.union = union_monitor([s.monitor for _, s, _ in client_settings])
+
+        # Una captura por vuelta para todos (opcionalmente desde el proceso de captura)
+        if frame_source is None:
+            capture_cfg = base.capture_process
+            if capture_cfg.get('enabled', False):
+                frame_source = ProcessFrameSource(self.union, capture_cfg)
+            else:
+                frame_source = MssFrameSource(self.union)
+        self.source = frame_source
+        self.grabber = SharedFrameGrabber(self.source)
+        # Un solo hilo de entrada para todos los clientes
+        if input_sink is None:
+            input_sink = PyAutoGuiInput(base.input.get('pause_seconds', 0.1))
+        self.dispatcher = QueuedInput(input_sink, base.input.get('queue_size', 32) * len(clients))
+        # OCR y registro compartidos
+        self.ocr = OcrServices(base)
+        self.events = EventLog.from_config(base.event_log, echo_all=base.log_event_details)
+        self.scheduler = FrameScheduler(base.scheduler, enabled=self.source.live)
+        self.scheduler.on_report = lambda report: self.events.emit('pace_report', report,
+                                                                   states=self.scheduler.summary())
+        self.settings_watcher = SettingsWatcher(CONFIG_FILE, base.hot_reload_seconds if self.owns_config else 0)
+
+        self.bots = []
+        focus_delay = base.input.get('focus_delay_seconds', 0.05)
+        for name, settings, focus in client_settings:
+            view = ClientViewSource(self.grabber, view_rect(settings.monitor, self.union))
+            sink = ClientInput(self.dispatcher, focus, focus_delay)
+            self.bots.append(FishingBot(frame_source=view, input_sink=sink, settings=settings,
+                                        ocr=self.ocr, events=self.events, name=name))
+        self.running = True
+        self.frames = 0
+        self.started = time.perf_counter()
+
+    def apply_config(self, config):
+        # Recarga en caliente: base y clientes se recompilan; cada bot aplica la suya
+        clients = client_configs(config)
+        if len(clients) != len(self.bots):
+            print("Cambió el número de clientes: reinicia multi_bot.py para aplicarlo")
+            return
+        self.config = config
+        self.settings = Settings(config)
+        client_settings = [(name, Settings(cfg), focus) for name, cfg, focus in clients]
+        union = union_monitor([s.monitor for _, s, _ in client_settings])
+        if union != self.union:
+            self.union = union
+            if isinstance(self.source, MssFrameSource):
+                self.source.monitor = union
+            elif isinstance(self.source, ProcessFrameSource):
+                # El buffer compartido cambia de tamaño: se reinicia el proceso de captura
+                self.source.monitor = union
+                self.source.set_layout(None)
+        for bot, (_, settings, focus) in zip(self.bots, client_settings):
+            bot.source.rect = view_rect(settings.monitor, self.union)
+            bot.input.focus_point = focus
+            bot.apply_settings(settings)
+        self.scheduler.configure(self.settings.scheduler)
+        self.settings_watcher.interval = self.settings.hot_reload_seconds
+
+    def pace_state(self):
+        states = {bot.pace_state() for bot in self.bots}
+        for state in PACE_PRIORITY:
+            if state in states:
+                return state
+        return 'default'
+
+    def run(self):
+        print(f"--- MULTI: {len(self.bots)} clientes, captura común "
+              f"{self.union['width']}x{self.union['height']} ---")
+        for bot in self.bots:
+            bot.start()
+        self.frames = 0
+        self.started = time.perf_counter()
+        try:
+            while self.running:
+                state = self.pace_state()
+                self.source.set_pace(self.scheduler.pace(state))
+                self.scheduler.wait(state)
+                new_settings = self.settings_watcher.poll()
+                if new_settings is not None:
+                    self.apply_config(dict(new_settings.raw))
+                if self.grabber.tick() is None:
+                    break
+                self.frames += 1
+                for bot in self.bots:
+                    bot.tick()
+        except KeyboardInterrupt:
+            print("\nDeteniendo bots...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        elapsed = time.perf_counter() - self.started
+        fps = self.frames / elapsed if elapsed > 0 else 0.0
+        # Nombres pendientes antes de que cada bot guarde sus estadísticas
+        self.ocr.stop(self.settings.ocr_flush_timeout)
+        for bot in self.bots:
+            bot.shutdown()
+        self.events.close()
+        print("--- MULTI ---")
+        print(f"Capturas compartidas: {self.frames} en {elapsed:.2f}s ({fps:.1f} FPS) "
+              f"para {len(self.bots)} clientes")
+        if self.scheduler.stats:
+            print(self.scheduler.report())
+        self.ocr.save()
+        print(self.dispatcher.report())
+        if isinstance(self.source, ProcessFrameSource):
+            print(self.source.report())
+        self.dispatcher.close()
+        self.grabber.close()
+
+
+def create_multi_source(spec, config):
+    # 'synthetic[:N]': un replay sintético por cliente pegados en su ventana;
+    # cualquier otra fuente debe tener el tamaño de la captura común
+    clients = [(name, Settings(cfg)) for name, cfg, _ in client_configs(config)]
+    union = union_monitor([s.monitor for _, s in clients])
+    if spec.startswith('synthetic'):
+        _, _, count = spec.partition(':')
+        frames = int(count) if count else 1000
+        sources = [SyntheticFrameSource(dict(s.raw), frames=frames) for _, s in clients]
+        rects = [view_rect(s.monitor, union) for _, s in clients]
+        return TiledFrameSource(sources, rects, union['width'], union['height'])
+    return create_frame_source(spec, {'capture_region': union})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bot de pesca para varios clientes")
+    parser.add_argument('--source', default=None,
+                        help="Fuente de frames: 'live' (defecto), 'synthetic[:N]', o carpeta/vídeo "
+                             "del tamaño de la captura común")
+    parser.add_argument('--headless', action='store_true', help="No pulsar teclas (replay/perfilado)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = read_config(CONFIG_FILE)
+    source = create_multi_source(args.source, config) if args.source else None
+    sink = RecordingInput(source) if args.headless else None
+    MultiBot(frame_source=source, input_sink=sink).run()
@@ -0,0 +1,164 @@
+import os
+import json
+import threading
+import unicodedata
+import difflib
+import numpy as np
+import cv2
+
+from ocr_cache import binarize_name
+
+# Reconocedor de nombres de peces por plantillas.
+# Los nombres son un vocabulario cerrado (fish_labels.json), así que cada lectura de EasyOCR
+# que se resuelve a un pez conocido se guarda como plantilla de palabra completa (binarizada
+# y normalizada a altura fija). Los recortes nuevos se comparan por correlación normalizada
+# (cv2.matchTemplate) y solo se llama a EasyOCR si ninguna plantilla supera el umbral.
+
+LABELS_FILE = 'fish_labels.json'
+TEMPLATES_FILE = 'name_templates.npz'
+TEMPLATE_HEIGHT = 24
+# Margen (px) para tolerar pequeños desplazamientos al comparar
+MATCH_PAD = 3
+
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def load_label_aliases(path=LABELS_FILE):
+    # {alias_normalizado: nombre_canónico}; el propio nombre canónico también cuenta como alias
+    aliases = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                labels = json.load(f).get('labels', {})
+        except Exception as e:
+            print(f"Error cargando {path}: {e}")
+            labels = {}
+        for canonical, names in labels.items():
+            aliases[normalize_text(canonical)] = canonical
+            for name in names:
+                aliases[normalize_text(name)] = canonical
+    return aliases
+
+
+def canonical_name(text, aliases, cutoff=0.8):
+    # Resuelve un texto OCR al nombre canónico del pez (o None)
+    norm = normalize_text(text)
+    if not norm:
+        return None
+    if norm in aliases:
+        return aliases[norm]
+    # Preferir el alias más largo contenido en el texto ("fletan negro" antes que "fletan")
+    contained = [alias for alias in aliases if alias in norm]
+    if contained:
+        return aliases[max(contained, key=len)]
+    close = difflib.get_close_matches(norm, list(aliases), n=1, cutoff=cutoff)
+    if close:
+        return aliases[close[0]]
+    return None
+
+
+def normalize_template(roi):
+    binary = binarize_name(roi)
+    if binary is None or binary.size == 0:
+        return None
+    h, w = binary.shape[:2]
+    width = max(1, int(round(w * TEMPLATE_HEIGHT / float(h))))
+    return cv2.resize(binary, (width, TEMPLATE_HEIGHT), interpolation=cv2.INTER_AREA)
+
+
+class NameTemplateLibrary:
+    def __init__(self, path=TEMPLATES_FILE, threshold=0.8, per_name=3):
+        self.path = path
+        self.threshold = threshold
+        self.per_name = per_name
+        # Lista de (canónico, texto mostrado, plantilla uint8)
+        self.templates = []
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                names = data['names'].tolist()
+                texts = data['texts'].tolist()
+                for i, (name, text) in enumerate(zip(names, texts)):
+                    self.templates.append((name, text, data[f't{i}']))
+        except Exception as e:
+            print(f"Error cargando {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self.dirty:
+                return
+            arrays = {f't{i}': tpl for i, (_, _, tpl) in enumerate(self.templates)}
+            arrays['names'] = np.array([name for name, _, _ in self.templates], dtype=str)
+            arrays['texts'] = np.array([text for _, text, _ in self.templates], dtype=str)
+            self.dirty = False
+        tmp = self.path + '.tmp.npz'
+        try:
+            np.savez_compressed(tmp, **arrays)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Error guardando {self.path}: {e}")
+
+    def add(self, roi, canonical, text):
+        tpl = normalize_template(roi)
+        if tpl is None:
+            return False
+        with self._lock:
+            same = [i for i, (name, _, _) in enumerate(self.templates) if name == canonical]
+            # Si ya se reconoce con seguridad no hace falta otra variante
+            for i in same:
+                if self._score(tpl, self.templates[i][2]) >= 0.95:
+                    return False
+            if len(same) >= self.per_name:
+                self.templates.pop(same[0])
+            self.templates.append((canonical, text, tpl))
+            self.dirty = True
+        return True
+
+    @staticmethod
+    def _score(candidate, template):
+        cw = candidate.shape[1]
+        th, tw = template.shape[:2]
+        # Palabras de longitud muy distinta no pueden ser la misma
+        if abs(cw - tw) > max(6, 0.25 * tw):
+            return -1.0
+        if cw != tw:
+            candidate = cv2.resize(candidate, (tw, th), interpolation=cv2.INTER_AREA)
+        padded = cv2.copyMakeBorder(candidate, MATCH_PAD, MATCH_PAD, MATCH_PAD, MATCH_PAD,
+                                    cv2.BORDER_CONSTANT, value=0)
+        result = cv2.matchTemplate(padded, template, cv2.TM_CCOEFF_NORMED)
+        # Plantillas planas dan NaN/inf: se tratan como sin coincidencia
+        result = np.nan_to_num(result, nan=-1.0, posinf=-1.0, neginf=-1.0)
+        return float(result.max())
+
+    def match(self, roi):
+        # Devuelve (canónico, texto, puntuación) de la mejor plantilla sobre el umbral, o None
+        candidate = normalize_template(roi)
+        best = None
+        if candidate is not None:
+            with self._lock:
+                for name, text, tpl in self.templates:
+                    score = self._score(candidate, tpl)
+                    if best is None or score > best[2]:
+                        best = (name, text, score)
+        if best is None or best[2] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return best
+
+    def report(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"Plantillas de nombres: {self.hits} aciertos / {self.misses} a EasyOCR ({ratio:.0f}%), {len(self.templates)} plantillas"
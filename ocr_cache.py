@@ -0,0 +1,127 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import cv2
+
+# Caché de resultados OCR indexada por hash perceptual del nombre del pez.
+# El recorte se binariza (Otsu), se recorta al texto y se reduce a un pHash de 64 bits,
+# de modo que pequeños desplazamientos, ruido o cambios de brillo dan el mismo hash
+# (o uno a muy pocos bits de distancia). Expulsión LRU y persistencia en disco.
+
+CACHE_FILE = 'ocr_cache.json'
+
+
+def binarize_name(roi):
+    # Devuelve el texto en blanco sobre negro, recortado a su caja (None si no hay texto)
+    if roi.ndim == 3:
+        code = cv2.COLOR_BGRA2GRAY if roi.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        gray = cv2.cvtColor(roi, code)
+    else:
+        gray = roi
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # El texto ocupa menos que el fondo: si hay más blanco que negro, invertir
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+    points = cv2.findNonZero(binary)
+    if points is None:
+        return None
+    x, y, w, h = cv2.boundingRect(points)
+    return binary[y:y+h, x:x+w]
+
+
+def phash(binary):
+    small = cv2.resize(binary, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(small)[:8, :8].flatten()
+    # Se ignora la componente continua (índice 0) para la mediana
+    bits = dct > np.median(dct[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def name_hash(roi):
+    # None si el recorte no contiene texto (no se cachea)
+    binary = binarize_name(roi)
+    if binary is None or binary.size == 0:
+        return None
+    return phash(binary)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class OcrCache:
+    def __init__(self, path=CACHE_FILE, capacity=256, max_distance=4):
+        self.path = path
+        self.capacity = capacity
+        # Bits de diferencia tolerados para considerar dos recortes el mismo nombre
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, text in data.get('entries', []):
+                self.entries[int(key, 16)] = text
+        except Exception as e:
+            print(f"Error cargando {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self.path or not self.dirty:
+                return
+            data = {'version': 1, 'entries': [[f"{key:016x}", text] for key, text in self.entries.items()]}
+            self.dirty = False
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"Error guardando {self.path}: {e}")
+
+    def get(self, key):
+        with self._lock:
+            text = self.entries.get(key)
+            if text is None and self.max_distance > 0:
+                # Búsqueda aproximada: pocos nombres distintos, el recorrido es barato
+                best = None
+                for other, other_text in self.entries.items():
+                    distance = hamming(key, other)
+                    if distance <= self.max_distance and (best is None or distance < best[0]):
+                        best = (distance, other, other_text)
+                if best is not None:
+                    key, text = best[1], best[2]
+            if text is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        if not text:
+            return
+        with self._lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def report(self):
+        total = self.hits + self.misses
+        ratio = self.hits / total * 100 if total else 0.0
+        return f"Caché OCR: {self.hits} aciertos / {self.misses} fallos ({ratio:.0f}%), {len(self.entries)} entradas"
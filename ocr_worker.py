@@ -0,0 +1,133 @@
+import threading
+import queue
+import time
+import numpy as np
+
+# Worker de OCR en segundo plano.
+# El bucle de detección solo recorta result_name_roi y lo encola (sin bloquear); el hilo
+# ejecuta el reconocimiento y entrega el resultado por callback con el id de sesión.
+# La cola es acotada: si se llena, el recorte se descarta y se cuenta como perdido.
+
+
+class LazyOcrReader:
+    # Envoltorio de easyocr.Reader que no importa easyocr/torch hasta que se pide.
+    # start_loading() carga y calienta el modelo en un hilo; readtext() espera si aún no está listo.
+    def __init__(self, langs, gpu=False):
+        self.langs = list(langs)
+        self.gpu = gpu
+        self.reader = None
+        self.error = None
+        self.load_seconds = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_loading(self):
+        with self._lock:
+            if self._thread is None and not self.ready.is_set():
+                self._thread = threading.Thread(target=self._load, name="ocr-loader", daemon=True)
+                self._thread.start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            import easyocr
+            reader = easyocr.Reader(self.langs, gpu=self.gpu)
+            # Calentamiento: la primera inferencia es mucho más lenta que las siguientes
+            reader.readtext(np.zeros((32, 96, 3), dtype=np.uint8), detail=0)
+            self.reader = reader
+        except Exception as e:
+            self.error = e
+            print(f"Error cargando modelo OCR: {e}")
+        self.load_seconds = time.perf_counter() - started
+        self.ready.set()
+        if self.reader is not None:
+            print(f"Modelo OCR cargado en {self.load_seconds:.1f}s.")
+
+    @property
+    def is_ready(self):
+        return self.ready.is_set() and self.reader is not None
+
+    def wait_ready(self, timeout=None):
+        self.start_loading()
+        return self.ready.wait(timeout) and self.reader is not None
+
+    def readtext(self, image, **kwargs):
+        if not self.wait_ready():
+            raise RuntimeError(f"OCR no disponible: {self.error}")
+        return self.reader.readtext(image, **kwargs)
+
+
+class OcrJob:
+    __slots__ = ('session_id', 'image', 'captured_at', 'on_result')
+
+    def __init__(self, session_id, image, captured_at, on_result=None):
+        self.session_id = session_id
+        self.image = image
+        self.captured_at = captured_at
+        # Callback propio del recorte (worker compartido entre varios bots)
+        self.on_result = on_result
+
+
+class OcrWorker:
+    def __init__(self, recognize, on_result=None, maxsize=4):
+        # recognize(imagen) -> str | None ; on_result(job, texto), salvo que el recorte traiga el suyo
+        self.recognize = recognize
+        self.on_result = on_result
+        self.jobs = queue.Queue(maxsize=maxsize)
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._loop, name="ocr-worker", daemon=True)
+        self.thread.start()
+
+    def submit(self, session_id, image, captured_at=None, on_result=None):
+        # Nunca bloquea al llamante
+        try:
+            self.jobs.put_nowait(OcrJob(session_id, image, captured_at, on_result))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _loop(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            text = None
+            try:
+                text = self.recognize(job.image)
+            except Exception as e:
+                print(f"Error OCR: {e}")
+            try:
+                (job.on_result or self.on_result)(job, text)
+            except Exception as e:
+                print(f"Error entregando resultado OCR: {e}")
+            self.completed += 1
+            self.jobs.task_done()
+
+    @property
+    def pending(self):
+        return self.submitted - self.completed
+
+    def flush(self, timeout=None):
+        # Espera (como mucho 'timeout' segundos) a que se procesen los recortes pendientes
+        done = threading.Event()
+
+        def wait_all():
+            self.jobs.join()
+            done.set()
+
+        threading.Thread(target=wait_all, daemon=True).start()
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self.flush(timeout)
+        try:
+            self.jobs.put_nowait(None)
+        except queue.Full:
+            return
+        self.thread.join(timeout)
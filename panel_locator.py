@@ -0,0 +1,289 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+from settings import CONFIG_FILE, Settings, read_config
+
+# Localización automática de la ventana del juego.
+# Se guarda una plantilla del ancla (por defecto el icono de pesca, fishing_icon_roi) y con ella:
+# - al arrancar, o si se pierde, se busca en toda la pantalla con una pirámide de imagen: búsqueda
+#   completa en el nivel más reducido y refinado en ventanas pequeñas en los niveles siguientes;
+# - cada track_every_seconds se comprueba solo un entorno de +-search_margin píxeles alrededor de
+#   donde debería estar (un recorte pequeño, menos de 1 ms).
+# Si el ancla aparece en otro sitio, el bot desplaza capture_region (y con ella todas las áreas).
+# La plantilla se guarda con --save (con el juego en primer plano y el icono visible). Si no existe,
+# el bot solo la captura pasado start_focus_delay y cuando menu_present confirma que el icono está
+# en su posición calibrada (ancla 'menu', auto_capture); con otra ancla hace falta --save.
+#
+#   python panel_locator.py --save    # guarda la plantilla desde la calibración actual
+#   python panel_locator.py           # busca el ancla en pantalla e informa del desplazamiento
+
+TEMPLATE_FILE = 'panel_template.png'
+
+
+def to_gray(img):
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY if img.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+
+
+class PanelLocator:
+    def __init__(self, config=None, grab=None, bounds=None):
+        # grab(rect) -> imagen de ese rect de pantalla ({'left','top','width','height'});
+        # bounds: rect de toda la pantalla. Por defecto ambos con mss.
+        config = config or {}
+        self.path = config.get('template', TEMPLATE_FILE)
+        self.anchor = config.get('anchor', 'menu')
+        self.threshold = float(config.get('threshold', 0.8))
+        self.margin = int(config.get('search_margin', 40))
+        self.track_every = float(config.get('track_every_seconds', 3.0))
+        self.lost_after = max(1, int(config.get('lost_after', 2)))
+        self.min_side = int(config.get('min_template_side', 8))
+        self.max_levels = int(config.get('max_levels', 4))
+        self.candidates = int(config.get('candidates', 3))
+        self.grab = grab or self._mss_grab
+        self.bounds = bounds
+        self.sct = None
+        self.pyramid = None
+        self.last_check = None
+        self.misses = 0
+        self.full_searches = 0
+        self.full_time = 0.0
+        self.tracks = 0
+        self.track_time = 0.0
+        self.moves = 0
+        self.last_score = None
+
+    # --- Pantalla ---
+
+    def _mss_grab(self, rect):
+        if self.sct is None:
+            import mss
+            self.sct = mss.mss()
+        return np.array(self.sct.grab(rect))
+
+    def screen_bounds(self):
+        if self.bounds is None:
+            if self.sct is None:
+                import mss
+                self.sct = mss.mss()
+            # monitors[0]: caja que une todos los monitores
+            m = self.sct.monitors[0]
+            self.bounds = {'left': m['left'], 'top': m['top'], 'width': m['width'], 'height': m['height']}
+        return self.bounds
+
+    # --- Plantilla ---
+
+    def anchor_rect(self, settings):
+        return settings.regions.get(self.anchor)
+
+    def set_template(self, img):
+        tpl = to_gray(img)
+        # Niveles de la pirámide mientras la plantilla conserve min_side píxeles por lado
+        self.pyramid = [tpl]
+        while (len(self.pyramid) < self.max_levels and
+               min(self.pyramid[-1].shape[:2]) // 2 >= self.min_side):
+            self.pyramid.append(cv2.pyrDown(self.pyramid[-1]))
+
+    def load_template(self):
+        if not os.path.exists(self.path):
+            return False
+        img = cv2.imread(self.path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            return False
+        self.set_template(img)
+        return True
+
+    def capture_template(self, settings):
+        # Recorta el ancla en su posición calibrada actual y la guarda
+        rect = self.anchor_rect(settings)
+        if rect is None:
+            raise ValueError(f"El ancla '{self.anchor}' no está configurada")
+        monitor = settings.monitor
+        img = self.grab({'left': monitor['left'] + rect['x'], 'top': monitor['top'] + rect['y'],
+                         'width': rect['w'], 'height': rect['h']})
+        return self.save_template(img)
+
+    def save_template(self, img):
+        gray = to_gray(img)
+        cv2.imwrite(self.path, gray)
+        self.set_template(gray)
+        return gray
+
+    def ensure_template(self):
+        # Solo carga la plantilla guardada; nunca la captura por su cuenta
+        return self.pyramid is not None or self.load_template()
+
+    # --- Búsqueda ---
+
+    def _peaks(self, res, count, th, tw):
+        # Los 'count' mejores máximos separados al menos el tamaño de la plantilla
+        res = res.copy()
+        out = []
+        for _ in range(count):
+            _, score, _, (x, y) = cv2.minMaxLoc(res)
+            if score <= -1.0:
+                break
+            out.append((x, y, score))
+            res[max(0, y - th):y + th, max(0, x - tw):x + tw] = -1.0
+        return out
+
+    def search(self, gray):
+        # Devuelve (x, y, score) de la esquina del ancla en gray, o None
+        levels = len(self.pyramid)
+        images = [gray]
+        for _ in range(levels - 1):
+            images.append(cv2.pyrDown(images[-1]))
+        while levels > 1 and any(s < t for s, t in zip(images[levels - 1].shape, self.pyramid[levels - 1].shape)):
+            levels -= 1
+        top, tpl = images[levels - 1], self.pyramid[levels - 1]
+        if top.shape[0] < tpl.shape[0] or top.shape[1] < tpl.shape[1]:
+            return None
+        res = cv2.matchTemplate(top, tpl, cv2.TM_CCOEFF_NORMED)
+        best = None
+        for x, y, score in self._peaks(res, self.candidates, *tpl.shape[:2]):
+            # Refinado: en cada nivel, ventana de +-2 px alrededor de la posición del nivel anterior
+            for k in range(levels - 2, -1, -1):
+                img, tpl_k = images[k], self.pyramid[k]
+                th, tw = tpl_k.shape[:2]
+                x0 = min(max(0, x * 2 - 2), img.shape[1] - tw)
+                y0 = min(max(0, y * 2 - 2), img.shape[0] - th)
+                x1 = min(img.shape[1], x0 + tw + 4)
+                y1 = min(img.shape[0], y0 + th + 4)
+                sub = cv2.matchTemplate(img[y0:y1, x0:x1], tpl_k, cv2.TM_CCOEFF_NORMED)
+                _, score, _, (dx, dy) = cv2.minMaxLoc(sub)
+                x, y = x0 + dx, y0 + dy
+            if best is None or score > best[2]:
+                best = (x, y, score)
+        return best
+
+    def locate(self):
+        # Búsqueda en toda la pantalla; (x, y, score) en coordenadas de pantalla o None
+        if self.pyramid is None:
+            return None
+        start = time.perf_counter()
+        bounds = self.screen_bounds()
+        found = self.search(to_gray(self.grab(bounds)))
+        self.full_searches += 1
+        self.full_time += time.perf_counter() - start
+        if found is None:
+            return None
+        x, y, score = found
+        return bounds['left'] + x, bounds['top'] + y, score
+
+    def track(self, x, y):
+        # Búsqueda a resolución completa en un entorno de (x, y)
+        if self.pyramid is None:
+            return None
+        start = time.perf_counter()
+        tpl = self.pyramid[0]
+        th, tw = tpl.shape[:2]
+        rect = {'left': x - self.margin, 'top': y - self.margin,
+                'width': tw + 2 * self.margin, 'height': th + 2 * self.margin}
+        if self.bounds is not None or self.sct is not None:
+            # Recortar al área de pantalla conocida
+            b = self.screen_bounds()
+            left = max(b['left'], rect['left'])
+            top = max(b['top'], rect['top'])
+            right = min(b['left'] + b['width'], rect['left'] + rect['width'])
+            bottom = min(b['top'] + b['height'], rect['top'] + rect['height'])
+            rect = {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+        if rect['width'] < tw or rect['height'] < th:
+            return None
+        res = cv2.matchTemplate(to_gray(self.grab(rect)), tpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(res)
+        self.tracks += 1
+        self.track_time += time.perf_counter() - start
+        return rect['left'] + dx, rect['top'] + dy, score
+
+    def update(self, settings, allow_full=True, now=None):
+        # Llamado desde el bucle. Devuelve el nuevo (left, top) de capture_region si el ancla se
+        # movió, o None. La búsqueda completa solo se hace tras lost_after fallos y si allow_full.
+        now = time.perf_counter() if now is None else now
+        if self.last_check is not None and now - self.last_check < self.track_every:
+            return None
+        self.last_check = now
+        rect = self.anchor_rect(settings)
+        if rect is None or not self.ensure_template():
+            return None
+        monitor = settings.monitor
+        expected = (monitor['left'] + rect['x'], monitor['top'] + rect['y'])
+        found = self.track(*expected)
+        if found is None or found[2] < self.threshold:
+            # Ancla oculta (p. ej. pantalla de resultado) o movida lejos
+            self.misses += 1
+            if self.misses < self.lost_after or not allow_full:
+                return None
+            found = self.locate()
+            if found is None or found[2] < self.threshold:
+                return None
+        self.misses = 0
+        return self.offset(settings, found)
+
+    def offset(self, settings, found):
+        # Nuevo (left, top) de capture_region para el ancla encontrada, o None si no hace falta
+        if found is None or found[2] < self.threshold:
+            return None
+        self.last_score = found[2]
+        rect = self.anchor_rect(settings)
+        left, top = found[0] - rect['x'], found[1] - rect['y']
+        monitor = settings.monitor
+        if (left, top) == (monitor['left'], monitor['top']):
+            return None
+        self.moves += 1
+        return left, top
+
+    def report(self):
+        if not (self.tracks or self.full_searches):
+            return None
+        track_ms = self.track_time / self.tracks * 1000 if self.tracks else 0.0
+        full_ms = self.full_time / self.full_searches * 1000 if self.full_searches else 0.0
+        return (f"Localizador: {self.tracks} comprobaciones ({track_ms:.1f} ms), "
+                f"{self.full_searches} búsquedas completas ({full_ms:.1f} ms), {self.moves} desplazamientos")
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Localiza la ventana del juego en pantalla")
+    parser.add_argument('--save', action='store_true', help="Guardar la plantilla del ancla desde la calibración actual")
+    args = parser.parse_args(argv)
+    settings = Settings(read_config(CONFIG_FILE))
+    locator = PanelLocator(settings.panel_locator)
+    try:
+        if args.save:
+            locator.capture_template(settings)
+            print(f"Plantilla guardada en {locator.path}")
+            return 0
+        if not locator.load_template():
+            print(f"No hay plantilla en {locator.path}: ejecuta primero con --save")
+            return 1
+        found = locator.locate()
+        print(locator.report())
+        if found is None or found[2] < locator.threshold:
+            score = f" (mejor coincidencia {found[2]:.2f})" if found else ""
+            print(f"Ancla no encontrada{score}")
+            return 1
+        monitor = settings.monitor
+        print(f"Ancla en ({found[0]}, {found[1]}), coincidencia {found[2]:.2f}")
+        moved = locator.offset(settings, found)
+        if moved is None:
+            print("capture_region ya está en su sitio")
+        else:
+            left, top = moved
+            print(f"capture_region: left {left}, top {top} "
+                  f"(configurado {monitor['left']}, {monitor['top']}; "
+                  f"desplazamiento {left - monitor['left']:+d}, {top - monitor['top']:+d})")
+        return 0
+    finally:
+        locator.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import time
+
+# Planificador de frames por estado.
+# El bucle de FishingBot llama a wait(estado) antes de cada captura: el planificador duerme
+# lo necesario para no superar los FPS objetivo de ese estado ni el presupuesto de CPU
+# (fracción del tiempo que el bucle puede estar trabajando), y lleva la cuenta de lo conseguido.
+
+DEFAULT_FPS = {
+    'esperando': 10,   # esperando a que pique (18-21s): basta con poca frecuencia
+    'burst': 60,       # '!' rojo o letras E/R/T en pantalla: máxima reacción
+    'cooldown': 4,     # justo después de una captura
+    'default': 30      # lanzando / estados intermedios
+}
+
+
+class StateStats:
+    __slots__ = ('frames', 'elapsed', 'busy')
+
+    def __init__(self):
+        self.frames = 0
+        self.elapsed = 0.0
+        self.busy = 0.0
+
+
+class FrameScheduler:
+    def __init__(self, config=None, enabled=True):
+        self.allowed = enabled
+        self.configure(config)
+        self.stats = {}
+        self.tick_start = None
+        self.last_report = time.perf_counter()
+        # Destino del informe periódico: el bot lo envía al registro de eventos (hilo escritor)
+        self.on_report = print
+
+    def configure(self, config):
+        # También se usa al recargar la configuración en caliente
+        config = config or {}
+        self.enabled = self.allowed and config.get('enabled', True)
+        self.fps = dict(DEFAULT_FPS)
+        self.fps.update(config.get('fps', {}))
+        # 1.0 = sin límite; 0.5 = el bucle trabaja como mucho la mitad del tiempo
+        self.cpu_budget = min(1.0, max(0.01, float(config.get('cpu_budget', 1.0))))
+        self.report_every = float(config.get('report_every_seconds', 0))
+
+    def target_fps(self, state):
+        return self.fps.get(state, self.fps.get('default', 30))
+
+    def pace(self, state):
+        # FPS objetivo para la fuente de captura (None si el planificador no limita)
+        return self.target_fps(state) if self.enabled else None
+
+    def wait(self, state):
+        now = time.perf_counter()
+        if self.tick_start is not None:
+            busy = now - self.tick_start
+            if self.enabled:
+                fps = self.target_fps(state)
+                period = 1.0 / fps if fps and fps > 0 else 0.0
+                # Para respetar el presupuesto, cada segundo de trabajo exige (1-b)/b de descanso
+                rest = busy * (1.0 - self.cpu_budget) / self.cpu_budget
+                delay = max(period - busy, rest)
+                if delay > 0:
+                    time.sleep(delay)
+                    now = time.perf_counter()
+            # El ciclo (trabajo anterior + espera) se cuenta para el estado que marca el ritmo
+            st = self.stats.get(state)
+            if st is None:
+                st = self.stats[state] = StateStats()
+            st.frames += 1
+            st.busy += busy
+            st.elapsed += now - self.tick_start
+        self.tick_start = now
+        if self.report_every > 0 and now - self.last_report >= self.report_every:
+            self.last_report = now
+            self.on_report(self.report())
+
+    def summary(self):
+        out = {}
+        for state, st in self.stats.items():
+            achieved = st.frames / st.elapsed if st.elapsed > 0 else 0.0
+            out[state] = {
+                'frames': st.frames,
+                'target_fps': self.target_fps(state) if self.enabled else None,
+                'achieved_fps': achieved,
+                'cpu': st.busy / st.elapsed if st.elapsed > 0 else 0.0
+            }
+        return out
+
+    def report(self):
+        parts = []
+        for state, info in self.summary().items():
+            target = f"{info['target_fps']}" if info['target_fps'] is not None else "-"
+            parts.append(f"{state}: {info['achieved_fps']:.1f}/{target} FPS, CPU {info['cpu'] * 100:.0f}%")
+        return "FPS " + " | ".join(parts)
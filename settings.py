@@ -0,0 +1,214 @@
+import os
+import json
+import time
+from types import MappingProxyType
+
+from frame_sources import CAPTURE_MODES, valid_rect
+
+# Configuración compilada.
+# config_fishing.json se lee una vez y se convierte en un objeto inmutable con campos ya
+# tipados (float/int/bool), las ROIs validadas contra la región de captura y sus slices de
+# numpy precalculados. El bucle lee atributos en vez de hacer CONFIG.get(...) y float(...)
+# en cada frame. SettingsWatcher recarga el fichero cuando cambia su mtime.
+
+CONFIG_FILE = 'config_fishing.json'
+
+DEFAULT_THRESHOLDS = {
+    'green_min': 140,
+    'red_min': 160,
+    'wait_green_diff_min': -30,
+    'wait_red_diff_min': 15,
+    'green_diff_min': 20,
+    'letter_red_diff_min': 15
+}
+
+
+def read_config(path=CONFIG_FILE):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def _rect(cfg):
+    if not cfg:
+        return None
+    return MappingProxyType({'x': int(cfg.get('x', 0)), 'y': int(cfg.get('y', 0)),
+                             'w': int(cfg.get('w', 0)), 'h': int(cfg.get('h', 0))})
+
+
+class Settings:
+    __slots__ = (
+        'raw', 'monitor', 'capture_mode', 'areas', 'regions', 'slices',
+        'green_min', 'red_min', 'wait_green_diff_min', 'wait_red_diff_min',
+        'green_diff_min', 'letter_red_diff_min',
+        'keys', 'result_name_roi', 'fishing_icon_roi', 'menu_roi', 'icon_threshold',
+        'confirm', 'use_prediction', 'prediction_confidence',
+        'start_key', 'start_press_on_run', 'start_focus_delay',
+        'start_wait_timeout', 'start_wait_min', 'start_wait_max', 'max_sequence_idle',
+        'menu_absent_hold', 'post_last_key_min', 'post_finish_jitter', 'fallback_after_timeout',
+        'cooldown_seconds', 'scheduler', 'change_gate', 'ocr_queue_size', 'ocr_flush_timeout',
+        'ocr_cache', 'name_templates', 'latency', 'input', 'event_log', 'capture_process', 'color_lut', 'ai_vision',
+        'panel_locator',
+        'log_event_details', 'log_debug_values', 'hot_reload_seconds'
+    )
+
+    def __init__(self, config):
+        s = object.__setattr__
+        # Copia de solo lectura de lo que no está compilado (bloques opcionales)
+        s(self, 'raw', MappingProxyType(dict(config)))
+
+        capture = config.get('capture_region', {})
+        monitor = MappingProxyType({
+            "top": int(capture.get('top', 0)),
+            "left": int(capture.get('left', 0)),
+            "width": int(capture.get('width', 1920)),
+            "height": int(capture.get('height', 1080))
+        })
+        s(self, 'monitor', monitor)
+        mode = config.get('capture_mode', 'full')
+        if mode not in CAPTURE_MODES:
+            print(f"capture_mode '{mode}' no válido, usando 'full'")
+            mode = 'full'
+        s(self, 'capture_mode', mode)
+
+        # Áreas e icono validados una sola vez contra el tamaño de la región de captura
+        def inside(rect):
+            return (valid_rect(rect) and rect['x'] + rect['w'] <= monitor['width']
+                    and rect['y'] + rect['h'] <= monitor['height'])
+
+        areas = {name: _rect(rect) for name, rect in config.get('areas', {}).items()}
+        s(self, 'areas', MappingProxyType({n: r for n, r in areas.items() if inside(r)}))
+        name_roi = _rect(config.get('result_name_roi'))
+        icon_roi = _rect(config.get('fishing_icon_roi'))
+        s(self, 'result_name_roi', name_roi if inside(name_roi) else None)
+        s(self, 'fishing_icon_roi', icon_roi if inside(icon_roi) else None)
+        # Como antes: el icono de pesca, o el nombre si no hay icono configurado
+        menu = _rect(config.get('fishing_icon_roi') or config.get('result_name_roi'))
+        s(self, 'menu_roi', menu if inside(menu) else None)
+        regions = dict(self.areas)
+        if self.menu_roi is not None:
+            regions['menu'] = self.menu_roi
+        s(self, 'regions', MappingProxyType(regions))
+        slices = {name: (slice(r['y'], r['y'] + r['h']), slice(r['x'], r['x'] + r['w']))
+                  for name, r in regions.items()}
+        if self.result_name_roi is not None:
+            r = self.result_name_roi
+            slices['name'] = (slice(r['y'], r['y'] + r['h']), slice(r['x'], r['x'] + r['w']))
+        s(self, 'slices', MappingProxyType(slices))
+
+        th = dict(DEFAULT_THRESHOLDS)
+        th.update(config.get('thresholds', {}))
+        for key in DEFAULT_THRESHOLDS:
+            s(self, key, float(th[key]))
+
+        s(self, 'keys', tuple(config.get('keys', ('e', 'r', 't'))))
+        s(self, 'icon_threshold', float(config.get('fishing_icon_threshold', 75)))
+        # Confirmación por frames (confirm.py); press_delay_seconds antiguo = latencia mínima
+        confirm = dict(config.get('confirm') or {})
+        if 'press_delay_seconds' in config:
+            confirm.setdefault('min_latency_seconds', float(config['press_delay_seconds']))
+        confirm['rois'] = MappingProxyType({roi: MappingProxyType(dict(opts))
+                                            for roi, opts in confirm.get('rois', {}).items()})
+        s(self, 'confirm', MappingProxyType(confirm))
+        s(self, 'use_prediction', bool(config.get('use_prediction', False)))
+        # Probabilidad mínima para pre-armar la siguiente tecla
+        s(self, 'prediction_confidence', float(config.get('prediction_confidence', 0.8)))
+        s(self, 'start_key', str(config.get('start_key', '5')))
+        s(self, 'start_press_on_run', bool(config.get('start_press_on_run', True)))
+        s(self, 'start_focus_delay', float(config.get('start_focus_delay_seconds', 0)))
+        s(self, 'start_wait_timeout', float(config.get('start_wait_timeout_seconds', 5)))
+        s(self, 'start_wait_min', float(config.get('start_wait_timeout_min_seconds', 18)))
+        s(self, 'start_wait_max', float(config.get('start_wait_timeout_max_seconds', 21)))
+        s(self, 'max_sequence_idle', float(config.get('max_sequence_idle_seconds', 8.0)))
+        s(self, 'menu_absent_hold', float(config.get('menu_absent_hold_seconds', 2.0)))
+        s(self, 'post_last_key_min', float(config.get('post_last_key_min_seconds', 2.0)))
+        jitter = config.get('post_finish_delay_jitter')
+        if isinstance(jitter, dict):
+            jitter = (float(jitter.get('min', 1.0)), float(jitter.get('max', 1.0)))
+        else:
+            jitter = None
+        s(self, 'post_finish_jitter', jitter)
+        s(self, 'fallback_after_timeout', float(config.get('fallback_after_timeout_seconds', 1.5)))
+
+        scheduler = dict(config.get('scheduler') or {})
+        s(self, 'scheduler', MappingProxyType(scheduler))
+        s(self, 'cooldown_seconds', float(scheduler.get('cooldown_seconds', 1.5)))
+        s(self, 'change_gate', MappingProxyType(dict(config.get('change_gate') or {})))
+        s(self, 'ocr_queue_size', int(config.get('ocr_queue_size', 4)))
+        s(self, 'ocr_flush_timeout', float(config.get('ocr_flush_timeout_seconds', 10)))
+        s(self, 'ocr_cache', MappingProxyType(dict(config.get('ocr_cache') or {})))
+        s(self, 'name_templates', MappingProxyType(dict(config.get('name_templates') or {})))
+        s(self, 'latency', MappingProxyType(dict(config.get('latency') or {})))
+        s(self, 'input', MappingProxyType(dict(config.get('input') or {})))
+        s(self, 'event_log', MappingProxyType(dict(config.get('event_log') or {})))
+        # Clasificación por LUT de color (color_lut.py) en vez de umbrales sobre la media
+        s(self, 'color_lut', MappingProxyType(dict(config.get('color_lut') or {})))
+        # Detección con modelo ONNX (ai_vision.py) en vez de ROIs fijas
+        s(self, 'ai_vision', MappingProxyType(dict(config.get('ai_vision') or {})))
+        s(self, 'capture_process', MappingProxyType(dict(config.get('capture_process') or {})))
+        # Seguimiento de la ventana del juego en pantalla (panel_locator.py)
+        s(self, 'panel_locator', MappingProxyType(dict(config.get('panel_locator') or {})))
+        # Detalle en consola de todos los eventos / señales del frame en el registro
+        s(self, 'log_event_details', bool(config.get('log_event_details', False)))
+        s(self, 'log_debug_values', bool(config.get('log_debug_values', False)))
+        s(self, 'hot_reload_seconds', float(config.get('hot_reload_seconds', 1.0)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings es inmutable: compila uno nuevo con Settings(config)")
+
+    def get(self, key, default=None):
+        # Acceso a claves no compiladas (herramientas, opciones poco usadas)
+        return self.raw.get(key, default)
+
+    def same_geometry(self, other):
+        return (other is not None and self.monitor == other.monitor
+                and self.capture_mode == other.capture_mode and self.regions == other.regions)
+
+
+def load_settings(path=CONFIG_FILE):
+    return Settings(read_config(path))
+
+
+class SettingsWatcher:
+    # Comprueba el mtime del fichero como mucho cada 'interval' segundos;
+    # poll() devuelve un Settings nuevo cuando el fichero cambió y compila sin errores.
+    def __init__(self, path=CONFIG_FILE, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.last_check = time.monotonic()
+        self.mtime = self._mtime()
+        # mtime del último intento fallido (para avisar una sola vez por versión del fichero)
+        self.failed_mtime = None
+        self.reloads = 0
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        if self.interval <= 0:
+            return None
+        now = time.monotonic()
+        if now - self.last_check < self.interval:
+            return None
+        self.last_check = now
+        mtime = self._mtime()
+        if mtime is None or mtime == self.mtime:
+            return None
+        try:
+            settings = load_settings(self.path)
+        except Exception as e:
+            # Fichero a medio escribir o inválido: se mantiene la configuración actual y se
+            # reintenta en la siguiente comprobación (el editor puede terminar de guardar)
+            if mtime != self.failed_mtime:
+                self.failed_mtime = mtime
+                print(f"Error recargando {self.path}: {e}")
+            return None
+        # Solo se da por leída esta versión cuando compila
+        self.mtime = mtime
+        self.failed_mtime = None
+        self.reloads += 1
+        return settings
@@ -0,0 +1,89 @@
+import time
+from collections import namedtuple
+
+# Máquina de estados declarativa.
+# Cada estado declara las ROIs que necesita y el método del bot que lo atiende; el handler
+# recibe las señales del frame (solo de esas ROIs) y pide transiciones con transition().
+# La máquina lleva el tiempo de permanencia por estado y el recuento de transiciones.
+
+# name: nombre del estado | rois: regiones que se clasifican en ese estado
+# handler: nombre del método del dueño que procesa un frame en ese estado
+StateSpec = namedtuple('StateSpec', 'name rois handler')
+
+
+class StateMachine:
+    def __init__(self, specs, owner, initial, clock=time.perf_counter):
+        self.specs = {spec.name: spec for spec in specs}
+        self.handlers = {spec.name: getattr(owner, spec.handler) for spec in specs}
+        if initial not in self.specs:
+            raise ValueError(f"Estado inicial desconocido: {initial}")
+        self.clock = clock
+        self.state = initial
+        self.entered_at = clock()
+        self.dwell = dict.fromkeys(self.specs, 0.0)
+        self.entries = dict.fromkeys(self.specs, 0)
+        self.entries[initial] = 1
+        self.frames = dict.fromkeys(self.specs, 0)
+        # {(origen, destino): veces}
+        self.transitions = {}
+
+    @property
+    def spec(self):
+        return self.specs[self.state]
+
+    @property
+    def time_in_state(self):
+        return self.clock() - self.entered_at
+
+    def transition(self, target, reason=None):
+        if target not in self.specs:
+            raise ValueError(f"Estado desconocido: {target}")
+        now = self.clock()
+        source = self.state
+        self.dwell[source] += now - self.entered_at
+        self.entries[target] += 1
+        edge = (source, target)
+        self.transitions[edge] = self.transitions.get(edge, 0) + 1
+        self.state = target
+        self.entered_at = now
+        return source
+
+    def step(self, *args):
+        # Atiende un frame en el estado actual; devuelve lo que devuelva el handler
+        state = self.state
+        self.frames[state] += 1
+        return self.handlers[state](*args)
+
+    def summary(self):
+        # El estado actual cuenta hasta ahora, sin cerrar su permanencia
+        now = self.clock()
+        out = {}
+        for name in self.specs:
+            dwell = self.dwell[name]
+            if name == self.state:
+                dwell += now - self.entered_at
+            entries = self.entries[name]
+            out[name] = {
+                'entries': entries,
+                'frames': self.frames[name],
+                'dwell_seconds': dwell,
+                'mean_dwell_seconds': dwell / entries if entries else 0.0
+            }
+        return {
+            'state': self.state,
+            'states': out,
+            'transitions': {f"{a}->{b}": n for (a, b), n in self.transitions.items()}
+        }
+
+    def report(self):
+        info = self.summary()
+        parts = []
+        for name, st in info['states'].items():
+            if not st['entries']:
+                continue
+            parts.append(f"{name}: {st['entries']}x, {st['dwell_seconds']:.1f}s "
+                         f"(media {st['mean_dwell_seconds']:.2f}s, {st['frames']} frames)")
+        lines = ["Estados " + " | ".join(parts)]
+        if info['transitions']:
+            lines.append("Transiciones " + ", ".join(f"{edge}: {n}" for edge, n in info['transitions'].items()))
+        return "\n".join(lines)